@@ -0,0 +1,437 @@
+"""
+Module Docstring
+
+Benchmarks of the battery control kernels in consmodel.bs_sim.
+
+Every control type of BS.model, BS.get_min_p_lim and BS.find_p_limits are run on
+synthetic 15 min profiles of one day, one year and ten years, and the batched
+control types of BS.simulate_many on batches of consumers. Every case runs in
+its own process, so the compile time and the peak memory are not shared
+between cases. The results are written as JSON:
+
+    python benchmarks/bench_bs_sim.py --output bench.json
+    python benchmarks/bench_bs_sim.py --output new.json --compare bench.json
+
+With --compare, the cases whose best wall time got slower than the baseline by
+more than --threshold are listed and the exit code is 1.
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# profile lengths in 15 min steps
+SIZES = {
+    "day": 96,
+    "year": 96 * 365,
+    "decade": 96 * 3652,
+}
+START = "2020-01-01 00:15:00"
+FREQ = "15min"
+ST_TYPE = "10kWh_5kW"
+# control_params of the control types that need them, EUR/kWh per tariff block
+CONTROL_PARAMS = {
+    "optimal_cost": {"block_prices": [0.16, 0.14, 0.12, 0.10, 0.09], "export_price": 0.047},
+}
+
+
+def synthetic_profiles(n_steps: int, n_rows: int = 1, seed: int = 0) -> np.ndarray:
+    """
+    Returns synthetic consumption profiles with a daily shape, a midday PV dip and noise.
+
+    Args:
+    ----------
+        n_steps: int
+            Number of 15 min steps
+        n_rows: int
+            Number of profiles
+        seed: int
+            Seed of the random generator
+
+    Returns:
+    ----------
+        p_kw: np.array
+            Power in kW of shape (n_rows, n_steps)
+    """
+    rng = np.random.default_rng(seed)
+    hour = (np.arange(n_steps) % 96) / 4.
+    day = np.arange(n_steps) // 96
+    base = 1.5 + 1.5 * np.exp(-((hour - 19.) / 2.5)**2) + 0.8 * np.exp(-((hour - 7.) / 1.5)**2)
+    pv = 4. * np.clip(np.sin((hour - 6.) / 13. * np.pi), 0., None)
+    season = 0.6 + 0.4 * np.cos(2 * np.pi * day / 365.25)
+    scale = rng.uniform(0.5, 2., size=(n_rows, 1))
+    pv_size = rng.uniform(0., 1.5, size=(n_rows, 1))
+    noise = rng.normal(0., 0.6, size=(n_rows, n_steps))
+    return scale * (base * season) - pv_size * pv * (1.4 - season) + noise
+
+
+def synthetic_prices(n_steps: int, seed: int = 0) -> np.ndarray:
+    """
+    Returns a synthetic day-ahead price in EUR/kWh with morning and evening peaks and noise.
+    """
+    rng = np.random.default_rng(seed + 1)
+    hour = (np.arange(n_steps) % 96) / 4.
+    return (0.09 + 0.04 * np.exp(-((hour - 8.) / 2.)**2) + 0.06 * np.exp(-((hour - 19.) / 2.5)**2)
+            + rng.normal(0., 0.01, n_steps))
+
+
+def _battery():
+    from consmodel.bs_sim import BS
+    return BS(lat=46.155768, lon=14.304951, alt=400, st_type=ST_TYPE, freq=FREQ)
+
+
+def _profile(size: str, seed: int) -> pd.DataFrame:
+    n_steps = SIZES[size]
+    index = pd.date_range(START, periods=n_steps, freq=FREQ)
+    return pd.DataFrame({"p": synthetic_profiles(n_steps, 1, seed)[0]}, index=index)
+
+
+def _find_p_limits_iterations(p_array, block_array, batt) -> int:
+    """
+    Returns the number of bisection steps of jit_find_p_limits, retracing its search.
+    """
+    from consmodel.bs_sim import jit_are_p_limits_possible, jit_bisect_block_p_limit
+    max_e = batt.max_e_kwh
+    max_charge = batt.max_charge_p_kw
+    max_discharge = batt.max_discharge_p_kw
+    p_limits_orig = np.array([
+        p_array[block_array == block].max() if (block_array == block).any() else 0.
+        for block in range(1, 6)
+    ])
+    p_limits = np.maximum.accumulate(np.maximum(p_limits_orig, 0.))
+    total = 0
+    for block in range(1, 6):
+        j = block - 1
+        min_bound = p_limits_orig[j] - max_discharge - 1
+        if block == 1:
+            if not (block_array == 1).any():
+                p_limits[0] = 0.
+                continue
+            max_soc = 0.95
+        else:
+            p_limits_min = p_limits.copy()
+            p_limits_min[j] = p_limits[j - 1]
+            if jit_are_p_limits_possible(p_array, block_array, p_limits_min, max_e,
+                                         max_charge, max_discharge, max_e, batt.dt) == 1:
+                p_limits[j] = p_limits[j - 1]
+                continue
+            max_soc = 1.
+        root, iterations, _ = jit_bisect_block_p_limit(
+            p_array, block_array, p_limits, block, min_bound, p_limits[j], max_e,
+            max_charge, max_discharge, max_e * max_soc, batt.dt, 0.05)
+        p_limits[j] = round(root + 0.1, 1)
+        total += iterations
+    return total
+
+
+def _setup(case: dict, seed: int):
+    """
+    Returns the compile timings and the function running the case once.
+    """
+    from consmodel.bs_sim import BS, jit_bisect_min_p_limit, warmup
+
+    batt = _battery()
+    kind = case["kind"]
+    if kind == "simulate_many":
+        control_type = case["control_type"]
+        compile_timings = warmup(control_type, batched=True)
+        n_steps = SIZES[case["size"]]
+        p_matrix = synthetic_profiles(n_steps, case["n_consumers"], seed)
+        index = pd.date_range(START, periods=n_steps, freq=FREQ)
+
+        def run():
+            return batt.simulate_many(p_matrix, control_type, index=index)
+
+        return compile_timings, run, None
+
+    p_kw = _profile(case["size"], seed)
+    if kind == "model":
+        control_type = case["control_type"]
+        compile_timings = warmup(control_type)
+        control_params = CONTROL_PARAMS.get(control_type)
+        if control_type == "price_threshold":
+            control_params = {"price": synthetic_prices(len(p_kw), seed)}
+
+        def run():
+            batt.hard_reset()
+            return batt.model(control_type, p_kw, control_params)
+
+        iterations = None
+        if control_type == "installed_power":
+            p_array = BS._power_view(p_kw["p"])
+            iterations = lambda: int(jit_bisect_min_p_limit(
+                p_array, batt.max_e_kwh, batt.max_e_kwh, batt.max_charge_p_kw,
+                batt.max_discharge_p_kw, batt.dt)[1])
+        elif control_type == "block_power_reduction":
+            iterations = lambda: _find_p_limits_iterations(
+                BS._power_view(p_kw["p"]), np.asarray(batt.results["block"], dtype=np.int64), batt)
+        return compile_timings, run, iterations
+
+    if kind == "get_min_p_lim":
+        compile_timings = warmup("installed_power")
+        batt.model("production_saving", p_kw)
+        batt.hard_reset()
+        p_array = BS._power_view(p_kw["p"])
+
+        def iterations():
+            return int(jit_bisect_min_p_limit(
+                p_array, batt.current_e_kwh, batt.max_e_kwh, batt.max_charge_p_kw,
+                batt.max_discharge_p_kw, batt.dt)[1])
+
+        return compile_timings, batt.get_min_p_lim, iterations
+
+    if kind == "find_p_limits":
+        compile_timings = warmup("block_power_reduction")
+        batt.model("block_power_reduction", p_kw)
+
+        def iterations():
+            return _find_p_limits_iterations(
+                BS._power_view(p_kw["p"]), np.asarray(batt.results["block"], dtype=np.int64), batt)
+
+        return compile_timings, batt.find_p_limits, iterations
+
+    raise ValueError(f"Unknown benchmark kind {kind}.")
+
+
+def run_case(case: dict, repeat: int = 3, seed: int = 0) -> dict:
+    """
+    Runs a benchmark case and returns its measurements.
+
+    Args:
+    ----------
+        case: dict
+            The kind ("model", "get_min_p_lim", "find_p_limits" or "simulate_many"),
+            the size and, for "model" and "simulate_many", the control_type
+        repeat: int
+            Number of timed runs after the first one
+        seed: int
+            Seed of the synthetic profiles
+
+    Returns:
+    ----------
+        result: dict
+            The case with compile_s (the kernel compilation or cache load),
+            first_call_s, wall_s (all timed runs), wall_min_s, wall_median_s,
+            peak_traced_mb (peak of the traced allocations during one run),
+            peak_rss_mb (peak resident memory of the process) and iterations
+            (bisection steps, null where there is no bisection)
+    """
+    result = dict(case)
+    start = time.perf_counter()
+    compile_timings, run, iterations = _setup(case, seed)
+    result["setup_s"] = time.perf_counter() - start
+    result["compile_s"] = sum(compile_timings.values())
+    result["compile_kernels"] = compile_timings
+
+    start = time.perf_counter()
+    run()
+    result["first_call_s"] = time.perf_counter() - start
+
+    tracemalloc.start()
+    wall = []
+    for _ in range(max(1, repeat)):
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        run()
+        wall.append(time.perf_counter() - start)
+    result["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+
+    result["wall_s"] = wall
+    result["wall_min_s"] = min(wall)
+    result["wall_median_s"] = float(np.median(wall))
+    result["iterations"] = iterations() if iterations is not None else None
+    if resource is not None:
+        # kB on Linux, bytes on macOS
+        scale = 2**20 if sys.platform == "darwin" else 2**10
+        result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    else:
+        result["peak_rss_mb"] = None
+    return result
+
+
+def _run_case_in_child(args):
+    case, repeat, seed = args
+    try:
+        return run_case(case, repeat, seed)
+    except Exception as error:  # keep the other cases running
+        return dict(case, error=f"{type(error).__name__}: {error}")
+
+
+def benchmark_cases(sizes=("day", "year", "decade"),
+                    batch_sizes=("day", "year"),
+                    n_consumers: int = 1000,
+                    control_types=None) -> list:
+    """
+    Returns the benchmark cases.
+
+    Args:
+    ----------
+        sizes: list of str
+            Profile sizes of BS.model, BS.get_min_p_lim and BS.find_p_limits
+        batch_sizes: list of str
+            Profile sizes of BS.simulate_many
+        n_consumers: int
+            Number of consumers in a batch
+        control_types: list of str
+            Control types to benchmark, all registered ones by default
+
+    Returns:
+    ----------
+        cases: list of dict
+    """
+    from consmodel.bs_sim import BATCH_KERNEL_SIGNATURES, CONTROL_STRATEGIES
+
+    if control_types is None:
+        control_types = list(CONTROL_STRATEGIES)
+    cases = []
+    for size in sizes:
+        for control_type in control_types:
+            cases.append({"kind": "model", "control_type": control_type, "size": size, "n_steps": SIZES[size]})
+        cases.append({"kind": "get_min_p_lim", "size": size, "n_steps": SIZES[size]})
+        cases.append({"kind": "find_p_limits", "size": size, "n_steps": SIZES[size]})
+    for size in batch_sizes:
+        for control_type in BATCH_KERNEL_SIGNATURES:
+            if control_type in control_types:
+                cases.append({"kind": "simulate_many", "control_type": control_type, "size": size,
+                              "n_steps": SIZES[size], "n_consumers": n_consumers})
+    return cases
+
+
+def environment() -> dict:
+    """
+    Returns the versions and the machine the benchmarks ran on.
+    """
+    import numba
+    import consmodel
+    return {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "numba_threads": numba.get_num_threads(),
+        "consmodel": consmodel.__version__,
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "numba": numba.__version__,
+    }
+
+
+def _case_key(case: dict) -> tuple:
+    return (case["kind"], case.get("control_type"), case["size"], case.get("n_consumers"))
+
+
+def compare(results: list, baseline: list, threshold: float = 1.25) -> list:
+    """
+    Returns the cases slower than the baseline by more than the threshold.
+
+    Args:
+    ----------
+        results: list of dict
+            Results of run_case
+        baseline: list of dict
+            Results of an earlier run
+        threshold: float
+            Allowed ratio of the best wall times
+
+    Returns:
+    ----------
+        regressions: list of dict
+            The case keys with the baseline and new best wall times and their ratio
+    """
+    baseline = {_case_key(case): case for case in baseline if "wall_min_s" in case}
+    regressions = []
+    for case in results:
+        old = baseline.get(_case_key(case))
+        if old is None or "wall_min_s" not in case:
+            continue
+        ratio = case["wall_min_s"] / max(old["wall_min_s"], 1e-9)
+        if ratio > threshold:
+            regressions.append({"case": list(_case_key(case)),
+                                "baseline_s": old["wall_min_s"],
+                                "wall_min_s": case["wall_min_s"],
+                                "ratio": ratio})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the battery control kernels.")
+    parser.add_argument("--sizes", default="day,year,decade",
+                        help="profile sizes of the single battery cases (day, year, decade)")
+    parser.add_argument("--batch-sizes", default="day,year",
+                        help="profile sizes of the batched cases, empty to skip them")
+    parser.add_argument("--consumers", type=int, default=1000, help="consumers in a batch")
+    parser.add_argument("--control-types", default=None, help="comma separated control types, all by default")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic profiles")
+    parser.add_argument("--in-process", action="store_true",
+                        help="run all cases in this process, sharing compiled kernels and memory")
+    parser.add_argument("--output", default=None, help="JSON file, stdout by default")
+    parser.add_argument("--compare", default=None, help="baseline JSON file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="allowed slowdown ratio of the best wall time against the baseline")
+    args = parser.parse_args(argv)
+
+    def split(value):
+        return [item for item in value.split(",") if item] if value else []
+
+    cases = benchmark_cases(split(args.sizes),
+                            split(args.batch_sizes),
+                            args.consumers,
+                            split(args.control_types) if args.control_types else None)
+    jobs = [(case, args.repeat, args.seed) for case in cases]
+    if args.in_process:
+        results = [_run_case_in_child(job) for job in jobs]
+    else:
+        # a fresh process per case keeps the compile times and peak memory separate
+        context = multiprocessing.get_context("spawn")
+        results = []
+        for job in jobs:
+            with context.Pool(1) as pool:
+                results.append(pool.apply(_run_case_in_child, (job,)))
+    for result in results:
+        status = result.get("error") or f"{result['wall_min_s']:.4f} s"
+        print(f"{result['kind']:<14} {result.get('control_type') or '':<30} {result['size']:<7} {status}",
+              file=sys.stderr)
+
+    report = {"environment": environment(),
+              "settings": {"repeat": args.repeat, "seed": args.seed, "st_type": ST_TYPE, "freq": FREQ},
+              "results": results}
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        report["regressions"] = compare(results, baseline, args.threshold)
+        for regression in report["regressions"]:
+            print(f"slower: {regression['case']} {regression['ratio']:.2f}x", file=sys.stderr)
+        exit_code = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
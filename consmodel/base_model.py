@@ -4,10 +4,12 @@ DocString:
 """
 from datetime import datetime
 from abc import ABC, abstractmethod
-from meteostat import Point, Hourly
 from tzfpy import get_tz
 import pandas as pd
 
+from consmodel.utils.time_axis import TimeAxis
+from consmodel.utils.weather_store import get_weather_store
+
 
 class BaseModel(ABC):
     """
@@ -33,7 +35,10 @@ class BaseModel(ABC):
         self._freq_mins = self.get_freq_mins(freq)
 
         self.timeseries = None
+        self.time_axis = None
         self.results = pd.DataFrame()
+        # WeatherStore of get_weather_data, the shared default store if None
+        self.weather_store = None
 
     def __eq__(self, other):
         return self.index == other.index and self.name == other.name
@@ -176,13 +181,15 @@ class BaseModel(ABC):
         # convert to datetime
         start = pd.to_datetime(start)
         end = pd.to_datetime(end)
-        
+
+        self.time_axis = TimeAxis.from_range(start, end, self.freq, self.tz)
         return start, end
 
     def get_weather_data(
         self,
         start: datetime = None,
         end: datetime = None,
+        columns: list = None,
     ):
         """
         INPUT:
@@ -190,6 +197,7 @@ class BaseModel(ABC):
         includes the following keys:
             'start'         ... datetime,
             'end'           ... datetime,
+            'columns'       ... list, the weather columns the model uses, all by default
         OUTPUT:
             weather_data ... pandas dataframe with
             weather data that includesthe following columns:
@@ -204,29 +212,41 @@ class BaseModel(ABC):
                 pres ... The average sea-level air pressure in hPa
                 tsun ... The one hour sunshine total in minutes (m)
                 coco ... The weather condition code
+        The hourly data is served by self.weather_store, a WeatherStore, a WeatherProvider
+        or any source with the same get method, or by the shared default store, which
+        fetches it from meteostat once per site and range. The hourly columns are
+        linearly interpolated to the time axis of the results, or to the hours around
+        start and end if there are no results yet, and added to the results. A source
+        with an interpolate method, like the cells of a WeatherPlanner, interpolates
+        itself and can share the interpolated columns between models.
         """
-        # round the start to the nearest hour
-        start = start.replace(minute=0, second=0, microsecond=0)
-
-        # if end is over an hour then round up to the next hour
-        if end.minute > 0 or end.second > 0 or end.microsecond > 0:
-            if end.hour == 23:
-                end = end.replace(hour=0,
-                                  minute=0,
-                                  second=0,
-                                  microsecond=0)
-                end = end.replace(year=end.year + 1)
-            else:
-                end = end.replace(hour=end.hour + 1,
-                              minute=0,
-                              second=0,
-                              microsecond=0)
-
-        location = Point(self.lat, self.lon, self.alt)
-        weather_data = Hourly(location, start, end, self.tz)
-        weather_data = weather_data.fetch()
-        weather_data = weather_data.resample(self.freq) \
-                                   .mean() \
-                                   .interpolate(method='linear')
-        self.results = pd.concat([self.results, weather_data], axis=1)
+        # the hours around the range
+        start = pd.Timestamp(start).floor("h")
+        end = pd.Timestamp(end).ceil("h")
+
+        store = self.weather_store if self.weather_store is not None else get_weather_store()
+        weather_data = store.get(self.lat, self.lon, self.alt, start, end, self.tz)
+        if columns is None:
+            # columns already in the results, e.g. the irradiance of the PV model, are kept
+            columns = [column for column in weather_data.columns if column not in self.results.columns]
+        missing = [column for column in columns if column not in weather_data.columns]
+        if missing:
+            raise ValueError(f"The weather source {store!r} has no {', '.join(missing)} data.")
+        # interpolate to the time axis of the results, or to the hours around the range
+        if len(self.results.columns) > 0:
+            time_axis = TimeAxis.from_index(self.results.index)
+        else:
+            time_axis = TimeAxis.from_range(start, end, self.freq, self.tz)
+        interpolate = getattr(store, "interpolate", None)
+        if interpolate is not None:
+            # a shared source, e.g. the cell of a WeatherPlanner, serves the interpolated weather
+            weather_data = interpolate(time_axis, self.lat, self.lon, self.alt, start, end, self.tz)
+        else:
+            weather_data = time_axis.interpolate(weather_data, columns)
+        # the columns reference the interpolated weather, copy on write keeps it unchanged
+        if len(self.results.columns) > 0:
+            for column in columns:
+                self.results[column] = weather_data[column]
+        else:
+            self.results = weather_data[columns]
         return self.results
@@ -4,20 +4,30 @@ Module Docstring
 This module contains the BS class.
 """
 
+import time
 import warnings
-from scipy import optimize
 import pandas as pd
 import numpy as np
 from consmodel.utils.st_types import StorageType
 from consmodel.base_model import BaseModel
-from consmodel.utils import individual_tariff_times, extract_first_date_of_month
+from consmodel.utils.time_axis import TimeAxis
+from consmodel.utils.accounting import tariff_accounting
 
 
-from numba import njit
+from numba import njit, prange, types
 
 
-@njit
+@njit(cache=True)
 def jit_are_p_limits_possible(p_array, block_array, p_limits, current_e, max_charge, max_discharge, max_e, dt):
+    return jit_check_p_limits(p_array, block_array, p_limits, current_e, max_charge, max_discharge, max_e, dt)[0]
+
+@njit(cache=True)
+def jit_check_p_limits(p_array, block_array, p_limits, current_e, max_charge, max_discharge, max_e, dt):
+    """
+    Determine if the block p_limits are possible.
+    Returns 1 and the battery energy (kWh) at the end if possible, otherwise -1 and
+    the energy when the limit was first exceeded.
+    """
     n = p_array.shape[0]
     # Initialize a variable to hold the battery state (you may want an array if you need the entire state history)
     for i in range(n):
@@ -26,13 +36,13 @@ def jit_are_p_limits_possible(p_array, block_array, p_limits, current_e, max_cha
         if p_array[i] > current_p_limit:
             if current_e >= 0:
                 if p_array[i] - current_p_limit > max_discharge:
-                    return -1
+                    return -1, current_e
                 needed_output = p_array[i] - current_p_limit
                 if current_e < needed_output * dt:
-                    return -1
+                    return -1, current_e
                 current_e -= needed_output * dt
             else:
-                return -1
+                return -1, current_e
         else:
             diff = current_p_limit - p_array[i]
             charge_amount = diff if diff < max_charge else max_charge
@@ -40,30 +50,174 @@ def jit_are_p_limits_possible(p_array, block_array, p_limits, current_e, max_cha
                 if current_e + charge_amount * dt > max_e:
                     charge_amount = (max_e - current_e) / dt
                 current_e += charge_amount * dt
-    return 1
+    return 1, current_e
+
+@njit(cache=True)
+def jit_bisect_block_p_limit(p_array, block_array, p_limits, block, min_bound, max_bound,
+                             current_e, max_charge, max_discharge, max_e, dt, xtol):
+    """
+    Bisect the p_limit of a single block with the other block limits fixed.
+
+    Mirrors scipy.optimize.bisect (rtol=4*eps, maxiter=100) applied to
+    jit_are_p_limits_possible, so the results are the same as with the Python solver.
+
+    Parameters:
+      p_array     : 1D array of power values (kW) at each timestep.
+      block_array : 1D array of tariff blocks (1-5) at each timestep.
+      p_limits    : 1D array of the 5 block limits. Left unchanged.
+      block       : Block (1-5) whose limit is searched.
+      min_bound   : Lower end of the bracket.
+      max_bound   : Upper end of the bracket.
+      current_e, max_charge, max_discharge, max_e, dt : as in jit_are_p_limits_possible.
+      xtol        : Absolute tolerance of the root.
+
+    Returns:
+      root        : The p_limit of the block where feasibility changes.
+      iterations  : Number of bisection steps.
+      final_e     : Battery energy (kWh) at the end of the series with the lowest
+                    feasible limit of the block found.
+    """
+    rtol = 4 * np.finfo(np.float64).eps
+    limits = p_limits.copy()
+    limits[block - 1] = min_bound
+    f_a, _ = jit_check_p_limits(p_array, block_array, limits, current_e, max_charge, max_discharge, max_e, dt)
+    limits[block - 1] = max_bound
+    f_b, e_b = jit_check_p_limits(p_array, block_array, limits, current_e, max_charge, max_discharge, max_e, dt)
+    if f_a * f_b > 0:
+        raise ValueError("f(a) and f(b) must have different signs")
+    final_e = e_b
+    x_a = min_bound
+    d_m = max_bound - min_bound
+    for iterations in range(1, 101):
+        d_m *= 0.5
+        x_m = x_a + d_m
+        limits[block - 1] = x_m
+        f_m, e_m = jit_check_p_limits(p_array, block_array, limits, current_e, max_charge, max_discharge, max_e, dt)
+        if f_m * f_a >= 0:
+            x_a = x_m
+        elif f_m == 1:
+            final_e = e_m
+        if abs(d_m) < xtol + rtol * abs(x_m):
+            return x_m, iterations, final_e
+    raise RuntimeError("Failed to converge after 100 iterations.")
+
+
+@njit(cache=True)
+def jit_find_p_limits(p_array, block_array, max_e, max_charge, max_discharge, dt):
+    """
+    Find the p_limits of all 5 tariff blocks, block after block.
+
+    Compiled equivalent of BS.get_max_p_limits followed by BS.find_p_limits.
+    The battery starts fully charged. The first block is searched with the battery
+    capped at 95 % of its capacity, every following block keeps the limit of the
+    previous one if that is feasible and is bisected otherwise.
+
+    Parameters:
+      p_array       : 1D array of power values (kW) at each timestep.
+      block_array   : 1D array of tariff blocks (1-5) at each timestep.
+      max_e         : Maximum battery capacity (kWh).
+      max_charge    : Maximum charging power (kW).
+      max_discharge : Maximum discharging power (kW).
+      dt            : Time step in hours.
+
+    Returns:
+      p_limits      : 1D array of the 5 block limits (kW).
+    """
+    # maximum power in every block, 0 for the blocks without any timestep
+    p_limits_orig = np.zeros(5)
+    counts = np.zeros(5, dtype=np.int64)
+    for i in range(p_array.shape[0]):
+        j = int(block_array[i]) - 1
+        if counts[j] == 0 or p_array[i] > p_limits_orig[j]:
+            p_limits_orig[j] = p_array[i]
+        counts[j] += 1
+
+    # the limit of a higher block must not be lower than the limit of a lower one
+    p_limits = p_limits_orig.copy()
+    current_max = 0.
+    for j in range(5):
+        if p_limits[j] < current_max:
+            p_limits[j] = current_max
+        else:
+            current_max = p_limits[j]
+
+    for block in range(1, 6):
+        j = block - 1
+        min_bound = p_limits_orig[j] - max_discharge - 1
+        if block == 1:
+            if counts[0] > 0:
+                root, _, _ = jit_bisect_block_p_limit(p_array, block_array, p_limits, block, min_bound, p_limits[j],
+                                                      max_e, max_charge, max_discharge, max_e * 0.95, dt, 0.05)
+                p_limits[0] = round(root + 0.1, 1)
+            else:
+                p_limits[0] = 0.
+        else:
+            p_limits_min = p_limits.copy()
+            p_limits_min[j] = p_limits[j - 1]
+            # If it is possible, that p_limit is the same as in the previous block we take it
+            if jit_are_p_limits_possible(p_array, block_array, p_limits_min, max_e,
+                                         max_charge, max_discharge, max_e, dt) == 1:
+                p_limits[j] = p_limits[j - 1]
+            else:
+                root, _, _ = jit_bisect_block_p_limit(p_array, block_array, p_limits, block, min_bound, p_limits[j],
+                                                      max_e, max_charge, max_discharge, max_e, dt, 0.05)
+                p_limits[j] = round(root + 0.1, 1)
+    return p_limits
+
+
+@njit(parallel=True, cache=True)
+def jit_find_monthly_p_limits(p_array, block_array, offsets, max_e, max_charge, max_discharge, dt):
+    """
+    Find the block p_limits of every month in parallel.
+
+    Parameters:
+      p_array       : 1D array of power values (kW), grouped by month.
+      block_array   : 1D array of tariff blocks (1-5), grouped by month.
+      offsets       : 1D array of length n_months + 1, month m spans offsets[m]:offsets[m + 1].
+      max_e, max_charge, max_discharge, dt : as in jit_find_p_limits.
+
+    Returns:
+      p_limits      : 2D array of shape (n_months, 5) with the block limits of every month.
+    """
+    n_months = offsets.shape[0] - 1
+    p_limits = np.zeros((n_months, 5))
+    for m in prange(n_months):
+        p_limits[m] = jit_find_p_limits(p_array[offsets[m]:offsets[m + 1]],
+                                        block_array[offsets[m]:offsets[m + 1]],
+                                        max_e, max_charge, max_discharge, dt)
+    return p_limits
 
 from numba import njit
 import numpy as np
 
-@njit
+@njit(cache=True)
 def jit_is_p_limit_possible(p_array, p_limit, current_e, max_charge, max_discharge, max_e, dt):
     """
     Determine if a single p_limit is possible, updating current_e along the way.
     Returns 1 if possible, otherwise -1.
     """
+    return jit_check_p_limit(p_array, p_limit, current_e, max_charge, max_discharge, max_e, dt)[0]
+
+@njit(cache=True)
+def jit_check_p_limit(p_array, p_limit, current_e, max_charge, max_discharge, max_e, dt):
+    """
+    Determine if a single p_limit is possible.
+    Returns 1 and the battery energy (kWh) at the end if possible, otherwise -1 and
+    the energy when the limit was first exceeded.
+    """
     n = p_array.shape[0]
     for i in range(n):
         if p_array[i] > p_limit:
             # battery must discharge
             if current_e >= 0:
                 if p_array[i] - p_limit > max_discharge:
-                    return -1
+                    return -1, current_e
                 needed_output = p_array[i] - p_limit
                 if current_e < needed_output * dt:
-                    return -1
+                    return -1, current_e
                 current_e -= needed_output * dt
             else:
-                return -1
+                return -1, current_e
         else:
             # battery can be charged
             diff = p_limit - p_array[i]
@@ -73,12 +227,148 @@ def jit_is_p_limit_possible(p_array, p_limit, current_e, max_charge, max_dischar
                 if current_e + charge_amount * dt > max_e:
                     charge_amount = (max_e - current_e) / dt
                 current_e += charge_amount * dt
-    return 1
+    return 1, current_e
+
+@njit(cache=True)
+def jit_bisect_min_p_limit(p_array, init_e, max_e, max_charge, max_discharge, dt):
+    """
+    Find the smallest p_limit that the battery can hold over the whole time series.
+
+    The feasibility of a p_limit (jit_check_p_limit) is monotone in the limit
+    and the answer lies between max(p) - max_discharge and max(p). The distinct
+    power levels in that range are sorted and searched with a binary search for the
+    first feasible level, which costs O(n log n). Between two neighbouring levels
+    the set of discharging timesteps does not change, so the remaining interval is
+    bisected down to 1e-9 * max(1, p_limit) kW, i.e. to 1e-9 kW for limits up to
+    1 kW. The limit is not solved in closed form: the returned p_limit is feasible
+    and limits more than that tolerance below it are not.
+
+    Parameters:
+      p_array       : 1D array of power values (kW) at each timestep.
+      init_e        : Initial battery energy (kWh).
+      max_e         : Maximum battery capacity (kWh).
+      max_charge    : Maximum charging power (kW).
+      max_discharge : Maximum discharging power (kW).
+      dt            : Time step in hours.
+
+    Returns:
+      p_limit       : The minimal feasible p_limit (kW), to 1e-9 * max(1, p_limit) kW.
+      iterations    : Number of feasibility checks.
+      final_e       : Battery energy (kWh) at the end of the series at p_limit.
+    """
+    max_p = p_array.max()
+    min_bound = max_p - max_discharge
+
+    # candidate levels: the lower bound and every distinct power value above it
+    levels = np.unique(p_array)
+    start = np.searchsorted(levels, min_bound, side="right")
+    candidates = np.empty(levels.shape[0] - start + 1)
+    candidates[0] = min_bound
+    candidates[1:] = levels[start:]
+
+    iterations = 0
+    final_e = 0.0
+    # the energy at the current p_limit is only known once it has been checked
+    known = False
+    # binary search for the first feasible candidate (the last one, max(p), always is)
+    lo = 0
+    hi = candidates.shape[0] - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        feasible, e = jit_check_p_limit(p_array, candidates[mid], init_e, max_charge, max_discharge, max_e, dt)
+        iterations += 1
+        if feasible == 1:
+            hi = mid
+            final_e = e
+            known = True
+        else:
+            lo = mid + 1
+    p_limit = candidates[hi]
+
+    # the limit lies between the previous (infeasible) candidate and p_limit
+    if hi > 0:
+        lower = candidates[hi - 1]
+        tol = 1e-9 * max(1.0, abs(p_limit))
+        while p_limit - lower > tol:
+            mid_limit = 0.5 * (lower + p_limit)
+            if mid_limit <= lower or mid_limit >= p_limit:
+                break
+            feasible, e = jit_check_p_limit(p_array, mid_limit, init_e, max_charge, max_discharge, max_e, dt)
+            iterations += 1
+            if feasible == 1:
+                p_limit = mid_limit
+                final_e = e
+                known = True
+            else:
+                lower = mid_limit
+
+    if not known:
+        _, final_e = jit_check_p_limit(p_array, p_limit, init_e, max_charge, max_discharge, max_e, dt)
+        iterations += 1
+    return p_limit, iterations, final_e
+
+@njit(cache=True)
+def jit_min_p_limit(p_array, init_e, max_e, max_charge, max_discharge, dt):
+    """
+    Find the smallest p_limit that the battery can hold over the whole time series
+    (jit_bisect_min_p_limit) and simulate the battery at it.
+
+    Parameters:
+      p_array       : 1D array of power values (kW) at each timestep.
+      init_e        : Initial battery energy (kWh).
+      max_e         : Maximum battery capacity (kWh).
+      max_charge    : Maximum charging power (kW).
+      max_discharge : Maximum discharging power (kW).
+      dt            : Time step in hours.
+
+    Returns:
+      p_limit       : The minimal feasible p_limit (kW).
+      battery_plus  : 1D array of discharge amounts (kW) at p_limit.
+      battery_minus : 1D array of charge amounts (kW) at p_limit.
+      energy_state  : 1D array of battery energy (kWh) after each timestep at p_limit.
+    """
+    p_limit, _, _ = jit_bisect_min_p_limit(p_array, init_e, max_e, max_charge, max_discharge, dt)
+    p_limit_array = np.full(p_array.shape[0], p_limit)
+    battery_plus, battery_minus, energy_state = jit_simulate_p_limit(
+        p_array, p_limit_array, dt, init_e, max_e, max_charge, max_discharge)
+    return p_limit, battery_plus, battery_minus, energy_state
 
 from numba import njit
 import numpy as np
 
-@njit
+@njit(cache=True)
+def _p_limit_step(p, p_limit, current_e, dt, max_e, max_charge, max_discharge):
+    """
+    One timestep of p_limit control, returns the discharge and charge amounts (kW)
+    and the battery energy (kWh) after the timestep.
+    """
+    discharge_amount = 0.0
+    charge_amount = 0.0
+    if p > p_limit:
+        # Discharging scenario (consumption exceeds limit)
+        if current_e > 0:
+            # Determine how much we can discharge this timestep.
+            discharge_amount = p - p_limit
+            if discharge_amount > max_discharge:
+                discharge_amount = max_discharge
+            # If battery doesn't have enough energy for full discharge:
+            if current_e < discharge_amount * dt:
+                discharge_amount = current_e / dt  # equivalent to current_e * (1/dt)
+            current_e -= discharge_amount * dt
+    else:
+        # Charging scenario (available production exceeds consumption)
+        excess_power = p_limit - p
+        if current_e < max_e:
+            charge_amount = excess_power
+            if charge_amount > max_charge:
+                charge_amount = max_charge
+            # Prevent overcharging:
+            if current_e + charge_amount * dt > max_e:
+                charge_amount = (max_e - current_e) / dt
+            current_e += charge_amount * dt
+    return discharge_amount, charge_amount, current_e
+
+@njit(cache=True)
 def jit_simulate_p_limit(p_array, p_limit_array, dt, init_e, max_e, max_charge, max_discharge):
     """
     Simulate battery behavior over a time series for p_limit control.
@@ -106,48 +396,56 @@ def jit_simulate_p_limit(p_array, p_limit_array, dt, init_e, max_e, max_charge,
     current_e = init_e
     
     for i in range(n):
-        if p_array[i] > p_limit_array[i]:
-            # Discharging scenario (consumption exceeds limit)
-            if current_e > 0:
-                # Determine how much we can discharge this timestep.
-                discharge_amount = p_array[i] - p_limit_array[i]
-                if discharge_amount > max_discharge:
-                    discharge_amount = max_discharge
-                # If battery doesn't have enough energy for full discharge:
-                if current_e < discharge_amount * dt:
-                    discharge_amount = current_e / dt  # equivalent to current_e * (1/dt)
-                current_e -= discharge_amount * dt
-                battery_plus[i] = discharge_amount
-            else:
-                battery_plus[i] = 0.0
-        else:
-            # Charging scenario (available production exceeds consumption)
-            excess_power = p_limit_array[i] - p_array[i]
-            if current_e < max_e:
-                charge_amount = excess_power
-                if charge_amount > max_charge:
-                    charge_amount = max_charge
-                # Prevent overcharging:
-                if current_e + charge_amount * dt > max_e:
-                    charge_amount = (max_e - current_e) / dt
-                current_e += charge_amount * dt
-                battery_minus[i] = charge_amount
-            else:
-                battery_minus[i] = 0.0
+        plus, minus, current_e = _p_limit_step(p_array[i], p_limit_array[i], current_e,
+                                               dt, max_e, max_charge, max_discharge)
+        battery_plus[i] = plus
+        battery_minus[i] = minus
         energy_state[i] = current_e
     return battery_plus, battery_minus, energy_state
 
-@njit
+@njit(cache=True)
+def _MT_VT_shift_step(hr, current_e, dt, max_e, max_charge, max_discharge):
+    """
+    One timestep of MT/VT shifting, returns the discharge and charge amounts (kW)
+    and the battery energy (kWh) after the timestep.
+    """
+    charge_amt = 0.0
+    discharge_amt = 0.0
+    if hr <= 5 or hr >= 22:
+        # Nighttime: charge the battery
+        # Compute candidate charge: max_e/8 and (max_e - current_e)/dt
+        charge_amt = max_e / 8
+        cand = (max_e - current_e) / dt
+        if cand < charge_amt:
+            charge_amt = cand
+        if max_charge < charge_amt:
+            charge_amt = max_charge
+        current_e = current_e + charge_amt * dt
+    else:
+        # Daytime: discharge the battery if the current energy is positive
+        discharge_amt = max_e / 16
+        if current_e < 0:
+            discharge_amt = 0.0
+        else:
+            cand = current_e / dt
+            if cand < discharge_amt:
+                discharge_amt = cand
+            if max_discharge < discharge_amt:
+                discharge_amt = max_discharge
+            current_e = current_e - discharge_amt * dt
+    return discharge_amt, charge_amt, current_e
+
+@njit(cache=True)
 def jit_simulate_MT_VT_shift(hours, dt, init_e, max_e, max_charge, max_discharge):
     """
     Simulate the battery behavior for MT/VT shifting.
     
     For hours <= 5 or >= 22 (i.e. nighttime) the battery charges:
-      charge_amount = min( max_e/8, (max_e - current_e)*4, max_charge )
+      charge_amount = min( max_e/8, (max_e - current_e)/dt, max_charge )
       current_e is increased by (charge_amount * dt)
       
     For hours between 6 and 21 (daytime) the battery discharges:
-      discharge_amount = min( max_e/16, (current_e)*4, max_discharge )
+      discharge_amount = min( max_e/16, (current_e)/dt, max_discharge )
       current_e is decreased by (discharge_amount * dt)
       
     Parameters:
@@ -171,47 +469,79 @@ def jit_simulate_MT_VT_shift(hours, dt, init_e, max_e, max_charge, max_discharge
     current_e = init_e
 
     for i in range(n):
-        hr = hours[i]
-        if hr <= 5 or hr >= 22:
-            # Nighttime: charge the battery
-            # Compute candidate charge: max_e/8 and (max_e - current_e)*4
-            charge_amt = max_e / 8
-            cand = (max_e - current_e) * 4
-            if cand < charge_amt:
-                charge_amt = cand
-            if max_charge < charge_amt:
-                charge_amt = max_charge
-            current_e = current_e + charge_amt * dt
-            battery_minus[i] = charge_amt
-        else:
-            # Daytime: discharge the battery if the current energy is positive
-            discharge_amt = max_e / 16
-            if current_e < 0:
-                discharge_amt = 0
-            else:
-                cand = current_e * 4
-                if cand < discharge_amt:
-                    discharge_amt = cand
-                if max_discharge < discharge_amt:
-                    discharge_amt = max_discharge
-                current_e = current_e - discharge_amt * dt
-            battery_plus[i] = discharge_amt
+        plus, minus, current_e = _MT_VT_shift_step(hours[i], current_e, dt, max_e,
+                                                   max_charge, max_discharge)
+        battery_plus[i] = plus
+        battery_minus[i] = minus
         energy_state[i] = current_e
     return battery_plus, battery_minus, energy_state
 
-@njit
+@njit(cache=True)
+def _5tariff_step(hr, current_e, dt, max_e, max_charge, max_discharge):
+    """
+    One timestep of 5Tariff_manoeuvering, returns the discharge and charge amounts (kW)
+    and the battery energy (kWh) after the timestep.
+    """
+    charge_amt = 0.0
+    discharge_amt = 0.0
+    if hr <= 5 or hr >= 22:
+        # Nighttime: charge the battery
+        n_hours = 8.0
+        charge_amt = max_e / n_hours
+        # Adjust charge candidate by available headroom:
+        available = (max_e - current_e) / dt
+        if available < charge_amt:
+            charge_amt = available
+        if max_charge < charge_amt:
+            charge_amt = max_charge
+        # Update battery state:
+        current_e = current_e + charge_amt * dt
+    elif hr >= 7 and hr <= 13:
+        # Morning: discharge the battery
+        n_hours = 7.0
+        discharge_amt = max_e / n_hours
+        available = current_e / dt
+        if available < discharge_amt:
+            discharge_amt = available
+        if max_discharge < discharge_amt:
+            discharge_amt = max_discharge
+        current_e = current_e - discharge_amt * dt
+    elif hr == 14 or hr == 15:
+        # Early afternoon: charge the battery
+        n_hours = 2.0
+        charge_amt = max_e / n_hours
+        available = (max_e - current_e) / dt
+        if available < charge_amt:
+            charge_amt = available
+        if max_charge < charge_amt:
+            charge_amt = max_charge
+        current_e = current_e + charge_amt * dt
+    elif hr >= 16 and hr <= 19:
+        # Late afternoon: discharge the battery
+        n_hours = 4.0
+        discharge_amt = max_e / n_hours
+        available = current_e / dt
+        if available < discharge_amt:
+            discharge_amt = available
+        if max_discharge < discharge_amt:
+            discharge_amt = max_discharge
+        current_e = current_e - discharge_amt * dt
+    # For other hours (e.g., between 5 and 7, or 20-21), do nothing.
+    return discharge_amt, charge_amt, current_e
+
+@njit(cache=True)
 def jit_simulate_5tariff(hours, dt, init_e, max_e, max_charge, max_discharge):
     """
     Simulate battery behavior for the 5Tariff_manoeuvering control strategy.
     
     For hours <= 5 or >= 22:
-      n_hours = 8, so candidate charge = min(max_e/8, (max_e - current_e)*4, max_charge)
+      n_hours = 8, so candidate charge = min(max_e/8, (max_e - current_e)/dt, max_charge)
     For hours between 7 and 13:
-      n_hours = 7, so candidate discharge = min(max_e/7, current_e*4, max_discharge)
+      n_hours = 7, so candidate discharge = min(max_e/7, current_e/dt, max_discharge)
     For hours 14 or 15:
-      n_hours = 2, so candidate charge = min(max_e/2, (max_e - current_e)*4, max_charge)
+      n_hours = 2, so candidate charge = min(max_e/2, (max_e - current_e)/dt, max_charge)
     For hours between 16 and 19:
-      n_hours = 4, so candidate discharge = min(max_e/4, current_e*4, max_discharge)
+      n_hours = 4, so candidate discharge = min(max_e/4, current_e/dt, max_discharge)
     Otherwise (e.g. between 5 and 7, or 20–21):
       no battery operation is performed.
       
@@ -236,61 +566,43 @@ def jit_simulate_5tariff(hours, dt, init_e, max_e, max_charge, max_discharge):
     current_e = init_e
 
     for i in range(n):
-        hr = hours[i]
-        if hr <= 5 or hr >= 22:
-            # Nighttime: charge the battery
-            n_hours = 8.0
-            charge_amt = max_e / n_hours
-            # Adjust charge candidate by available headroom:
-            available = (max_e - current_e) * 4.0
-            if available < charge_amt:
-                charge_amt = available
-            if max_charge < charge_amt:
-                charge_amt = max_charge
-            # Update battery state:
-            current_e = current_e + charge_amt * dt
-            battery_minus[i] = charge_amt
-        elif hr >= 7 and hr <= 13:
-            # Morning: discharge the battery
-            n_hours = 7.0
-            discharge_amt = max_e / n_hours
-            available = current_e * 4.0
-            if available < discharge_amt:
-                discharge_amt = available
-            if max_discharge < discharge_amt:
-                discharge_amt = max_discharge
-            current_e = current_e - discharge_amt * dt
-            battery_plus[i] = discharge_amt
-        elif hr == 14 or hr == 15:
-            # Early afternoon: charge the battery
-            n_hours = 2.0
-            charge_amt = max_e / n_hours
-            available = (max_e - current_e) * 4.0
-            if available < charge_amt:
-                charge_amt = available
-            if max_charge < charge_amt:
-                charge_amt = max_charge
-            current_e = current_e + charge_amt * dt
-            battery_minus[i] = charge_amt
-        elif hr >= 16 and hr <= 19:
-            # Late afternoon: discharge the battery
-            n_hours = 4.0
-            discharge_amt = max_e / n_hours
-            available = current_e * 4.0
-            if available < discharge_amt:
-                discharge_amt = available
-            if max_discharge < discharge_amt:
-                discharge_amt = max_discharge
-            current_e = current_e - discharge_amt * dt
-            battery_plus[i] = discharge_amt
-        else:
-            # For other hours (e.g., between 5 and 7, or 20-21), do nothing.
-            pass
-
+        plus, minus, current_e = _5tariff_step(hours[i], current_e, dt, max_e,
+                                               max_charge, max_discharge)
+        battery_plus[i] = plus
+        battery_minus[i] = minus
         energy_state[i] = current_e
     return battery_plus, battery_minus, energy_state
 
-@njit
+@njit(cache=True)
+def _production_saving_step(p, current_e, dt, max_e, max_charge, max_discharge):
+    """
+    One timestep of production saving, returns the discharge and charge amounts (kW)
+    and the battery energy (kWh) after the timestep.
+    """
+    discharge_amt = 0.0
+    charge_amt = 0.0
+    if p > 0:
+        # Consumption: discharge battery
+        if current_e > 0:
+            # If enough energy for full discharge:
+            if current_e - dt * p > 0:
+                discharge_amt = p if p < max_discharge else max_discharge
+            else:
+                discharge_amt = max_discharge if max_discharge < current_e / dt else current_e / dt
+            current_e = current_e - discharge_amt * dt
+    else:
+        # Production: p is negative; charge battery
+        available_power = -p
+        if current_e + dt * available_power < max_e:
+            charge_amt = available_power if available_power < max_charge else max_charge
+        else:
+            charge_amt = (max_e - current_e) / dt
+            if charge_amt > max_charge:
+                charge_amt = max_charge
+        current_e = current_e + charge_amt * dt
+    return discharge_amt, charge_amt, current_e
+
+@njit(cache=True)
 def jit_simulate_production_saving(p_array, dt, init_e, max_e, max_charge, max_discharge):
     """
     Simulate battery behavior for production saving control.
@@ -317,37 +629,58 @@ def jit_simulate_production_saving(p_array, dt, init_e, max_e, max_charge, max_d
     current_e = init_e
     
     for i in range(n):
-        p = p_array[i]
-        if p > 0:
-            # Consumption: discharge battery
-            if current_e > 0:
-                # If enough energy for full discharge:
-                if current_e - dt * p > 0:
-                    discharge_amt = p if p < max_discharge else max_discharge
-                else:
-                    discharge_amt = max_discharge if max_discharge < 4 * current_e else 4 * current_e
-                current_e = current_e - discharge_amt * dt
-                battery_plus[i] = discharge_amt
-            else:
-                battery_plus[i] = 0.0
-        else:
-            # Production: p is negative; charge battery
-            available_power = -p
-            if current_e + dt * available_power < max_e:
-                charge_amt = available_power if available_power < max_charge else max_charge
-            else:
-                charge_amt = (max_e - current_e) / dt
-                if charge_amt > max_charge:
-                    charge_amt = max_charge
-            current_e = current_e + charge_amt * dt
-            battery_minus[i] = charge_amt
+        plus, minus, current_e = _production_saving_step(p_array[i], current_e, dt, max_e,
+                                                         max_charge, max_discharge)
+        battery_plus[i] = plus
+        battery_minus[i] = minus
         energy_state[i] = current_e
     return battery_plus, battery_minus, energy_state
 
 import numpy as np
 from numba import njit
 
-@njit
+@njit(cache=True)
+def _combined_step(hr, p, current_e, dt, max_e, max_charge, max_discharge):
+    """
+    One timestep of combined production saving and VT discharging, returns the
+    discharge and charge amounts (kW) and the battery energy (kWh) after the timestep.
+    """
+    discharge_amt = 0.0
+    charge_amt = 0.0
+    # Case 1: Surplus production (p < 0) -> charge battery (production saving charging logic)
+    if p < 0:
+        available_power = -p  # available production for charging
+        if current_e + dt * available_power < max_e:
+            charge_amt = available_power if available_power < max_charge else max_charge
+        else:
+            charge_amt = (max_e - current_e) / dt
+            if charge_amt > max_charge:
+                charge_amt = max_charge
+        current_e += charge_amt * dt
+
+    # Case 2: VT period (6 <= hr <= 21)
+    elif 6 <= hr <= 22:
+        # If there is consumption, discharge at max power until battery is empty
+        if p > 0:
+            # discharge only the amount to 0
+            discharge_amt = max_discharge if p > max_discharge else p
+            # Ensure we don't discharge more than what is available in the battery:
+            if current_e < discharge_amt * dt:
+                discharge_amt = current_e / dt  # discharge the remaining energy
+            current_e -= discharge_amt * dt
+
+    # Case 3: Nighttime (hr <= 5 or hr >= 22) -> charge battery (shifting nighttime logic)
+    else:
+        charge_amt = max_e / 8
+        cand = (max_e - current_e) / dt
+        if cand < charge_amt:
+            charge_amt = cand
+        if max_charge < charge_amt:
+            charge_amt = max_charge
+        current_e += charge_amt * dt
+    return discharge_amt, charge_amt, current_e
+
+@njit(cache=True)
 def jit_simulate_combined(hours, p_array, dt, init_e, max_e, max_charge, max_discharge):
     """
     Combined simulation:
@@ -368,62 +701,1145 @@ def jit_simulate_combined(hours, p_array, dt, init_e, max_e, max_charge, max_dis
       max_discharge: Maximum discharging power (kW).
       
     Returns:
-      battery_plus  : Array of discharge amounts (kW) at each timestep.
-      battery_minus : Array of charge amounts (kW) at each timestep.
-                      (Positive values; charging may be later treated with a negative sign.)
-      energy_state  : Array of battery energy (kWh) after each timestep.
+      battery_plus  : Array of discharge amounts (kW) at each timestep.
+      battery_minus : Array of charge amounts (kW) at each timestep.
+                      (Positive values; charging may be later treated with a negative sign.)
+      energy_state  : Array of battery energy (kWh) after each timestep.
+    """
+    n = hours.shape[0]
+    battery_plus = np.zeros(n)
+    battery_minus = np.zeros(n)
+    energy_state = np.empty(n)
+    current_e = init_e
+
+    for i in range(n):
+        plus, minus, current_e = _combined_step(hours[i], p_array[i], current_e, dt, max_e,
+                                                max_charge, max_discharge)
+        battery_plus[i] = plus
+        battery_minus[i] = minus
+        energy_state[i] = current_e
+    return battery_plus, battery_minus, energy_state
+
+
+# largest number of energy levels of jit_optimal_cost_dispatch, its moves are stored as int16
+MAX_SOC_LEVELS = 32768
+
+
+@njit(cache=True)
+def jit_optimal_cost_dispatch(p_array, price, export_price, power_price, p_cap, dt,
+                              init_e, max_e, max_charge, max_discharge, n_levels):
+    """
+    Cost optimal battery dispatch by dynamic programming over a discretised energy.
+
+    The battery energy takes equidistant values max_e / (n_levels - 1) apart
+    between 0 and max_e and moves by a whole number of levels each timestep,
+    limited by the charging and discharging power. The levels are shifted so that
+    init_e is one of them, then the top level is dropped, so the dispatch starts
+    from the exact init_e and every kWh of the energy states is charged or
+    discharged; only when init_e is not a multiple of the level step the usable
+    capacity is a fraction of a level below max_e. The cost of a timestep with the
+    grid power p_after is
+      price * max(p_after, 0) * dt
+      - export_price * max(-p_after, 0) * dt
+      + power_price * max(p_after - p_cap, 0) * dt
+    The backward pass finds the cheapest move from every level at every timestep,
+    the forward pass follows it from init_e.
+
+    Runtime is O(n * n_levels * n_moves), not O(n * n_levels): n_moves = up + down + 1
+    is the number of levels the battery can move in one timestep, at most
+    2 * n_levels - 1 when one timestep can fill or empty the battery. The step cost
+    is not convex in the move when export_price exceeds price, so the cheapest move
+    cannot be found by a monotone search and every move is tried. With the default
+    51 levels and a battery that needs 2 hours to fill, a year of 15 minute steps
+    tries about 35040 * 51 * 13 moves, a few tens of milliseconds.
+
+    Parameters:
+      p_array      : 1D array of power values (kW) at each timestep.
+                     Positive values mean consumption.
+      price        : 1D array of energy prices of imported energy at each timestep.
+      export_price : 1D array of energy prices of exported energy at each timestep.
+      power_price  : 1D array of prices of the imported energy above p_cap.
+      p_cap        : 1D array of power limits (kW) at each timestep.
+      dt           : Time step in hours.
+      init_e       : Initial battery energy (kWh).
+      max_e        : Maximum battery capacity (kWh).
+      max_charge   : Maximum charging power (kW).
+      max_discharge: Maximum discharging power (kW).
+      n_levels     : Number of energy levels, 2 to MAX_SOC_LEVELS.
+
+    Returns:
+      battery_plus  : Array of discharge amounts (kW) at each timestep.
+      battery_minus : Array of charge amounts (kW) at each timestep.
+      energy_state  : Array of battery energy (kWh) after each timestep.
+      cost          : Total cost of the dispatch.
+    """
+    n = p_array.shape[0]
+    step_e = max_e / (n_levels - 1)
+    # the levels are offset + k * step_e, so that init_e is a level
+    init_e = min(max(init_e, 0.), max_e)
+    start = int(init_e / step_e + 1e-9)
+    offset = init_e - start * step_e
+    if offset < 1e-9 * step_e:
+        offset = 0.
+    else:
+        n_levels -= 1
+    # small tolerance so that a power limit of a whole number of levels is reachable
+    up = min(int(max_charge * dt / step_e + 1e-9), n_levels - 1)
+    down = min(int(max_discharge * dt / step_e + 1e-9), n_levels - 1)
+    n_moves = up + down + 1
+    move_cost = np.empty(n_moves)
+    policy = np.zeros((n, n_levels), dtype=np.int16)
+    value = np.zeros(n_levels)
+    new_value = np.empty(n_levels)
+
+    for i in range(n - 1, -1, -1):
+        # the cost of a move does not depend on the level it starts from
+        for m in range(n_moves):
+            p_after = p_array[i] + (m - down) * step_e / dt
+            if p_after > 0:
+                c = price[i] * p_after * dt
+            else:
+                c = export_price[i] * p_after * dt
+            if p_after > p_cap[i]:
+                c += power_price[i] * (p_after - p_cap[i]) * dt
+            move_cost[m] = c
+        for k in range(n_levels):
+            # staying idle wins ties, so the battery does not cycle for nothing
+            best_move = 0
+            best = move_cost[down] + value[k]
+            lo = max(-down, -k)
+            hi = min(up, n_levels - 1 - k)
+            for move in range(lo, hi + 1):
+                c = move_cost[move + down] + value[k + move]
+                if c < best:
+                    best = c
+                    best_move = move
+            new_value[k] = best
+            policy[i, k] = best_move
+        value[:] = new_value
+
+    battery_plus = np.zeros(n)
+    battery_minus = np.zeros(n)
+    energy_state = np.empty(n)
+    k = min(start, n_levels - 1)
+    cost = value[k] if n > 0 else 0.0
+    for i in range(n):
+        move = policy[i, k]
+        k += move
+        if move > 0:
+            battery_minus[i] = move * step_e / dt
+        elif move < 0:
+            battery_plus[i] = -move * step_e / dt
+        energy_state[i] = offset + k * step_e
+    return battery_plus, battery_minus, energy_state, cost
+
+
+# Control strategies of BS.model. Every strategy is a kernel with the signature
+#   kernel(p_array, hours, signal, params, dt, init_e, max_e, max_charge, max_discharge)
+# that returns battery_plus, battery_minus (negative), p_after, energy_state and the
+# KPIs peak, throughput and equivalent cycles, all computed in one pass.
+
+@njit(cache=True)
+def _strategy_outputs(n):
+    """
+    Allocates battery_plus, battery_minus, p_after, energy_state and the KPIs of a strategy.
+    """
+    return np.zeros(n), np.zeros(n), np.empty(n), np.empty(n), np.zeros(3)
+
+
+@njit(cache=True)
+def _record_step(i, p, plus, minus, current_e, battery_plus, battery_minus, p_after,
+                 energy_state, kpis):
+    """
+    Stores the results of timestep i and accumulates the KPIs.
+    Charging is stored as negative battery_minus.
+    """
+    battery_plus[i] = plus
+    battery_minus[i] = -minus
+    p_after[i] = p - plus + minus
+    energy_state[i] = current_e
+    if i == 0 or p_after[i] > kpis[0]:
+        kpis[0] = p_after[i]
+    kpis[1] += plus + minus
+    kpis[2] += plus
+
+
+@njit(cache=True)
+def _finish_kpis(kpis, dt, max_e):
+    """
+    Converts the accumulated powers into the throughput (kWh) and the equivalent cycles.
+    """
+    kpis[1] *= dt
+    kpis[2] *= dt / max_e
+    return kpis
+
+
+@njit(cache=True)
+def jit_strategy_production_saving(p_array, hours, signal, params, dt, init_e, max_e,
+                                   max_charge, max_discharge):
+    """
+    Production saving: charge from the surplus production, discharge into the consumption.
+    """
+    n = p_array.shape[0]
+    battery_plus, battery_minus, p_after, energy_state, kpis = _strategy_outputs(n)
+    current_e = init_e
+    for i in range(n):
+        plus, minus, current_e = _production_saving_step(p_array[i], current_e, dt, max_e,
+                                                         max_charge, max_discharge)
+        _record_step(i, p_array[i], plus, minus, current_e, battery_plus, battery_minus,
+                     p_after, energy_state, kpis)
+    return battery_plus, battery_minus, p_after, energy_state, _finish_kpis(kpis, dt, max_e)
+
+
+@njit(cache=True)
+def jit_strategy_combined(p_array, hours, signal, params, dt, init_e, max_e,
+                          max_charge, max_discharge):
+    """
+    Combined production saving and VT discharging with night charging.
+    """
+    n = p_array.shape[0]
+    battery_plus, battery_minus, p_after, energy_state, kpis = _strategy_outputs(n)
+    current_e = init_e
+    for i in range(n):
+        plus, minus, current_e = _combined_step(hours[i], p_array[i], current_e, dt, max_e,
+                                                max_charge, max_discharge)
+        _record_step(i, p_array[i], plus, minus, current_e, battery_plus, battery_minus,
+                     p_after, energy_state, kpis)
+    return battery_plus, battery_minus, p_after, energy_state, _finish_kpis(kpis, dt, max_e)
+
+
+@njit(cache=True)
+def jit_strategy_MT_VT_shift(p_array, hours, signal, params, dt, init_e, max_e,
+                             max_charge, max_discharge):
+    """
+    MT/VT shifting: charge in MT, discharge in VT.
+    """
+    n = p_array.shape[0]
+    battery_plus, battery_minus, p_after, energy_state, kpis = _strategy_outputs(n)
+    current_e = init_e
+    for i in range(n):
+        plus, minus, current_e = _MT_VT_shift_step(hours[i], current_e, dt, max_e,
+                                                   max_charge, max_discharge)
+        _record_step(i, p_array[i], plus, minus, current_e, battery_plus, battery_minus,
+                     p_after, energy_state, kpis)
+    return battery_plus, battery_minus, p_after, energy_state, _finish_kpis(kpis, dt, max_e)
+
+
+@njit(cache=True)
+def jit_strategy_5tariff(p_array, hours, signal, params, dt, init_e, max_e,
+                         max_charge, max_discharge):
+    """
+    5Tariff_manoeuvering: charge and discharge by the hours of the five tariff blocks.
+    """
+    n = p_array.shape[0]
+    battery_plus, battery_minus, p_after, energy_state, kpis = _strategy_outputs(n)
+    current_e = init_e
+    for i in range(n):
+        plus, minus, current_e = _5tariff_step(hours[i], current_e, dt, max_e,
+                                               max_charge, max_discharge)
+        _record_step(i, p_array[i], plus, minus, current_e, battery_plus, battery_minus,
+                     p_after, energy_state, kpis)
+    return battery_plus, battery_minus, p_after, energy_state, _finish_kpis(kpis, dt, max_e)
+
+
+@njit(cache=True)
+def jit_strategy_p_limit(p_array, hours, signal, params, dt, init_e, max_e,
+                         max_charge, max_discharge):
+    """
+    Hold the power below the p_limit of every timestep, given as the signal.
+    """
+    n = p_array.shape[0]
+    battery_plus, battery_minus, p_after, energy_state, kpis = _strategy_outputs(n)
+    current_e = init_e
+    for i in range(n):
+        plus, minus, current_e = _p_limit_step(p_array[i], signal[i], current_e, dt, max_e,
+                                               max_charge, max_discharge)
+        _record_step(i, p_array[i], plus, minus, current_e, battery_plus, battery_minus,
+                     p_after, energy_state, kpis)
+    return battery_plus, battery_minus, p_after, energy_state, _finish_kpis(kpis, dt, max_e)
+
+
+@njit(cache=True)
+def jit_strategy_schedule(p_array, hours, signal, params, dt, init_e, max_e,
+                          max_charge, max_discharge):
+    """
+    Follow a precomputed schedule, the signal is the battery energy after every timestep.
+    """
+    n = p_array.shape[0]
+    battery_plus, battery_minus, p_after, energy_state, kpis = _strategy_outputs(n)
+    current_e = init_e
+    for i in range(n):
+        plus = 0.0
+        minus = 0.0
+        if signal[i] > current_e:
+            minus = (signal[i] - current_e) / dt
+        else:
+            plus = (current_e - signal[i]) / dt
+        current_e = signal[i]
+        _record_step(i, p_array[i], plus, minus, current_e, battery_plus, battery_minus,
+                     p_after, energy_state, kpis)
+    return battery_plus, battery_minus, p_after, energy_state, _finish_kpis(kpis, dt, max_e)
+
+
+@njit(cache=True)
+def _price_threshold_step(price, low, high, p, current_e, dt, max_e, max_charge, max_discharge,
+                          allow_export):
+    """
+    One timestep of the price threshold control, returns the discharge and charge amounts (kW)
+    and the battery energy (kWh) after the timestep.
+    At a price up to low the battery charges from the grid, at a price from high on it
+    discharges into the consumption, or also into the grid if allow_export.
+    """
+    plus = 0.0
+    minus = 0.0
+    if price <= low:
+        minus = min(max_charge, (max_e - current_e) / dt)
+        if minus < 0:
+            minus = 0.0
+        current_e += minus * dt
+    elif price >= high:
+        plus = max_discharge if allow_export else min(max_discharge, max(p, 0.0))
+        plus = min(plus, current_e / dt)
+        if plus < 0:
+            plus = 0.0
+        current_e -= plus * dt
+    return plus, minus, current_e
+
+
+@njit(cache=True)
+def jit_strategy_price_threshold(p_array, hours, signal, params, dt, init_e, max_e,
+                                 max_charge, max_discharge):
+    """
+    Charge at prices up to the low threshold and discharge at prices from the high one on.
+    The signal is the price of every timestep, the params are the low and high thresholds
+    and 1 to allow the export of the discharged energy.
+    """
+    n = p_array.shape[0]
+    battery_plus, battery_minus, p_after, energy_state, kpis = _strategy_outputs(n)
+    low = params[0]
+    high = params[1]
+    allow_export = params[2] > 0
+    current_e = init_e
+    for i in range(n):
+        plus, minus, current_e = _price_threshold_step(signal[i], low, high, p_array[i], current_e, dt,
+                                                       max_e, max_charge, max_discharge, allow_export)
+        _record_step(i, p_array[i], plus, minus, current_e, battery_plus, battery_minus,
+                     p_after, energy_state, kpis)
+    return battery_plus, battery_minus, p_after, energy_state, _finish_kpis(kpis, dt, max_e)
+
+
+
+@njit(cache=True)
+def jit_warm_min_p_limit(p_array, init_e, max_e, max_charge, max_discharge, dt, guess, tol):
+    """
+    Find the smallest feasible p_limit to the tolerance tol, starting from a guess.
+
+    The search brackets the limit by stepping away from the guess with growing
+    steps and bisects the bracket, so a good guess (e.g. the limit of the previous
+    window) needs only a few feasibility checks.
+
+    Parameters:
+      p_array       : 1D array of power values (kW) at each timestep.
+      init_e, max_e, max_charge, max_discharge, dt : as in jit_bisect_min_p_limit.
+      guess         : Initial guess of the limit (kW).
+      tol           : Absolute tolerance of the limit (kW).
+
+    Returns:
+      p_limit       : The smallest feasible p_limit found (kW), at most tol above the minimum.
+      iterations    : Number of feasibility checks.
+    """
+    upper = p_array.max()
+    lower = upper - max_discharge
+    if guess > upper:
+        guess = upper
+    if guess < lower:
+        guess = lower
+    step = max(tol, (upper - lower) / 16)
+    iterations = 1
+    if jit_check_p_limit(p_array, guess, init_e, max_charge, max_discharge, max_e, dt)[0] == 1:
+        # step down until the limit is not feasible any more
+        hi = guess
+        lo = guess
+        while lo > lower:
+            lo = max(hi - step, lower)
+            iterations += 1
+            if jit_check_p_limit(p_array, lo, init_e, max_charge, max_discharge, max_e, dt)[0] == 1:
+                hi = lo
+                step *= 2
+            else:
+                break
+        if hi == lower:
+            return hi, iterations
+    else:
+        # step up until the limit is feasible, the maximum power always is
+        lo = guess
+        hi = guess
+        while hi < upper:
+            hi = min(lo + step, upper)
+            iterations += 1
+            if jit_check_p_limit(p_array, hi, init_e, max_charge, max_discharge, max_e, dt)[0] == 1:
+                break
+            lo = hi
+            step *= 2
+    while hi - lo > tol:
+        mid = 0.5 * (lo + hi)
+        iterations += 1
+        if jit_check_p_limit(p_array, mid, init_e, max_charge, max_discharge, max_e, dt)[0] == 1:
+            hi = mid
+        else:
+            lo = mid
+    return hi, iterations
+
+
+@njit(cache=True)
+def jit_strategy_receding_horizon(p_array, hours, signal, params, dt, init_e, max_e,
+                                  max_charge, max_discharge):
+    """
+    Receding horizon p_limit control.
+
+    Every replan timesteps the smallest p_limit the battery can hold over the
+    forecast (signal) of the next horizon timesteps is found, starting from the
+    current battery energy and warm-started from the previous limit. The battery
+    then holds that limit against the actual power until the next replan.
+
+    params: horizon (timesteps), replan (timesteps) and the tolerance of the limit (kW).
+    """
+    n = p_array.shape[0]
+    horizon = int(params[0])
+    replan = int(params[1])
+    tol = params[2]
+    battery_plus, battery_minus, p_after, energy_state, kpis = _strategy_outputs(n)
+    current_e = init_e
+    p_limit = 0.0
+    for start in range(0, n, replan):
+        end = min(start + horizon, n)
+        if start == 0:
+            p_limit = signal[start:end].max()
+        p_limit, _ = jit_warm_min_p_limit(signal[start:end], current_e, max_e, max_charge,
+                                          max_discharge, dt, p_limit, tol)
+        for i in range(start, min(start + replan, n)):
+            plus, minus, current_e = _p_limit_step(p_array[i], p_limit, current_e, dt, max_e,
+                                                   max_charge, max_discharge)
+            _record_step(i, p_array[i], plus, minus, current_e, battery_plus, battery_minus,
+                         p_after, energy_state, kpis)
+    return battery_plus, battery_minus, p_after, energy_state, _finish_kpis(kpis, dt, max_e)
+
+@njit(parallel=True, cache=True)
+def jit_simulate_production_saving_batch(p_matrix, dt, init_e, max_e, max_charge, max_discharge):
+    """
+    Batched version of jit_simulate_production_saving.
+
+    Parameters:
+      p_matrix      : 2D array of power values (kW), shape (n_consumers, n_steps).
+      dt            : Time step in hours.
+      init_e        : 1D array of initial battery energies (kWh), one per consumer.
+      max_e         : 1D array of battery capacities (kWh), one per consumer.
+      max_charge    : 1D array of maximum charging powers (kW), one per consumer.
+      max_discharge : 1D array of maximum discharging powers (kW), one per consumer.
+
+    Returns:
+      battery_plus, battery_minus, energy_state : 2D arrays of shape (n_consumers, n_steps).
+    """
+    n_rows, n = p_matrix.shape
+    battery_plus = np.zeros((n_rows, n))
+    battery_minus = np.zeros((n_rows, n))
+    energy_state = np.empty((n_rows, n))
+    for r in prange(n_rows):
+        plus, minus, energy = jit_simulate_production_saving(
+            p_matrix[r], dt, init_e[r], max_e[r], max_charge[r], max_discharge[r])
+        battery_plus[r] = plus
+        battery_minus[r] = minus
+        energy_state[r] = energy
+    return battery_plus, battery_minus, energy_state
+
+
+@njit(parallel=True, cache=True)
+def jit_simulate_p_limit_batch(p_matrix, p_limit_matrix, dt, init_e, max_e, max_charge, max_discharge):
+    """
+    Batched version of jit_simulate_p_limit.
+
+    Parameters:
+      p_matrix       : 2D array of power values (kW), shape (n_consumers, n_steps).
+      p_limit_matrix : 2D array of p_limit values, same shape as p_matrix.
+      dt             : Time step in hours.
+      init_e, max_e, max_charge, max_discharge : 1D arrays, one value per consumer.
+
+    Returns:
+      battery_plus, battery_minus, energy_state : 2D arrays of shape (n_consumers, n_steps).
+    """
+    n_rows, n = p_matrix.shape
+    battery_plus = np.zeros((n_rows, n))
+    battery_minus = np.zeros((n_rows, n))
+    energy_state = np.empty((n_rows, n))
+    for r in prange(n_rows):
+        plus, minus, energy = jit_simulate_p_limit(
+            p_matrix[r], p_limit_matrix[r], dt, init_e[r], max_e[r], max_charge[r], max_discharge[r])
+        battery_plus[r] = plus
+        battery_minus[r] = minus
+        energy_state[r] = energy
+    return battery_plus, battery_minus, energy_state
+
+
+@njit(parallel=True, cache=True)
+def jit_min_p_limit_batch(p_matrix, init_e, max_e, max_charge, max_discharge, dt):
+    """
+    Batched version of jit_min_p_limit.
+
+    Parameters:
+      p_matrix : 2D array of power values (kW), shape (n_consumers, n_steps).
+      init_e, max_e, max_charge, max_discharge : 1D arrays, one value per consumer.
+      dt       : Time step in hours.
+
+    Returns:
+      p_limits : 1D array of minimal p_limits, one per consumer.
+      battery_plus, battery_minus, energy_state : 2D arrays of shape (n_consumers, n_steps).
+    """
+    n_rows, n = p_matrix.shape
+    p_limits = np.empty(n_rows)
+    battery_plus = np.zeros((n_rows, n))
+    battery_minus = np.zeros((n_rows, n))
+    energy_state = np.empty((n_rows, n))
+    for r in prange(n_rows):
+        p_limit, plus, minus, energy = jit_min_p_limit(
+            p_matrix[r], init_e[r], max_e[r], max_charge[r], max_discharge[r], dt)
+        p_limits[r] = p_limit
+        battery_plus[r] = plus
+        battery_minus[r] = minus
+        energy_state[r] = energy
+    return p_limits, battery_plus, battery_minus, energy_state
+
+
+@njit(parallel=True, cache=True)
+def jit_simulate_MT_VT_shift_batch(hours, n_rows, dt, init_e, max_e, max_charge, max_discharge):
+    """
+    Batched version of jit_simulate_MT_VT_shift. The hours are shared by all consumers.
+
+    Parameters:
+      hours  : 1D array of hour values for each timestep.
+      n_rows : Number of consumers.
+      dt, init_e, max_e, max_charge, max_discharge : as above, one value per consumer.
+
+    Returns:
+      battery_plus, battery_minus, energy_state : 2D arrays of shape (n_rows, n_steps).
+    """
+    n = hours.shape[0]
+    battery_plus = np.zeros((n_rows, n))
+    battery_minus = np.zeros((n_rows, n))
+    energy_state = np.empty((n_rows, n))
+    for r in prange(n_rows):
+        plus, minus, energy = jit_simulate_MT_VT_shift(
+            hours, dt, init_e[r], max_e[r], max_charge[r], max_discharge[r])
+        battery_plus[r] = plus
+        battery_minus[r] = minus
+        energy_state[r] = energy
+    return battery_plus, battery_minus, energy_state
+
+
+@njit(parallel=True, cache=True)
+def jit_simulate_5tariff_batch(hours, n_rows, dt, init_e, max_e, max_charge, max_discharge):
+    """
+    Batched version of jit_simulate_5tariff. The hours are shared by all consumers.
+
+    Parameters:
+      hours  : 1D array of hour values for each timestep.
+      n_rows : Number of consumers.
+      dt, init_e, max_e, max_charge, max_discharge : as above, one value per consumer.
+
+    Returns:
+      battery_plus, battery_minus, energy_state : 2D arrays of shape (n_rows, n_steps).
+    """
+    n = hours.shape[0]
+    battery_plus = np.zeros((n_rows, n))
+    battery_minus = np.zeros((n_rows, n))
+    energy_state = np.empty((n_rows, n))
+    for r in prange(n_rows):
+        plus, minus, energy = jit_simulate_5tariff(
+            hours, dt, init_e[r], max_e[r], max_charge[r], max_discharge[r])
+        battery_plus[r] = plus
+        battery_minus[r] = minus
+        energy_state[r] = energy
+    return battery_plus, battery_minus, energy_state
+
+
+@njit(parallel=True, cache=True)
+def jit_simulate_combined_batch(hours, p_matrix, dt, init_e, max_e, max_charge, max_discharge):
+    """
+    Batched version of jit_simulate_combined. The hours are shared by all consumers.
+
+    Parameters:
+      hours    : 1D array of hour values for each timestep.
+      p_matrix : 2D array of power values (kW), shape (n_consumers, n_steps).
+      dt, init_e, max_e, max_charge, max_discharge : as above, one value per consumer.
+
+    Returns:
+      battery_plus, battery_minus, energy_state : 2D arrays of shape (n_consumers, n_steps).
+    """
+    n_rows, n = p_matrix.shape
+    battery_plus = np.zeros((n_rows, n))
+    battery_minus = np.zeros((n_rows, n))
+    energy_state = np.empty((n_rows, n))
+    for r in prange(n_rows):
+        plus, minus, energy = jit_simulate_combined(
+            hours, p_matrix[r], dt, init_e[r], max_e[r], max_charge[r], max_discharge[r])
+        battery_plus[r] = plus
+        battery_minus[r] = minus
+        energy_state[r] = energy
+    return battery_plus, battery_minus, energy_state
+
+
+# control types of BS.sweep and BS.ensemble, in the order of their codes in _run_control
+SWEEP_CONTROL_TYPES = (
+    "production_saving",
+    "combined_production_vt",
+    "installed_power",
+    "block_power_reduction",
+    "monthly_block_power_reduction",
+    "MT_VT_shifting",
+    "5Tariff_manoeuvering",
+)
+
+
+@njit(cache=True)
+def _run_control(control, p_array, hours, block_array, p_sorted, block_sorted, offsets, month_pos,
+                 dt, init_e, max_e, max_charge, max_discharge):
+    """
+    Simulate one battery with the control type of the given code in SWEEP_CONTROL_TYPES.
+
+    Parameters:
+      control       : Position of the control type in SWEEP_CONTROL_TYPES.
+      p_array       : 1D array of power values (kW) at each timestep.
+      hours         : 1D array of hour values for each timestep.
+      block_array   : 1D array of tariff blocks (1-5) for each timestep.
+      p_sorted      : p_array grouped by month.
+      block_sorted  : block_array grouped by month.
+      offsets       : 1D array of length n_months + 1, month m spans offsets[m]:offsets[m + 1]
+                      of the grouped arrays.
+      month_pos     : 1D array of the month of every timestep (0 to n_months - 1).
+      dt            : Time step in hours.
+      init_e        : Initial battery energy (kWh).
+      max_e         : Maximum battery capacity (kWh).
+      max_charge    : Maximum charging power (kW).
+      max_discharge : Maximum discharging power (kW).
+
+    Returns:
+      battery_plus  : 1D array of discharging power (kW).
+      battery_minus : 1D array of charging power (kW).
+      energy_state  : 1D array of the battery energy (kWh).
+    """
+    n = p_array.shape[0]
+    n_months = offsets.shape[0] - 1
+    if control == 0:
+        return jit_simulate_production_saving(
+            p_array, dt, init_e, max_e, max_charge, max_discharge)
+    elif control == 1:
+        return jit_simulate_combined(
+            hours, p_array, dt, init_e, max_e, max_charge, max_discharge)
+    elif control == 2:
+        _, plus, minus, energy = jit_min_p_limit(
+            p_array, init_e, max_e, max_charge, max_discharge, dt)
+        return plus, minus, energy
+    elif control == 3 or control == 4:
+        p_limit_array = np.empty(n)
+        if control == 3:
+            limits = jit_find_p_limits(p_array, block_array, max_e, max_charge, max_discharge, dt)
+            for i in range(n):
+                p_limit_array[i] = limits[block_array[i] - 1]
+        else:
+            monthly_limits = np.empty((n_months, 5))
+            for m in range(n_months):
+                monthly_limits[m] = jit_find_p_limits(p_sorted[offsets[m]:offsets[m + 1]],
+                                                      block_sorted[offsets[m]:offsets[m + 1]],
+                                                      max_e, max_charge, max_discharge, dt)
+            for i in range(n):
+                p_limit_array[i] = monthly_limits[month_pos[i], block_array[i] - 1]
+        return jit_simulate_p_limit(
+            p_array, p_limit_array, dt, init_e, max_e, max_charge, max_discharge)
+    elif control == 5:
+        return jit_simulate_MT_VT_shift(
+            hours, dt, init_e, max_e, max_charge, max_discharge)
+    else:
+        return jit_simulate_5tariff(
+            hours, dt, init_e, max_e, max_charge, max_discharge)
+
+
+@njit(parallel=True, cache=True)
+def jit_sweep(control, p_array, hours, block_array, p_sorted, block_sorted, offsets, month_pos,
+              capacities, powers, dt):
+    """
+    Simulate a grid of battery sizes over one profile in parallel and return their KPIs.
+
+    Every battery starts fully charged and charges and discharges with the same power.
+    The results of a battery are only kept until its KPIs are computed.
+
+    Parameters:
+      control       : Position of the control type in SWEEP_CONTROL_TYPES.
+      p_array       : 1D array of power values (kW) at each timestep.
+      hours         : 1D array of hour values for each timestep.
+      block_array   : 1D array of tariff blocks (1-5) for each timestep.
+      p_sorted      : p_array grouped by month.
+      block_sorted  : block_array grouped by month.
+      offsets       : 1D array of length n_months + 1, month m spans offsets[m]:offsets[m + 1]
+                      of the grouped arrays.
+      month_pos     : 1D array of the month of every timestep (0 to n_months - 1).
+      capacities    : 1D array of battery capacities (kWh).
+      powers        : 1D array of battery powers (kW).
+      dt            : Time step in hours.
+
+    Returns:
+      peak_reduction : 2D array (capacities x powers) of max(p) - max(p_after) (kW).
+      energy_shifted : 2D array of the discharged energy (kWh).
+      cycles         : 2D array of the equivalent full cycles.
+    """
+    n = p_array.shape[0]
+    n_e = capacities.shape[0]
+    n_p = powers.shape[0]
+    peak_reduction = np.zeros((n_e, n_p))
+    energy_shifted = np.zeros((n_e, n_p))
+    cycles = np.zeros((n_e, n_p))
+    if n == 0:
+        return peak_reduction, energy_shifted, cycles
+    max_p = p_array.max()
+
+    for s in prange(n_e * n_p):
+        e_i = s // n_p
+        p_i = s % n_p
+        max_e = capacities[e_i]
+        power = powers[p_i]
+        plus, minus, energy = _run_control(control, p_array, hours, block_array, p_sorted, block_sorted,
+                                           offsets, month_pos, dt, max_e, max_e, power, power)
+
+        peak = p_array[0] - plus[0] + minus[0]
+        discharged = 0.0
+        for i in range(n):
+            p_after = p_array[i] - plus[i] + minus[i]
+            if p_after > peak:
+                peak = p_after
+            discharged += plus[i]
+        peak_reduction[e_i, p_i] = max_p - peak
+        energy_shifted[e_i, p_i] = discharged * dt
+        cycles[e_i, p_i] = discharged * dt / max_e
+    return peak_reduction, energy_shifted, cycles
+
+
+@njit(parallel=True, cache=True)
+def jit_ensemble(control, p_array, pv_array, hours, block_array, order, offsets, month_pos,
+                 seeds, noise_std, max_shift, pv_scale_std, dt, init_e, max_e, max_charge, max_discharge):
+    """
+    Simulate one battery over an ensemble of perturbed profiles in parallel and return their KPIs.
+
+    Scenario k seeds the random generator with seeds[k] and draws a circular shift of
+    the load (the profile without the PV) of up to max_shift timesteps, a PV scale of
+    1 + pv_scale_std * N(0, 1), clipped at 0, and a N(0, noise_std) noise at every
+    timestep. A scenario only uses its own seed, so the results do not depend on the
+    number of threads. The profiles and results of a scenario are only kept until its
+    KPIs are computed.
+
+    Parameters:
+      control       : Position of the control type in SWEEP_CONTROL_TYPES.
+      p_array       : 1D array of power values (kW) at each timestep.
+      pv_array      : 1D array of the PV power (kW, negative) included in p_array.
+      hours         : 1D array of hour values for each timestep.
+      block_array   : 1D array of tariff blocks (1-5) for each timestep.
+      order         : 1D array of the timesteps grouped by month.
+      offsets       : 1D array of length n_months + 1, month m spans offsets[m]:offsets[m + 1]
+                      of the grouped timesteps.
+      month_pos     : 1D array of the month of every timestep (0 to n_months - 1).
+      seeds         : 1D array of the seeds of the scenarios.
+      noise_std     : Standard deviation of the noise (kW).
+      max_shift     : Largest shift of the load (timesteps).
+      pv_scale_std  : Standard deviation of the PV scale.
+      dt            : Time step in hours.
+      init_e        : Initial battery energy (kWh).
+      max_e         : Maximum battery capacity (kWh).
+      max_charge    : Maximum charging power (kW).
+      max_discharge : Maximum discharging power (kW).
+
+    Returns:
+      kpis          : 2D array with a row per scenario and the columns peak before and
+                      after the battery (kW), throughput (kWh), equivalent cycles and
+                      the state of charge at the end.
     """
-    n = hours.shape[0]
-    battery_plus = np.zeros(n)
-    battery_minus = np.zeros(n)
-    energy_state = np.empty(n)
-    current_e = init_e
+    n = p_array.shape[0]
+    n_scenarios = seeds.shape[0]
+    kpis = np.zeros((n_scenarios, 5))
+    if n == 0:
+        return kpis
+    block_sorted = block_array[order]
+
+    for k in prange(n_scenarios):
+        np.random.seed(seeds[k])
+        shift = np.random.randint(-max_shift, max_shift + 1) if max_shift > 0 else 0
+        pv_scale = max(0., 1. + pv_scale_std * np.random.standard_normal())
+        p_k = np.empty(n)
+        for i in range(n):
+            j = (i - shift) % n
+            p_k[i] = p_array[j] - pv_array[j] + pv_scale * pv_array[i]
+            if noise_std > 0:
+                p_k[i] += noise_std * np.random.standard_normal()
+        plus, minus, energy = _run_control(control, p_k, hours, block_array, p_k[order], block_sorted,
+                                           offsets, month_pos, dt, init_e, max_e, max_charge, max_discharge)
+
+        peak_before = p_k[0]
+        peak_after = p_k[0] - plus[0] + minus[0]
+        throughput = 0.0
+        discharged = 0.0
+        for i in range(n):
+            if p_k[i] > peak_before:
+                peak_before = p_k[i]
+            p_after = p_k[i] - plus[i] + minus[i]
+            if p_after > peak_after:
+                peak_after = p_after
+            throughput += plus[i] + minus[i]
+            discharged += plus[i]
+        kpis[k, 0] = peak_before
+        kpis[k, 1] = peak_after
+        kpis[k, 2] = throughput * dt
+        kpis[k, 3] = discharged * dt / max_e
+        kpis[k, 4] = energy[n - 1] / max_e
+    return kpis
+
+
+@njit(parallel=True, cache=True)
+def jit_price_threshold_sweep(p_matrix, price, export_price, lows, highs, allow_export, dt,
+                              init_e, max_e, max_charge, max_discharge):
+    """
+    Simulate the price threshold control of every profile with every pair of thresholds
+    in parallel and return their KPIs.
 
-    for i in range(n):
-        hr = hours[i]
-        p = p_array[i]
-        
-        # Case 1: Surplus production (p < 0) -> charge battery (production saving charging logic)
-        if p < 0:
-            available_power = -p  # available production for charging
-            if current_e + dt * available_power < max_e:
-                charge_amt = available_power if available_power < max_charge else max_charge
+    The energy cost is the imported energy at the price less the exported energy at
+    the export price. Only the KPIs of a simulation are kept.
+
+    Parameters:
+      p_matrix      : 2D array of power values (kW), one profile per row.
+      price         : 1D array of the price of every timestep (EUR/kWh).
+      export_price  : 1D array of the export price of every timestep (EUR/kWh).
+      lows          : 1D array of the low (charging) thresholds.
+      highs         : 1D array of the high (discharging) thresholds, one per low threshold.
+      allow_export  : Discharge into the grid too, not only into the consumption.
+      dt            : Time step in hours.
+      init_e        : 1D array of initial battery energy (kWh), one per profile.
+      max_e         : 1D array of maximum battery capacity (kWh), one per profile.
+      max_charge    : 1D array of maximum charging power (kW), one per profile.
+      max_discharge : 1D array of maximum discharging power (kW), one per profile.
+
+    Returns:
+      cost_before   : 1D array of the energy cost of every profile without the battery.
+      cost          : 2D array (profiles x threshold pairs) of the energy cost with the battery.
+      peak          : 2D array of the peak power after the battery (kW).
+      throughput    : 2D array of the charged and discharged energy (kWh).
+      cycles        : 2D array of the equivalent full cycles.
+    """
+    n_rows, n = p_matrix.shape
+    n_pairs = lows.shape[0]
+    cost_before = np.zeros(n_rows)
+    cost = np.zeros((n_rows, n_pairs))
+    peak = np.zeros((n_rows, n_pairs))
+    throughput = np.zeros((n_rows, n_pairs))
+    cycles = np.zeros((n_rows, n_pairs))
+
+    for s in prange(n_rows * n_pairs):
+        r = s // n_pairs
+        k = s % n_pairs
+        current_e = init_e[r]
+        row_cost = 0.0
+        row_cost_before = 0.0
+        row_peak = 0.0
+        row_throughput = 0.0
+        discharged = 0.0
+        for i in range(n):
+            p = p_matrix[r, i]
+            plus, minus, current_e = _price_threshold_step(price[i], lows[k], highs[k], p, current_e, dt,
+                                                           max_e[r], max_charge[r], max_discharge[r],
+                                                           allow_export)
+            p_after = p - plus + minus
+            if i == 0 or p_after > row_peak:
+                row_peak = p_after
+            if p_after > 0:
+                row_cost += p_after * price[i]
             else:
-                charge_amt = (max_e - current_e) / dt
-                if charge_amt > max_charge:
-                    charge_amt = max_charge
-            current_e += charge_amt * dt
-            battery_minus[i] = charge_amt
-        
-        # Case 2: VT period (6 <= hr <= 21)
-        elif 6 <= hr <= 22:
-            # If there is consumption, discharge at max power until battery is empty
+                row_cost += p_after * export_price[i]
             if p > 0:
-                # discharge only the amount to 0
-                discharge_amt = max_discharge if p > max_discharge else p
-                # Ensure we don't discharge more than what is available in the battery:
-                if current_e < discharge_amt * dt:
-                    discharge_amt = current_e / dt  # discharge the remaining energy
-                current_e -= discharge_amt * dt
-                battery_plus[i] = discharge_amt
+                row_cost_before += p * price[i]
             else:
-                # No consumption; do not discharge.
-                battery_plus[i] = 0.0
-        
-        # Case 3: Nighttime (hr <= 5 or hr >= 22) -> charge battery (shifting nighttime logic)
-        else:
-            charge_amt = max_e / 8
-            cand = (max_e - current_e) * 4
-            if cand < charge_amt:
-                charge_amt = cand
-            if max_charge < charge_amt:
-                charge_amt = max_charge
-            current_e += charge_amt * dt
-            battery_minus[i] = charge_amt
-        
-        energy_state[i] = current_e
+                row_cost_before += p * export_price[i]
+            row_throughput += plus + minus
+            discharged += plus
+        if k == 0:
+            cost_before[r] = row_cost_before * dt
+        cost[r, k] = row_cost * dt
+        peak[r, k] = row_peak
+        throughput[r, k] = row_throughput * dt
+        cycles[r, k] = discharged * dt / max_e[r]
+    return cost_before, cost, peak, throughput, cycles
+
+
+# Argument types of the kernels as BS calls them. The hours come from the read-only TimeAxis arrays.
+_F8 = types.float64
+_I8 = types.int64
+_F8_1D = types.Array(types.float64, 1, "C")
+_F8_2D = types.Array(types.float64, 2, "C")
+_I8_1D = types.Array(types.int64, 1, "C")
+_HOURS = types.Array(types.int64, 1, "C", readonly=True)
+# the power profile is passed as a read-only view of the input
+_P = types.Array(types.float64, 1, "C", readonly=True)
+
+# signature of the strategy kernels
+STRATEGY_SIGNATURE = (_P, _HOURS, _F8_1D, _F8_1D, _F8, _F8, _F8, _F8, _F8)
+
+# signal and params of the strategies that do not use them
+_NO_SIGNAL = np.zeros(0)
+_NO_PARAMS = np.zeros(0)
+
+
+class ControlStrategy:
+    """
+    Control strategy of BS.model.
 
-    return battery_plus, battery_minus, energy_state
+    Attributes
+    ----------
+    kernel : numba dispatcher
+        Strategy kernel with the uniform signature
+        kernel(p_array, hours, signal, params, dt, init_e, max_e, max_charge, max_discharge)
+        returning battery_plus, battery_minus (negative), p_after, energy_state and
+        the KPIs (peak, throughput, cycles).
+    prepare : callable or None
+        prepare(battery, p_array, control_params) returns the signal and the params
+        of the kernel and a dict of extra results ("block", "p_limit").
+        Strategies without it get empty ones.
+    helper_kernels : list of tuple
+        Kernels used by prepare and their signatures, compiled by warmup().
+    """
+
+    __slots__ = ("kernel", "prepare", "helper_kernels")
+
+    def __init__(self, kernel, prepare=None, helper_kernels=()):
+        self.kernel = kernel
+        self.prepare = prepare
+        self.helper_kernels = list(helper_kernels)
+
+    def __repr__(self):
+        return f"ControlStrategy(kernel={self.kernel.py_func.__name__})"
+
+
+# registered control strategies and the kernels and signatures used by each of them
+CONTROL_STRATEGIES = {}
+KERNEL_SIGNATURES = {}
+
+
+def register_strategy(control_type: str, kernel, prepare=None, helper_kernels=()):
+    """
+    Register a control strategy, making it available as control_type in BS.model.
+
+    Parameters
+    ----------
+    control_type : str
+        Name of the control type.
+    kernel : numba dispatcher
+        Strategy kernel, see ControlStrategy.
+    prepare : callable
+        Computes the signal and params of the kernel, see ControlStrategy.
+    helper_kernels : list of tuple
+        (kernel, signature) of the kernels used by prepare.
+    """
+    CONTROL_STRATEGIES[control_type] = ControlStrategy(kernel, prepare, helper_kernels)
+    KERNEL_SIGNATURES[control_type] = list(helper_kernels) + [(kernel, STRATEGY_SIGNATURE)]
+
+
+# prepared control types BS.step_chunk can simulate, with their limits precomputed
+CHUNK_CONTROL_TYPES = ("installed_power", "block_power_reduction", "monthly_block_power_reduction")
+
+
+# kernels and their signatures used by BS.simulate_many
+BATCH_KERNEL_SIGNATURES = {
+    "production_saving": [
+        (jit_simulate_production_saving_batch, (_F8_2D, _F8, _F8_1D, _F8_1D, _F8_1D, _F8_1D)),
+    ],
+    "combined_production_vt": [
+        (jit_simulate_combined_batch, (_HOURS, _F8_2D, _F8, _F8_1D, _F8_1D, _F8_1D, _F8_1D)),
+    ],
+    "installed_power": [
+        (jit_min_p_limit_batch, (_F8_2D, _F8_1D, _F8_1D, _F8_1D, _F8_1D, _F8)),
+    ],
+    "MT_VT_shifting": [
+        (jit_simulate_MT_VT_shift_batch, (_HOURS, _I8, _F8, _F8_1D, _F8_1D, _F8_1D, _F8_1D)),
+    ],
+    "5Tariff_manoeuvering": [
+        (jit_simulate_5tariff_batch, (_HOURS, _I8, _F8, _F8_1D, _F8_1D, _F8_1D, _F8_1D)),
+    ],
+}
+
+
+def warmup(control_types=None, batched: bool = False):
+    """
+    Compile the kernels of the given control types ahead of their first use.
+
+    The kernels are compiled lazily and cached on disk, so a warm-up in a fresh
+    process only loads them from the cache. Only the kernels of the requested
+    control types are compiled.
+
+    Parameters
+    ----------
+    control_types : str or list of str
+        Control types to compile, all of them by default.
+    batched : bool
+        Compile the kernels of BS.simulate_many instead of BS.model.
+
+    Returns
+    -------
+    dict
+        Seconds spent per kernel, keyed by the kernel name.
+    """
+    signatures = BATCH_KERNEL_SIGNATURES if batched else KERNEL_SIGNATURES
+    if control_types is None:
+        control_types = list(signatures)
+    elif isinstance(control_types, str):
+        control_types = [control_types]
+    timings = {}
+    for control_type in control_types:
+        if control_type not in signatures:
+            raise ValueError(f"Unknown control type {control_type}.")
+        for kernel, signature in signatures[control_type]:
+            name = kernel.py_func.__name__
+            if name in timings:
+                continue
+            start = time.perf_counter()
+            kernel.compile(signature)
+            timings[name] = time.perf_counter() - start
+    return timings
+
+
+class BSResult:
+    """
+    Results of a battery simulation backed by NumPy arrays.
+
+    The results are converted to pandas only on request, by indexing a column or
+    with to_frame(). The power p is a read-only view of the simulated input, which
+    is neither copied nor modified. p_after is computed on first access unless the
+    strategy kernel already returned it.
+
+    Attributes
+    ----------
+    index : pd.DatetimeIndex
+        Timestamps of the results.
+    p : np.ndarray
+        Power in kW before the battery.
+    battery_plus : np.ndarray
+        Discharging power of the battery in kW.
+    battery_minus : np.ndarray
+        Charging power of the battery in kW, stored as negative values.
+    p_after : np.ndarray
+        Power in kW after the battery.
+    var_bat : np.ndarray
+        Energy of the battery in kWh after every timestep.
+    block : np.ndarray or None
+        Tariff block of every timestep for the block based control types.
+    p_limit : np.ndarray or None
+        Power limit of every timestep for the limit based control types.
+    kpis : dict or None
+        Peak power after the battery (kW), throughput (kWh) and equivalent cycles.
+    columns : list of str
+        Names of the available results.
+
+    Methods
+    -------
+    to_frame()
+        Returns the results as a DataFrame.
+    """
+
+    __slots__ = ("_index", "_p", "_battery_plus", "_battery_minus", "_var_bat",
+                 "_block", "_p_limit", "_p_after", "_kpis")
+
+    def __init__(self,
+                 index: pd.DatetimeIndex,
+                 p: np.ndarray,
+                 battery_plus: np.ndarray,
+                 battery_minus: np.ndarray,
+                 var_bat: np.ndarray,
+                 block: np.ndarray = None,
+                 p_limit: np.ndarray = None,
+                 p_after: np.ndarray = None,
+                 kpis: np.ndarray = None):
+        self._index = index
+        self._p = p
+        self._battery_plus = battery_plus
+        self._battery_minus = battery_minus
+        self._var_bat = var_bat
+        self._block = block
+        self._p_limit = p_limit
+        self._p_after = p_after
+        self._kpis = kpis
+
+    def __repr__(self):
+        return f"BSResult(n={len(self)}, columns={self.columns})"
+
+    def __len__(self):
+        return len(self._p)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        if name not in self.columns:
+            raise KeyError(name)
+        return pd.Series(getattr(self, name), index=self._index, name=name)
+
+    # Properties
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def p(self):
+        return self._p
+
+    @property
+    def battery_plus(self):
+        return self._battery_plus
+
+    @property
+    def battery_minus(self):
+        return self._battery_minus
+
+    @property
+    def p_after(self):
+        if self._p_after is None:
+            self._p_after = self._p - self._battery_plus - self._battery_minus
+        return self._p_after
+
+    @property
+    def var_bat(self):
+        return self._var_bat
+
+    @property
+    def block(self):
+        return self._block
+
+    @property
+    def p_limit(self):
+        return self._p_limit
+
+    @property
+    def kpis(self):
+        if self._kpis is None:
+            return None
+        return dict(zip(("peak", "throughput", "cycles"), self._kpis.tolist()))
+
+    @property
+    def columns(self):
+        columns = ["p", "battery_plus", "battery_minus"]
+        if self._block is not None:
+            columns.append("block")
+        if self._p_limit is not None:
+            columns.append("p_limit")
+        return columns + ["p_after", "var_bat"]
+
+    # Methods
+    def to_frame(self):
+        """
+        Returns the results as a DataFrame with one column per result.
+        """
+        return pd.DataFrame({name: getattr(self, name) for name in self.columns},
+                            index=self._index)
 
 
 class BS(BaseModel):
@@ -498,6 +1914,7 @@ class BS(BaseModel):
         self.discharge_amount = 0.
         self.curr_limit = 0.
         self.p_limits = []
+        self.monthly_p_limits = {}
 
     def __repr__(self):
         return f"BS model(index={self.index}, name={self.name})"
@@ -538,6 +1955,13 @@ class BS(BaseModel):
     def current_e_kwh(self):
         return self._current_e_kwh
 
+    @property
+    def dt(self):
+        """
+        Time step of the simulation in hours.
+        """
+        return self.freq_mins / 60
+
     #__________________________________________________________________________
     # Setters
     #__________________________________________________________________________
@@ -663,146 +2087,619 @@ class BS(BaseModel):
 
     def model(self,
               control_type: str = "production_saving",
-              p_kw: pd.DataFrame = None):
+              p_kw: pd.DataFrame = None,
+              control_params: dict = None):
         """
         Model the controller and run it.
 
         Parameters
         ----------
         control_type : str
-            control_type of simulation, where options are "production_saving", block_power_reduction and "installed_power".
+            control_type of simulation, where options are "production_saving", block_power_reduction, "installed_power",
+            "optimal_cost", "receding_horizon", "price_threshold" and the other registered strategies
+            (CONTROL_STRATEGIES).
         p_kw : pd.DataFrame
-            Power in kW in 15 min intervals where the index is the timestamp.
+            Power in kW in intervals of the battery freq where the index is the timestamp.
             in a format:
             |      Timestamp      |     p      |
             |---------------------|------------|
             | 2020-01-01 00:00:00 |    0.0     |
             | 2020-01-01 00:15:00 |    0.0     |
             |         ...         |    ...     |
+        control_params : dict
+            Parameters of the "optimal_cost" control:
+            price : float or array-like
+                Price of the imported energy at every timestep.
+            block_prices : array-like
+                Prices of the imported energy in the tariff blocks 1-5, used when price is not given.
+            tariff_mask : np.ndarray
+                Tariff masks from individual_tariff_times, used instead of the blocks of the index.
+            export_price : float or array-like
+                Price of the exported energy, 0 by default.
+            power_prices : array-like
+                Prices of the imported energy above the power limits of the blocks 1-5, 0 by default.
+            p_limits : array-like
+                Power limits of the blocks 1-5. Default to the limits of "block_power_reduction".
+            n_soc_levels : int
+                Number of battery energy levels, 51 by default and at most MAX_SOC_LEVELS.
+            Parameters of the "receding_horizon" control:
+            forecast : array-like
+                Forecast of the power at every timestep, by default the power of the day before.
+            horizon : int
+                Timesteps looked ahead when planning, one day by default.
+            replan : int
+                Timesteps between two plans, one hour by default.
+            tol : float
+                Tolerance of the planned p_limit in kW, 0.001 by default.
+            Parameters of the "price_threshold" control:
+            price : array-like
+                Price of the energy at every timestep, e.g. day-ahead spot prices.
+            low_percentile, high_percentile : float
+                Percentiles of the price below and above which the battery charges and
+                discharges, 25 and 75 by default.
+            low, high : float
+                Price thresholds, used instead of the percentiles.
+            allow_export : bool
+                Discharge into the grid too, False by default.
+
+        Returns
+        -------
+        BSResult
+            The results of the simulation, p_kw is left unchanged.
         """
         if p_kw is None:
             raise ValueError(
                 "We need a timeseries data to simulate the battery.")
-        lst = []
-        self.results = p_kw
-        self.results["battery_plus"] = 0.
-        self.results["battery_minus"] = 0.
-        if control_type == "production_saving":
-            dt = 0.25  # 15-minute interval in hours
-            p_array = self.results["p"].values.astype(np.float64)
-            init_e = self.current_e_kwh
-            battery_plus, battery_minus, energy_state = jit_simulate_production_saving(
-                p_array, dt, init_e, self.max_e_kwh,
-                self.max_charge_p_kw, self.max_discharge_p_kw
-            )
-            self.results["battery_plus"] = battery_plus
-            # Note: production saving typically subtracts charging (so store negative)
-            self.results["battery_minus"] = -battery_minus
-            self.results["p_after"] = self.results["p"] - battery_plus - (-battery_minus)
-            self.results["var_bat"] = energy_state
-            self.current_e_kwh = energy_state[-1]
-            lst = list(energy_state)
-        elif control_type == "combined_production_vt":
-            dt = 0.25
-            hours = np.array([(ts - pd.Timedelta(minutes=1)).hour for ts in self.results.index], dtype=np.int32)
-            p_array = self.results["p"].values.astype(np.float64)
-            init_e = self.current_e_kwh
-            battery_plus, battery_minus, energy_state = jit_simulate_combined(
-                hours, p_array, dt, init_e, self.max_e_kwh,
-                self.max_charge_p_kw, self.max_discharge_p_kw
-            )
-            self.results["battery_plus"] = battery_plus
-            self.results["battery_minus"] = -battery_minus
-            self.results["p_after"] = self.results["p"] - battery_plus - (-battery_minus)
-            self.results["var_bat"] = energy_state
-            self.current_e_kwh = energy_state[-1]
-            lst = list(energy_state)
-        elif control_type == "installed_power":
-            p_limit = round(self.get_min_p_lim(), 1)
-            self.results["p_limit"] = p_limit
-            self.curr_limit = p_limit
-            lst = self.simulate_p_limit()
-        elif control_type == "block_power_reduction":
-            # Find installed power limits for every block      
-            dates = np.array(list(self.results.index))
-            tariffs = individual_tariff_times(dates)
-            blocks = np.argmax(tariffs, axis=0) + 1 
-            self.results["block"] = blocks
-            self.p_limits = self.find_p_limits()
-            self.results["p_limit"] = 0
-            for block in range(1, 6):
-                self.results.loc[self.results.block == block, "p_limit"] = self.p_limits[block-1]
-            lst = self.simulate_p_limit()
-        elif control_type == "monthly_block_power_reduction":
-            dates = np.array(list(self.results.index))
-            tariffs = individual_tariff_times(dates)
-            blocks = np.argmax(tariffs, axis=0) + 1 
-            self.results["block"] = blocks
-            first_dates = extract_first_date_of_month(self.results)
-            self.results["p_limit"] = 0
-            for date in first_dates:
-                month_df = self.results[(((self.results.index- pd.Timedelta(minutes= 15)).month ) == date.month) & ((self.results.index- pd.Timedelta(minutes= 15)).year == date.year)]
-                self.p_limits = self.find_p_limits(month_df = month_df)               
-                for block in range(1, 6):
-                    self.results.loc[((self.results.index- pd.Timedelta(minutes=15)).month == date.month) & ((self.results.index- pd.Timedelta(minutes=15)).year == date.year) & (self.results.block == block), "p_limit"] = self.p_limits[block-1]
-            lst = self.simulate_p_limit()
-        if control_type == "MT_VT_shifting":
-            dt = 0.25  # time step in hours
-            # Extract hour values from the index; subtract 1 minute as in your original code.
-            # We assume the index contains Timestamps.
-            hours = np.array([(ts - pd.Timedelta(minutes=1)).hour for ts in self.results.index], dtype=np.int32)
-            
-            # Call the jitted function using the current battery state and parameters.
-            battery_plus, battery_minus, energy_state = jit_simulate_MT_VT_shift(
-                hours,
-                dt,
-                self.current_e_kwh,       # initial energy state
-                self.max_e_kwh,           # max battery capacity
-                self.max_charge_p_kw,     # max charging power
-                self.max_discharge_p_kw   # max discharging power
-            )
-            # In the original code, charging is recorded as battery_minus (and stored with a negative sign).
-            self.results["battery_plus"] = battery_plus
-            self.results["battery_minus"] = -battery_minus
-            # Reconstruct p_after as in your original logic.
-            self.results["p_after"] = self.results["p"] - battery_plus - (-battery_minus)
-            self.results["var_bat"] = energy_state
-            # Update current battery energy
-            self.current_e_kwh = energy_state[-1]
-            lst = list(energy_state)
-
-        elif control_type == "5Tariff_manoeuvering":
-            dt = 0.25  # 15-minute interval in hours
-            # Extract hour values from the index.
-            hours = np.array([(ts - pd.Timedelta(minutes=1)).hour for ts in self.results.index], dtype=np.int32)
-            init_e = self.current_e_kwh
-            battery_plus, battery_minus, energy_state = jit_simulate_5tariff(
-                hours, dt, init_e, self.max_e_kwh,
-                self.max_charge_p_kw, self.max_discharge_p_kw
-            )
-            self.results["battery_plus"] = battery_plus
-            # In this branch, we record charging as negative.
-            self.results["battery_minus"] = -battery_minus
-            self.results["p_after"] = self.results["p"] - battery_plus - (-battery_minus)
-            self.results["var_bat"] = energy_state
+        self.time_axis = TimeAxis.from_index(p_kw.index)
+        self._check_freq(self.time_axis)
+        p_array = self._power_view(p_kw["p"])
+        strategy = CONTROL_STRATEGIES.get(control_type)
+        if strategy is None:
+            raise ValueError(f"Control type {control_type} is not supported.")
+        if strategy.prepare is None:
+            signal, params, extras = _NO_SIGNAL, _NO_PARAMS, {}
+        else:
+            signal, params, extras = strategy.prepare(self, p_array, control_params)
+        battery_plus, battery_minus, p_after, energy_state, kpis = strategy.kernel(
+            p_array, self.time_axis.hour, signal, params, self.dt, self.current_e_kwh,
+            self.max_e_kwh, self.max_charge_p_kw, self.max_discharge_p_kw
+        )
+        if len(energy_state) > 0:
             self.current_e_kwh = energy_state[-1]
-            lst = list(energy_state)
-
-        self.results[
-            "p_after"] = self.results.p - self.results.battery_plus - self.results.battery_minus
-        self.results["var_bat"] = lst
+        self.results = BSResult(p_kw.index, p_array, battery_plus, battery_minus, energy_state,
+                                p_after=p_after, kpis=kpis, **extras)
         return self.results
 
     def simulate(
         self,
         p_kw: pd.DataFrame = None,
         control_type: str = "production_saving",
+        control_params: dict = None,
     ):
         self.hard_reset()
-        self.model(control_type=control_type, p_kw=p_kw)
+        self.model(control_type=control_type, p_kw=p_kw, control_params=control_params)
         self.timeseries = self.results["p_after"]
         return self.timeseries
-    
+
+    def simulate_many(
+        self,
+        p_kw,
+        control_type: str = "production_saving",
+        index: pd.DatetimeIndex = None,
+        max_e_kwh=None,
+        max_charge_p_kw=None,
+        max_discharge_p_kw=None,
+        init_e_kwh=None,
+    ):
+        """
+        Simulate many batteries at once, one per consumer profile.
+
+        Parameters
+        ----------
+        p_kw : np.ndarray or pd.DataFrame
+            Power in kW. Either a 2D array of shape (n_consumers, n_steps)
+            or a DataFrame with the timestamps as index and one column per consumer.
+        control_type : str
+            One of "production_saving", "combined_production_vt", "installed_power",
+            "MT_VT_shifting" and "5Tariff_manoeuvering".
+        index : pd.DatetimeIndex
+            Timestamps of the steps. Required for the hour based control types
+            when p_kw is a NumPy array.
+        max_e_kwh, max_charge_p_kw, max_discharge_p_kw, init_e_kwh : float or array-like
+            Battery parameters, either a scalar or one value per consumer.
+            Default to the parameters of this battery, starting fully charged.
+
+        Returns
+        -------
+        dict
+            Stacked arrays of shape (n_consumers, n_steps) with the keys
+            "battery_plus", "battery_minus", "p_after" and "var_bat".
+            For "installed_power" the per consumer limits are under "p_limit".
+        """
+        if isinstance(p_kw, pd.DataFrame):
+            if index is None:
+                index = p_kw.index
+            p_kw = p_kw.values.T
+        # a writable copy, so that the kernels are compiled once for all inputs
+        p_matrix = np.array(np.atleast_2d(p_kw), dtype=np.float64, order="C")
+        n_rows = p_matrix.shape[0]
+
+        max_e = self._broadcast_rows(max_e_kwh, self.max_e_kwh, n_rows)
+        max_charge = self._broadcast_rows(max_charge_p_kw, self.max_charge_p_kw, n_rows)
+        max_discharge = self._broadcast_rows(max_discharge_p_kw, self.max_discharge_p_kw, n_rows)
+        init_e = self._broadcast_rows(init_e_kwh, max_e, n_rows)
+
+        dt = self.dt
+        results = {}
+        if control_type == "production_saving":
+            battery_plus, battery_minus, energy_state = jit_simulate_production_saving_batch(
+                p_matrix, dt, init_e, max_e, max_charge, max_discharge)
+        elif control_type == "installed_power":
+            p_limits, battery_plus, battery_minus, energy_state = jit_min_p_limit_batch(
+                p_matrix, init_e, max_e, max_charge, max_discharge, dt)
+            results["p_limit"] = p_limits
+        elif control_type in ("combined_production_vt", "MT_VT_shifting", "5Tariff_manoeuvering"):
+            if index is None:
+                raise ValueError(
+                    f"The index is needed to simulate {control_type} control.")
+            hours = TimeAxis.from_index(index).hour
+            if control_type == "combined_production_vt":
+                battery_plus, battery_minus, energy_state = jit_simulate_combined_batch(
+                    hours, p_matrix, dt, init_e, max_e, max_charge, max_discharge)
+            elif control_type == "MT_VT_shifting":
+                battery_plus, battery_minus, energy_state = jit_simulate_MT_VT_shift_batch(
+                    hours, n_rows, dt, init_e, max_e, max_charge, max_discharge)
+            else:
+                battery_plus, battery_minus, energy_state = jit_simulate_5tariff_batch(
+                    hours, n_rows, dt, init_e, max_e, max_charge, max_discharge)
+        else:
+            raise ValueError(
+                f"Control type {control_type} is not supported for batched simulation.")
+
+        results["battery_plus"] = battery_plus
+        results["battery_minus"] = -battery_minus
+        results["p_after"] = p_matrix - battery_plus + battery_minus
+        results["var_bat"] = energy_state
+        return results
+
+    def step_chunk(self,
+                   p_array,
+                   timestamps,
+                   control_type: str = "production_saving"):
+        """
+        Simulate the next chunk of a longer time series.
+
+        The battery continues from its current energy and keeps it for the next
+        chunk, so feeding a series chunk by chunk after hard_reset() gives the same
+        results as simulating it at once.
+
+        Only the control types in CHUNK_CONTROL_TYPES and registered strategies
+        without a prepare function can be chunked. The limit based control types
+        depend on the whole series, so their limits have to be precomputed up
+        front, they are not searched per chunk: curr_limit for "installed_power",
+        p_limits for "block_power_reduction" and monthly_p_limits for
+        "monthly_block_power_reduction". They are set by a previous model() or
+        simulate() call over the whole series or can be assigned directly. The
+        other prepared strategies ("price_threshold", "optimal_cost",
+        "receding_horizon" and the like) derive their signal from the whole series,
+        e.g. the price percentiles or the cost optimal plan, and can not be chunked;
+        a ValueError is raised before anything is simulated.
+
+        Parameters
+        ----------
+        p_array : array-like
+            Power in kW of every timestep of the chunk.
+        timestamps : pd.DatetimeIndex
+            Timestamps of the chunk.
+        control_type : str
+            control_type of simulation, same options as in model().
+
+        Returns
+        -------
+        BSResult
+            Results of the chunk.
+        """
+        strategy = CONTROL_STRATEGIES.get(control_type)
+        if strategy is None:
+            raise ValueError(f"Control type {control_type} is not supported.")
+        if strategy.prepare is not None and control_type not in CHUNK_CONTROL_TYPES:
+            raise ValueError(
+                f"Control type {control_type} derives its signal from the whole series and can not be "
+                f"simulated in chunks, use simulate() or one of {', '.join(CHUNK_CONTROL_TYPES)} "
+                "or the strategies without a prepare function.")
+        p_array = self._power_view(p_array)
+        time_axis = TimeAxis.from_index(timestamps)
+        if len(time_axis) != len(p_array):
+            raise ValueError(
+                "p_array and timestamps must be of the same length.")
+        self._check_freq(time_axis)
+        if control_type in CHUNK_CONTROL_TYPES:
+            signal = self._chunk_p_limit(control_type, time_axis)
+            extras = {"p_limit": signal}
+        else:
+            signal, extras = _NO_SIGNAL, {}
+        battery_plus, battery_minus, p_after, energy_state, kpis = strategy.kernel(
+            p_array, time_axis.hour, signal, _NO_PARAMS, self.dt, self.current_e_kwh,
+            self.max_e_kwh, self.max_charge_p_kw, self.max_discharge_p_kw)
+        if len(energy_state) > 0:
+            self.current_e_kwh = energy_state[-1]
+        return BSResult(time_axis.index, p_array, battery_plus, battery_minus, energy_state,
+                        p_after=p_after, kpis=kpis, **extras)
+
+    def _chunk_p_limit(self, control_type, time_axis):
+        """
+        Returns the stored power limit of every timestep of a chunk.
+        """
+        if control_type == "installed_power":
+            return np.full(len(time_axis), float(self.curr_limit))
+        blocks = time_axis.tariff_block.astype(np.int64)
+        if control_type == "block_power_reduction":
+            if len(self.p_limits) != 5:
+                raise ValueError(
+                    "The block p_limits have to be known to simulate a chunk.")
+            return np.asarray(self.p_limits, dtype=np.float64)[blocks - 1]
+        codes, month_pos = np.unique(time_axis.month_code, return_inverse=True)
+        try:
+            limits = np.array([
+                self.monthly_p_limits[(int(code) // 12, int(code) % 12 + 1)]
+                for code in codes
+            ], dtype=np.float64)
+        except KeyError as err:
+            raise ValueError(
+                f"The p_limits of the month {err.args[0]} have to be known to simulate a chunk."
+            ) from None
+        return limits[month_pos, blocks - 1]
+
+    def _optimal_cost_signals(self, p_array, control_params):
+        """
+        Returns the per timestep prices and power limits and the number of energy levels
+        of the "optimal_cost" control.
+        """
+        params = dict(control_params or {})
+        n = len(p_array)
+        if "tariff_mask" in params:
+            blocks = np.argmax(np.asarray(params["tariff_mask"]), axis=0).astype(np.int64) + 1
+            if len(blocks) != n:
+                raise ValueError("The tariff_mask must have a column for every timestep.")
+        else:
+            blocks = self.time_axis.tariff_block.astype(np.int64)
+        if params.get("price") is not None:
+            price = self._broadcast_rows(params["price"], None, n)
+        elif params.get("block_prices") is not None:
+            price = np.asarray(params["block_prices"], dtype=np.float64)[blocks - 1]
+        else:
+            raise ValueError(
+                "The optimal_cost control needs a price or block_prices in control_params.")
+        export_price = self._broadcast_rows(params.get("export_price"), 0., n)
+        power_prices = np.asarray(params.get("power_prices", np.zeros(5)), dtype=np.float64)
+        p_limits = params.get("p_limits")
+        if p_limits is None:
+            if power_prices.any():
+                p_limits = jit_find_p_limits(
+                    p_array, blocks, self.max_e_kwh,
+                    self.max_charge_p_kw, self.max_discharge_p_kw, self.dt)
+            else:
+                p_limits = np.zeros(5)
+        p_limits = np.asarray(p_limits, dtype=np.float64)
+        n_levels = int(params.get("n_soc_levels", 51))
+        if not 2 <= n_levels <= MAX_SOC_LEVELS:
+            raise ValueError(f"n_soc_levels has to be between 2 and {MAX_SOC_LEVELS}.")
+        return price, export_price, power_prices[blocks - 1], p_limits[blocks - 1], n_levels
+
+    @staticmethod
+    def _power_view(p):
+        """
+        Returns the power as a read-only float array, without a copy when it already is one.
+        """
+        p_array = np.ascontiguousarray(np.asarray(p, dtype=np.float64)).ravel().view()
+        p_array.flags.writeable = False
+        return p_array
+
+    def _check_freq(self, time_axis):
+        """
+        Warns if the timesteps of the time axis do not match the battery frequency.
+        """
+        epoch_ns = time_axis.epoch_ns
+        if len(epoch_ns) > 1 and epoch_ns[1] - epoch_ns[0] != self.freq_mins * 60 * 10**9:
+            warnings.warn(
+                f"The timesteps of p_kw do not match the battery frequency of {self.freq}.")
+
+    def sweep(
+        self,
+        p_kw,
+        capacities_kwh,
+        powers_kw,
+        control_type: str = "production_saving",
+        index: pd.DatetimeIndex = None,
+    ):
+        """
+        Evaluate a grid of battery sizes over one consumer profile.
+
+        The profile is prepared once and every combination of capacity and power is
+        simulated in parallel in compiled code, starting fully charged as in simulate().
+        The charging and discharging power of a battery are both equal to its power.
+
+        Parameters
+        ----------
+        p_kw : pd.DataFrame, pd.Series or np.ndarray
+            Power in kW. A DataFrame needs the column "p".
+        capacities_kwh : array-like
+            Battery capacities in kWh.
+        powers_kw : array-like
+            Battery powers in kW.
+        control_type : str
+            One of "production_saving", "combined_production_vt", "installed_power",
+            "block_power_reduction", "monthly_block_power_reduction", "MT_VT_shifting"
+            and "5Tariff_manoeuvering".
+        index : pd.DatetimeIndex
+            Timestamps of the steps. Required for the hour and block based control types
+            when p_kw is a NumPy array.
+
+        Returns
+        -------
+        pd.DataFrame
+            KPIs indexed by ("max_e_kwh", "max_p_kw"):
+            peak_reduction, the reduction of the peak power in kW,
+            energy_shifted, the energy discharged from the battery in kWh, and
+            cycles, the number of equivalent full cycles.
+        """
+        if control_type not in SWEEP_CONTROL_TYPES:
+            raise ValueError(
+                f"Control type {control_type} is not supported for the sweep.")
+        if isinstance(p_kw, pd.DataFrame):
+            p_kw = p_kw["p"]
+        if isinstance(p_kw, pd.Series):
+            if index is None:
+                index = p_kw.index
+            p_kw = p_kw.values
+        p_array = np.array(p_kw, dtype=np.float64).ravel()
+        capacities = np.array(capacities_kwh, dtype=np.float64).ravel()
+        powers = np.array(powers_kw, dtype=np.float64).ravel()
+        hours, blocks, month_pos, order, offsets = self._control_inputs(control_type, len(p_array), index)
+
+        peak_reduction, energy_shifted, cycles = jit_sweep(
+            SWEEP_CONTROL_TYPES.index(control_type), p_array, hours, blocks,
+            p_array[order], blocks[order], offsets, month_pos,
+            capacities, powers, self.dt)
+        return pd.DataFrame(
+            {
+                "peak_reduction": peak_reduction.ravel(),
+                "energy_shifted": energy_shifted.ravel(),
+                "cycles": cycles.ravel(),
+            },
+            index=pd.MultiIndex.from_product([capacities, powers],
+                                             names=["max_e_kwh", "max_p_kw"]))
+
+    def ensemble(
+        self,
+        p_kw,
+        control_type: str = "production_saving",
+        n_scenarios: int = 100,
+        noise_std: float = 0.,
+        max_shift: int = 0,
+        pv_kw=None,
+        pv_scale_std: float = 0.,
+        seed: int = 0,
+        quantiles=(0.05, 0.25, 0.5, 0.75, 0.95),
+        soc_bins: int = 10,
+        index: pd.DatetimeIndex = None,
+    ):
+        """
+        Simulate this battery over an ensemble of perturbed copies of a profile.
+
+        The scenarios are generated and simulated in parallel in compiled code, starting
+        fully charged as in simulate(). Scenario k shifts the load (the profile without
+        the PV) by up to max_shift timesteps, scales the PV by 1 + pv_scale_std * N(0, 1)
+        and adds N(0, noise_std) noise to every timestep. Only the KPIs of the scenarios
+        are kept, and the same seed gives the same scenarios.
+
+        Parameters
+        ----------
+        p_kw : pd.DataFrame, pd.Series or np.ndarray
+            Power in kW. A DataFrame needs the column "p".
+        control_type : str
+            One of the control types of sweep().
+        n_scenarios : int
+            Number of scenarios.
+        noise_std : float
+            Standard deviation of the noise in kW.
+        max_shift : int
+            Largest shift of the load in timesteps, in both directions.
+        pv_kw : array-like
+            PV power in kW (negative) included in p_kw, scaled in the scenarios.
+        pv_scale_std : float
+            Standard deviation of the PV scale.
+        seed : int
+            Seed of the scenarios.
+        quantiles : array-like
+            Quantiles of the KPIs to summarise.
+        soc_bins : int
+            Number of bins of the state of charge histogram.
+        index : pd.DatetimeIndex
+            Timestamps of the steps. Required for the hour and block based control types
+            when p_kw is a NumPy array.
+
+        Returns
+        -------
+        dict
+            "kpis", a DataFrame with a row per scenario and the columns peak_before,
+            peak_after, peak_reduction (kW), throughput (kWh), cycles and soc_end,
+            "quantiles", the quantiles of these KPIs indexed by quantile, and
+            "soc_histogram", the counts of soc_end in soc_bins equal bins of 0 to 1
+            indexed by the lower and upper bin edges.
+        """
+        if control_type not in SWEEP_CONTROL_TYPES:
+            raise ValueError(
+                f"Control type {control_type} is not supported for the ensemble.")
+        if isinstance(p_kw, pd.DataFrame):
+            p_kw = p_kw["p"]
+        if isinstance(p_kw, pd.Series):
+            if index is None:
+                index = p_kw.index
+            p_kw = p_kw.values
+        p_array = np.array(p_kw, dtype=np.float64).ravel()
+        n = len(p_array)
+        if pv_kw is None:
+            pv_array = np.zeros(n)
+        else:
+            pv_array = np.array(pv_kw, dtype=np.float64).ravel()
+            if len(pv_array) != n:
+                raise ValueError("pv_kw must have a value for every timestep.")
+        if n_scenarios < 1:
+            raise ValueError("n_scenarios has to be at least 1.")
+        hours, blocks, month_pos, order, offsets = self._control_inputs(control_type, n, index)
+        seeds = np.random.SeedSequence(seed).generate_state(n_scenarios).astype(np.int64)
+
+        kpis = jit_ensemble(
+            SWEEP_CONTROL_TYPES.index(control_type), p_array, pv_array, hours, blocks,
+            order, offsets, month_pos, seeds, float(noise_std), int(max_shift),
+            float(pv_scale_std), self.dt, self.max_e_kwh, self.max_e_kwh,
+            self.max_charge_p_kw, self.max_discharge_p_kw)
+        kpis = pd.DataFrame(
+            {
+                "peak_before": kpis[:, 0],
+                "peak_after": kpis[:, 1],
+                "peak_reduction": kpis[:, 0] - kpis[:, 1],
+                "throughput": kpis[:, 2],
+                "cycles": kpis[:, 3],
+                "soc_end": kpis[:, 4],
+            },
+            index=pd.RangeIndex(n_scenarios, name="scenario"))
+        counts, edges = np.histogram(np.clip(kpis["soc_end"].values, 0., 1.), bins=soc_bins, range=(0., 1.))
+        return {
+            "kpis": kpis,
+            "quantiles": kpis.quantile(list(quantiles)).rename_axis("quantile"),
+            "soc_histogram": pd.Series(
+                counts,
+                index=pd.MultiIndex.from_arrays([edges[:-1], edges[1:]], names=["soc_from", "soc_to"]),
+                name="count"),
+        }
+
+    def price_threshold_sweep(
+        self,
+        p_kw,
+        price,
+        low_percentiles=(5, 10, 15, 20, 25, 30, 35, 40, 45),
+        high_percentiles=(55, 60, 65, 70, 75, 80, 85, 90, 95),
+        export_price=0.,
+        allow_export: bool = False,
+        max_e_kwh=None,
+        max_charge_p_kw=None,
+        max_discharge_p_kw=None,
+        init_e_kwh=None,
+    ):
+        """
+        Evaluate the "price_threshold" control over pairs of price percentiles for many profiles.
+
+        Every profile is simulated with every pair of a low and a higher high percentile
+        in parallel in compiled code, and only the KPIs are kept.
+
+        Parameters
+        ----------
+        p_kw : np.ndarray or pd.DataFrame
+            Power in kW. Either a profile, a 2D array of shape (n_consumers, n_steps)
+            or a DataFrame with the timestamps as index and one column per consumer.
+        price : array-like
+            Price of the energy at every timestep in EUR/kWh, shared by all profiles.
+        low_percentiles, high_percentiles : array-like
+            Percentiles of the price to charge below and to discharge above.
+        export_price : float or array-like
+            Price of the exported energy, one or one per timestep.
+        allow_export : bool
+            Discharge into the grid too, not only into the consumption.
+        max_e_kwh, max_charge_p_kw, max_discharge_p_kw, init_e_kwh : float or array-like
+            Battery parameters, either a scalar or one value per consumer.
+            Default to the parameters of this battery, starting fully charged.
+
+        Returns
+        -------
+        pd.DataFrame
+            KPIs indexed by ("consumer", "low_percentile", "high_percentile"):
+            low and high, the price thresholds, cost and savings, the energy cost with
+            the battery and its reduction, peak, the peak power after the battery in kW,
+            throughput, the charged and discharged energy in kWh, and cycles.
+        """
+        columns = None
+        if isinstance(p_kw, pd.DataFrame):
+            columns = p_kw.columns
+            p_kw = p_kw.values.T
+        # a writable copy, so that the kernel is compiled once for all inputs
+        p_matrix = np.array(np.atleast_2d(p_kw), dtype=np.float64, order="C")
+        n_rows, n = p_matrix.shape
+        price = np.array(price, dtype=np.float64).ravel()
+        if len(price) != n:
+            raise ValueError("The price must have a value for every timestep.")
+        export_price = self._broadcast_rows(export_price, 0., n)
+
+        pairs = [(low, high) for low in low_percentiles for high in high_percentiles if low < high]
+        if not pairs:
+            raise ValueError("No low percentile is below a high percentile.")
+        percentiles = np.array(pairs, dtype=np.float64)
+        lows = np.percentile(price, percentiles[:, 0])
+        highs = np.percentile(price, percentiles[:, 1])
+
+        max_e = self._broadcast_rows(max_e_kwh, self.max_e_kwh, n_rows)
+        max_charge = self._broadcast_rows(max_charge_p_kw, self.max_charge_p_kw, n_rows)
+        max_discharge = self._broadcast_rows(max_discharge_p_kw, self.max_discharge_p_kw, n_rows)
+        init_e = self._broadcast_rows(init_e_kwh, max_e, n_rows)
+
+        cost_before, cost, peak, throughput, cycles = jit_price_threshold_sweep(
+            p_matrix, price, export_price, lows, highs, bool(allow_export), self.dt,
+            init_e, max_e, max_charge, max_discharge)
+        consumers = np.arange(n_rows) if columns is None else columns
+        return pd.DataFrame(
+            {
+                "low": np.tile(lows, n_rows),
+                "high": np.tile(highs, n_rows),
+                "cost": cost.ravel(),
+                "savings": (cost_before[:, None] - cost).ravel(),
+                "peak": peak.ravel(),
+                "throughput": throughput.ravel(),
+                "cycles": cycles.ravel(),
+            },
+            index=pd.MultiIndex.from_arrays(
+                [np.repeat(consumers, len(pairs)),
+                 np.tile(percentiles[:, 0], n_rows),
+                 np.tile(percentiles[:, 1], n_rows)],
+                names=["consumer", "low_percentile", "high_percentile"]))
+
+    def _control_inputs(self, control_type, n, index):
+        """
+        Returns the hours, the tariff blocks, the month of every timestep, the timesteps
+        grouped by month and the month offsets of the sweep and ensemble control types.
+        """
+        if control_type in ("production_saving", "installed_power"):
+            hours = np.zeros(n, dtype=np.int64)
+            blocks = np.ones(n, dtype=np.int64)
+            month_pos = np.zeros(n, dtype=np.int64)
+        else:
+            if index is None:
+                raise ValueError(
+                    f"The index is needed to simulate {control_type} control.")
+            time_axis = TimeAxis.from_index(index)
+            if len(time_axis) != n:
+                raise ValueError("p_kw and index must be of the same length.")
+            hours = np.array(time_axis.hour, dtype=np.int64)
+            blocks = time_axis.tariff_block.astype(np.int64)
+            if control_type == "monthly_block_power_reduction":
+                month_pos = np.unique(time_axis.month_code, return_inverse=True)[1].astype(np.int64)
+            else:
+                month_pos = np.zeros(n, dtype=np.int64)
+        n_months = int(month_pos.max()) + 1 if n > 0 else 0
+        order = np.argsort(month_pos, kind="stable")
+        offsets = np.zeros(n_months + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(month_pos, minlength=n_months))
+        return hours, blocks, month_pos, order, offsets
+
+    @staticmethod
+    def _broadcast_rows(value, default, n_rows):
+        """
+        Broadcast a scalar or per consumer battery parameter to a float array of length n_rows.
+        """
+        if value is None:
+            value = default
+        return np.array(np.broadcast_to(np.asarray(value, dtype=np.float64), (n_rows,)))
+
     def is_p_limit_possible(self, p_limit):
         """
         Determine if the given p_limit is possible.
@@ -810,7 +2707,7 @@ class BS(BaseModel):
         """
         # Ensure self.results is available; you might want to check or set it before calling this.
         p_array = self.results["p"].values
-        dt = 0.25  # 15 minutes expressed in hours
+        dt = self.dt
         # Call the jitted function
         result = jit_is_p_limit_possible(
             p_array,
@@ -827,13 +2724,16 @@ class BS(BaseModel):
         """
         Function calculates the optimal limit of the maximum power
         """
-        max_bound = self.results.p.max()
-        function = self.is_p_limit_possible
-        root = optimize.bisect(function,
-                               max_bound - self.max_discharge_p_kw - 1,
-                               max_bound,
-                               xtol=0.05)
-        return root
+        dt = self.dt
+        p_limit, _, _ = jit_bisect_min_p_limit(
+            self._power_view(self.results["p"]),
+            self.current_e_kwh,
+            self.max_e_kwh,
+            self.max_charge_p_kw,
+            self.max_discharge_p_kw,
+            dt
+        )
+        return p_limit
 
     def soft_reset(self):
         """
@@ -909,7 +2809,7 @@ class BS(BaseModel):
         
         p_array = df["p"].values
         block_array = df["block"].values  # assuming this exists
-        dt = 0.25  # time step in hours
+        dt = self.dt
 
         # Call the JIT function with the required parameters
         result = jit_are_p_limits_possible(
@@ -926,20 +2826,35 @@ class BS(BaseModel):
 
 
     def find_block_p_limit(self, p_limits, block, p_limits_orig= None, month_df = None):
-
+        """
+        Bisects the p_limit of the given block with the limits of the other blocks fixed.
+        The battery starts fully charged and is capped at 95 % in the first block.
+        """
+        if month_df is None:
+            df = self.results
+        else:
+            df = month_df
         max_bound = p_limits[block-1]
         if p_limits_orig is None:
             p_limits_orig = p_limits
-        
+
         min_bound = p_limits_orig[block-1]- self.max_discharge_p_kw-1
-        if block == 1:
-            function = lambda x: self.are_p_limits_posible([x if i == block - 1 else p_limits[i] for i in range(5)], max_soc=0.95, month_df = month_df)
-        else:
-            function = lambda x: self.are_p_limits_posible([x if i == block - 1 else p_limits[i] for i in range(5)], month_df = month_df)
-        root = optimize.bisect(function,
-                               min_bound,
-                               max_bound,
-                               xtol=0.05)
+        max_soc = 0.95 if block == 1 else 1.
+        self.hard_reset()
+        root, _, _ = jit_bisect_block_p_limit(
+            self._power_view(df["p"]),
+            np.asarray(df["block"], dtype=np.int64),
+            np.asarray(p_limits, dtype=np.float64),
+            block,
+            float(min_bound),
+            float(max_bound),
+            self.current_e_kwh,
+            self.max_charge_p_kw,
+            self.max_discharge_p_kw,
+            self.max_e_kwh * max_soc,
+            self.dt,
+            0.05
+        )
         return root
     
     def get_max_p_limits(self, month_df = None):
@@ -959,12 +2874,13 @@ class BS(BaseModel):
             df = self.results
         else:
             df = month_df
-        for block in df["block"].unique():
-            p_limits = df[df["block"] == block]["p"].max()
-
-        p_limits = [df[df["block"] == block]["p"].max() for block in range(1, 6)]
-        #replace nan with 0
-        p_limits_orig = [0 if np.isnan(x) else x for x in p_limits]
+        p_array = np.asarray(df["p"], dtype=np.float64)
+        block_array = np.asarray(df["block"])
+        # blocks without timesteps get 0
+        p_limits_orig = [
+            float(p_array[block_array == block].max()) if (block_array == block).any() else 0
+            for block in range(1, 6)
+        ]
 
         p_limits = p_limits_orig.copy()
         current_max = 0
@@ -992,39 +2908,30 @@ class BS(BaseModel):
         we calculate the power for the second block. We repeat this process for all five blocks
 
         """
-        p_limits, p_limits_orig = self.get_max_p_limits(month_df = month_df)
         if month_df is None:
             df = self.results
         else:
             df = month_df
-        for block in range(1, 6):
-            if block == 1:
-                if len(df[df["block"] == block]) > 0:                    
-                    p_limit = round(self.find_block_p_limit(p_limits, block, p_limits_orig, month_df = month_df) + 0.1, 1)
-                    p_limits[0] = p_limit
-                else:
-                    p_limits[0] = 0
-            else:
-                p_limits_min = p_limits.copy()
-                p_limits_min[block-1] = p_limits[block-2]
-                # If it is possible, that p_limit is the same as in the previous block we take it
-                if self.are_p_limits_posible(p_limits_min, month_df= month_df) == 1:
-                    p_limits[block-1] = p_limits[block-2]
-                else:
-                    p_limit = round(self.find_block_p_limit(p_limits, block, p_limits_orig, month_df=month_df) + 0.1, 1)
-                    p_limits[block-1] = p_limit
-
-        return p_limits
+        self.hard_reset()
+        dt = self.dt
+        p_limits = jit_find_p_limits(
+            self._power_view(df["p"]),
+            np.asarray(df["block"], dtype=np.int64).copy(),
+            self.max_e_kwh,
+            self.max_charge_p_kw,
+            self.max_discharge_p_kw,
+            dt
+        )
+        return p_limits.tolist()
     
     def simulate_p_limit(self):
         """
         With already calculated p_limits, simulates the battery behavior.
         Assumes self.results["p_limit"] is already defined.
         """
-        dt = 0.25  # 15-minute interval in hours
-        # Convert DataFrame columns to NumPy arrays:
-        p_array = self.results["p"].values.astype(np.float64)
-        p_limit_array = self.results["p_limit"].values.astype(np.float64)
+        dt = self.dt
+        p_array = self._power_view(self.results["p"])
+        p_limit_array = np.array(self.results["p_limit"], dtype=np.float64)
         
         # Call the JIT function using the current battery state and parameters.
         battery_plus, battery_minus, energy_state = jit_simulate_p_limit(
@@ -1037,50 +2944,158 @@ class BS(BaseModel):
             self.max_discharge_p_kw  # maximum discharging power
         )
         
-        # Store results in the DataFrame.
-        self.results["battery_plus"] = battery_plus
-        # In your original code, battery_minus was stored as negative.
-        # We computed positive charge amounts, so we store the negative value.
-        self.results["battery_minus"] = -battery_minus
-        # Compute p_after similar to your original logic.
-        self.results["p_after"] = self.results["p"] - battery_plus - (-battery_minus)
-        self.results["var_bat"] = energy_state
-        
-        # Optionally, update the current battery state.
-        self.current_e_kwh = energy_state[-1]
-        
-        # Return energy state as a list (or as an array if preferred).
-        return list(energy_state)
-    
-def mt_vt_amount(p_kw):
-    p_kw["hour"] = p_kw.index.hour
-    p_kw["day"] = p_kw.index.day
-
-    p_kw["vt_after"] = 0
-    p_kw["mt_after"] = 0
-    p_kw["vt_before"] = 0
-    p_kw["mt_before"] = 0
-
-    p_kw.loc[(p_kw["hour"] >= 6) & (p_kw["hour"] <= 21), "vt_after"] = p_kw["p_after"] * (p_kw["p_after"] > 0) * 0.25
-    p_kw.loc[(p_kw["hour"] < 6) | (p_kw["hour"] > 21), "mt_after"] = p_kw["p_after"] * (p_kw["p_after"] > 0) * 0.25
-    p_kw.loc[(p_kw["hour"] >= 6) & (p_kw["hour"] <= 21), "vt_before"] = p_kw["p"] * (p_kw["p"] > 0) * 0.25
-    p_kw.loc[(p_kw["hour"] < 6) | (p_kw["hour"] > 21), "mt_before"] = p_kw["p"] * (p_kw["p"] > 0) * 0.25
-
-    p_kw["production_after"] = p_kw["p_after"] * (p_kw["p_after"] < 0) * 0.25
-    p_kw["production_before"] = p_kw["p"] * (p_kw["p"] < 0) * 0.25
-
-    print("e_mt_before:", sum(p_kw["mt_before"]))
-    print("e_vt_before:", sum(p_kw["vt_before"]))
-    print("production_before:", sum(p_kw["production_before"]))
-    print("e_mt_after:", sum(p_kw["mt_after"]))
-    print("e_vt_after:", sum(p_kw["vt_after"]))
-    print("production_after:", sum(p_kw["production_after"]))
-
-    print("price_before:", sum(p_kw["mt_before"]) * 0.1 + sum(p_kw["vt_before"]) * 0.13 + sum(p_kw["production_before"]) * 0.047)
-    print("price_after:", sum(p_kw["mt_after"]) * 0.1 + sum(p_kw["vt_after"]) * 0.18 + sum(p_kw["production_after"]) * 0.047)
+        if len(energy_state) > 0:
+            self.current_e_kwh = energy_state[-1]
+        block = np.asarray(self.results["block"]) if "block" in self.results else None
+        self.results = BSResult(self.results.index, p_array, battery_plus, -battery_minus,
+                                energy_state, block=block, p_limit=p_limit_array)
+        return energy_state
     
-    print("sum: ", sum(p_kw["mt_after"]) + sum(p_kw["vt_after"]) + sum(p_kw["production_after"]))
-    print("sum: ", sum(p_kw["mt_before"]) + sum(p_kw["vt_before"]) + sum(p_kw["production_before"]))
+def _prepare_installed_power(battery, p_array, control_params):
+    """
+    Finds the smallest power limit the battery can hold over the whole series.
+    """
+    battery.curr_limit, _, _ = jit_bisect_min_p_limit(
+        p_array, battery.current_e_kwh, battery.max_e_kwh,
+        battery.max_charge_p_kw, battery.max_discharge_p_kw, battery.dt)
+    p_limit = np.full(len(p_array), battery.curr_limit)
+    return p_limit, _NO_PARAMS, {"p_limit": p_limit}
+
+
+def _prepare_block_power_reduction(battery, p_array, control_params):
+    """
+    Finds the power limits of the tariff blocks, starting with a full battery.
+    """
+    blocks = battery.time_axis.tariff_block.astype(np.int64)
+    battery.hard_reset()
+    battery.p_limits = jit_find_p_limits(
+        p_array, blocks, battery.max_e_kwh,
+        battery.max_charge_p_kw, battery.max_discharge_p_kw, battery.dt).tolist()
+    p_limit = np.asarray(battery.p_limits)[blocks - 1]
+    return p_limit, _NO_PARAMS, {"block": blocks, "p_limit": p_limit}
+
+
+def _prepare_monthly_block_power_reduction(battery, p_array, control_params):
+    """
+    Finds the power limits of the tariff blocks of every month, starting with a full battery.
+    """
+    blocks = battery.time_axis.tariff_block.astype(np.int64)
+    # month of every timestep as a single integer code and the timesteps grouped by month
+    months, month_pos = np.unique(battery.time_axis.month_code, return_inverse=True)
+    order = np.argsort(month_pos, kind="stable")
+    offsets = np.zeros(len(months) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(month_pos, minlength=len(months)))
+    # the months are independent, every one starts with a full battery
+    battery.hard_reset()
+    monthly_p_limits = jit_find_monthly_p_limits(
+        p_array[order], blocks[order], offsets, battery.max_e_kwh,
+        battery.max_charge_p_kw, battery.max_discharge_p_kw, battery.dt)
+    battery.monthly_p_limits = {
+        (int(code) // 12, int(code) % 12 + 1): limits.tolist()
+        for code, limits in zip(months, monthly_p_limits)
+    }
+    battery.p_limits = monthly_p_limits[-1].tolist()
+    p_limit = monthly_p_limits[month_pos, blocks - 1]
+    return p_limit, _NO_PARAMS, {"block": blocks, "p_limit": p_limit}
+
+
+def _prepare_optimal_cost(battery, p_array, control_params):
+    """
+    Solves the cost optimal dispatch, the signal is the battery energy schedule.
+    """
+    price, export_price, power_price, p_cap, n_levels = battery._optimal_cost_signals(
+        p_array, control_params)
+    _, _, energy_state, _ = jit_optimal_cost_dispatch(
+        p_array, price, export_price, power_price, p_cap, battery.dt,
+        battery.current_e_kwh, battery.max_e_kwh,
+        battery.max_charge_p_kw, battery.max_discharge_p_kw, n_levels)
+    return energy_state, _NO_PARAMS, {}
+
+
+def _prepare_receding_horizon(battery, p_array, control_params):
+    """
+    Returns the forecast and the horizon, replan interval and tolerance of the
+    receding horizon control. Without a forecast the power of the same time the
+    day before is used, and the first day is taken as known.
+    """
+    params = dict(control_params or {})
+    steps_per_day = max(1, int(round(24 / battery.dt)))
+    forecast = params.get("forecast")
+    if forecast is None:
+        forecast = np.array(p_array)
+        forecast[steps_per_day:] = p_array[:len(p_array) - steps_per_day]
+    else:
+        forecast = np.array(forecast, dtype=np.float64).ravel()
+        if len(forecast) != len(p_array):
+            raise ValueError("The forecast must have a value for every timestep.")
+    horizon = int(params.get("horizon", steps_per_day))
+    replan = int(params.get("replan", max(1, int(round(1 / battery.dt)))))
+    if horizon < 1 or replan < 1:
+        raise ValueError("horizon and replan have to be at least 1 timestep.")
+    tol = float(params.get("tol", 1e-3))
+    return forecast, np.array([horizon, replan, tol], dtype=np.float64), {}
+
+
+def _prepare_price_threshold(battery, p_array, control_params):
+    """
+    Returns the price and the thresholds of the price threshold control, by default
+    the 25th and 75th percentile of the price.
+    """
+    params = dict(control_params or {})
+    if params.get("price") is None:
+        raise ValueError("The price_threshold control needs a price in control_params.")
+    price = np.array(params["price"], dtype=np.float64).ravel()
+    if len(price) != len(p_array):
+        raise ValueError("The price must have a value for every timestep.")
+    low = params.get("low")
+    if low is None:
+        low = np.percentile(price, params.get("low_percentile", 25))
+    high = params.get("high")
+    if high is None:
+        high = np.percentile(price, params.get("high_percentile", 75))
+    if low > high:
+        raise ValueError("The low price threshold has to be below the high one.")
+    allow_export = 1. if params.get("allow_export", False) else 0.
+    return price, np.array([low, high, allow_export], dtype=np.float64), {}
+
+
+register_strategy("production_saving", jit_strategy_production_saving)
+register_strategy("combined_production_vt", jit_strategy_combined)
+register_strategy(
+    "installed_power", jit_strategy_p_limit, _prepare_installed_power,
+    [(jit_bisect_min_p_limit, (_P, _F8, _F8, _F8, _F8, _F8))])
+register_strategy(
+    "block_power_reduction", jit_strategy_p_limit, _prepare_block_power_reduction,
+    [(jit_find_p_limits, (_P, _I8_1D, _F8, _F8, _F8, _F8))])
+register_strategy(
+    "monthly_block_power_reduction", jit_strategy_p_limit, _prepare_monthly_block_power_reduction,
+    [(jit_find_monthly_p_limits, (_F8_1D, _I8_1D, _I8_1D, _F8, _F8, _F8, _F8))])
+register_strategy(
+    "optimal_cost", jit_strategy_schedule, _prepare_optimal_cost,
+    [(jit_optimal_cost_dispatch, (_P, _F8_1D, _F8_1D, _F8_1D, _F8_1D, _F8, _F8, _F8, _F8, _F8, _I8))])
+register_strategy("receding_horizon", jit_strategy_receding_horizon, _prepare_receding_horizon)
+register_strategy("price_threshold", jit_strategy_price_threshold, _prepare_price_threshold)
+register_strategy("MT_VT_shifting", jit_strategy_MT_VT_shift)
+register_strategy("5Tariff_manoeuvering", jit_strategy_5tariff)
+
+
+def mt_vt_amount(p_kw, dt: float = None):
+    """
+    Returns the MT/VT energy, the exported energy and the cost before and after the battery.
+
+    Parameters
+    ----------
+    p_kw : pd.DataFrame or BSResult
+        Results of a simulation with the columns "p" and "p_after". It is not modified.
+    dt : float
+        Time step in hours, BS.dt of the simulating battery. Inferred from the index by default.
+
+    Returns
+    -------
+    pd.DataFrame
+        A single row as returned by consmodel.utils.accounting.tariff_accounting.
+    """
+    return tariff_accounting(p_kw["p"], p_kw["p_after"], p_kw.index, dt)
 
 if __name__ == "__main__":
     import matplotlib.pyplot as plt
@@ -1119,7 +3134,7 @@ if __name__ == "__main__":
 
     # calcualte amount of energy consumed in VT and MT
 
-    mt_vt_amount(bs.results)
+    print(mt_vt_amount(bs.results, bs.dt))
 
     # operating_hours = 2501 if 1 else 1
 
@@ -14,6 +14,7 @@ from consmodel.base_model import BaseModel
 from consmodel.bs_sim import BS
 from consmodel.hp_sim import HP
 from consmodel.pv_sim import PV
+from consmodel.utils.time_axis import TimeAxis
 
 
 class ConsumerModel(BaseModel):
@@ -36,6 +37,8 @@ class ConsumerModel(BaseModel):
         Longitude of the consumer.
     alt : float
         Altitude of the consumer.
+    weather_store : WeatherStore or WeatherProvider
+        Source of the weather data of the submodels, the shared weather store by default.
 
     Methods
     -------
@@ -55,8 +58,10 @@ class ConsumerModel(BaseModel):
         tz: str = None,
         use_utc: bool = False,
         freq: str = "15min",
+        weather_store=None,
     ):
         super().__init__(index, lat, lon, alt, name, tz, use_utc, freq)
+        self.weather_store = weather_store
         self.elements = {"bs": None, "hp": None, "pv": None, "ev": None}
 
         self.bs = None
@@ -277,6 +282,7 @@ class ConsumerModel(BaseModel):
                 freq=self.freq,
                 name=self.name + "_HP",
                 st_type=hp_st_type,
+                weather_store=self.weather_store,
             )
             self.elements["hp"] = self.hp
         if has_pv:
@@ -289,6 +295,7 @@ class ConsumerModel(BaseModel):
                 tz=self.tz,
                 use_utc=self.use_utc,
                 freq=self.freq,
+                weather_store=self.weather_store,
             )
             self.elements["pv"] = self.pv
         if has_ev:
@@ -312,10 +319,7 @@ class ConsumerModel(BaseModel):
             )
         else:
             self.results["p"] = pd.Series(data=0,
-                                          index=pd.date_range(start=start,
-                                                              end=end,
-                                                              freq=self.freq,
-                                                              tz=self.tz))
+                                          index=self.time_axis.index)
 
     def generic_consumption(
         self,
@@ -333,8 +337,6 @@ class ConsumerModel(BaseModel):
             End of the simulation.
         """
         series = pd.Series(data=0,
-                           index=pd.date_range(start=start,
-                                               end=end,
-                                               freq=self.freq,
-                                               tz=self.tz))
+                           index=TimeAxis.from_range(start, end, self.freq,
+                                                     self.tz).index)
         return series
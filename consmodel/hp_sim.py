@@ -27,6 +27,8 @@ class HP(BaseModel):
         Longitude of the heat pump.
     alt : float
         Altitude of the heat pump.
+    weather_store : WeatherStore or WeatherProvider
+        Source of the weather data, the shared weather store by default.
 
     Methods
     -------
@@ -44,8 +46,10 @@ class HP(BaseModel):
         use_utc: bool = False,
         st_type: str = None,
         freq: str = "15min",
+        weather_store=None,
     ):
         super().__init__(index, lat, lon, alt, name, tz, use_utc, freq)
+        self.weather_store = weather_store
         if st_type is None:
             self.hp_type = HPType()
         else:
@@ -118,7 +122,8 @@ class HP(BaseModel):
 
         """
         start, end = self.handle_time_format(freq, start, end, year)
-        self.get_weather_data(start, end)
+        self.results = pd.DataFrame()
+        self.get_weather_data(start, end, columns=["temp"])
         hp_type_id = self.hp_type.types[hp_type]["group_id"]
         self.model(wanted_temp, "Generic", hp_type_id)
         self.results.rename(columns={"P_el": "p"}, inplace=True)
@@ -1,7 +1,6 @@
 from datetime import datetime
 
 import numpy as np
-import openmeteo_requests
 import pandas as pd
 import pvlib
 import requests_cache
@@ -12,6 +11,9 @@ from scipy.optimize import curve_fit
 from scipy.special import exp10
 
 from consmodel.base_model import BaseModel
+from consmodel.utils.time_axis import TimeAxis
+from consmodel.utils.weather_providers import IRRADIANCE_COLUMNS, WEATHER_COLUMNS, OpenMeteoProvider
+from consmodel.utils.weather_store import get_weather_store
 
 
 class PV(BaseModel):
@@ -32,6 +34,8 @@ class PV(BaseModel):
         The longitude of the PV model object.
     alt : float
         The altitude of the PV model object.
+    weather_store : WeatherStore or WeatherProvider
+        The source of the weather data, the shared weather store by default.
     pv_size : float
         The size of the PV model object in kW.
 
@@ -68,8 +72,10 @@ class PV(BaseModel):
         tz: str = None,
         use_utc: bool = False,
         freq: str = "15min",
+        weather_store=None,
     ):
         super().__init__(index, lat, lon, alt, name, tz, use_utc, freq)
+        self.weather_store = weather_store
         self._location = Location(lat,
                                   lon,
                                   tz=self._tz,
@@ -123,56 +129,53 @@ class PV(BaseModel):
         self,
         start,
         end,
+        base_url: str = OpenMeteoProvider.FORECAST_URL,
+        instant: bool = True,
     ):
+        """
+        Returns the Open-Meteo irradiance (ghi, dhi, dni) from start to end,
+        interpolated to the frequency of the model.
+
+        By default the instantaneous irradiance of the forecast API is used, which
+        serves the recent past and the coming days. For historical years pass
+        base_url=OpenMeteoProvider.ARCHIVE_URL, and instant=False for the hourly means,
+        which are placed at the middle of their hour.
+        """
         # Setup the Open-Meteo API client with cache and retry on error
         cache_session = requests_cache.CachedSession('.cache',
                                                      expire_after=3600)
         retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
-        openmeteo = openmeteo_requests.Client(session=retry_session)
-
-        # Make sure all required weather variables are listed here
-        # The order of variables in hourly or daily is important to assign them correctly below
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude":
-            self.lat,
-            "longitude":
-            self.lon,
-            "hourly": [
-                "direct_radiation_instant", "diffuse_radiation_instant",
-                "direct_normal_irradiance_instant"
-            ],
-            "timezone":
-            "Europe/Berlin",
-            "start_date":
-            start,
-            "end_date":
-            end
-        }
-        responses = openmeteo.weather_api(url, params=params)
-        response = responses[0]
-
-        # Process hourly data. The order of variables needs to be the same as requested.
-        hourly = response.Hourly()
-        hourly_direct_radiation_instant = hourly.Variables(0).ValuesAsNumpy()
-        hourly_diffuse_radiation_instant = hourly.Variables(1).ValuesAsNumpy()
-        hourly_direct_normal_irradiance_instant = hourly.Variables(
-            2).ValuesAsNumpy()
-
-        hourly_data = {
-            "datetime":
-            pd.date_range(start=pd.to_datetime(hourly.Time(), unit="s"),
-                          end=pd.to_datetime(hourly.TimeEnd(), unit="s"),
-                          freq=pd.Timedelta(seconds=hourly.Interval()),
-                          inclusive="left")
-        }
-        hourly_data["ghi"] = hourly_direct_radiation_instant
-        hourly_data["dhi"] = hourly_diffuse_radiation_instant
-        hourly_data["dni"] = hourly_direct_normal_irradiance_instant
-
-        self.results = pd.DataFrame(data=hourly_data)
+        provider = OpenMeteoProvider(base_url=base_url, session=retry_session, instant=instant)
+        irradiance = provider.get(self.lat, self.lon, self.alt, start, end,
+                                  self.tz)[list(IRRADIANCE_COLUMNS)]
+        return self._resample_irradiance(irradiance, start, end, instant=instant)
 
-        return self.results
+    def get_irradiance_data_provider(self, start, end):
+        """
+        Returns the irradiance (ghi, dhi, dni) of the weather source of the model
+        from start to end, interpolated to the frequency of the model.
+        """
+        store = self.weather_store if self.weather_store is not None else get_weather_store()
+        weather_data = store.get(self.lat, self.lon, self.alt, start, end, self.tz)
+        missing = [column for column in IRRADIANCE_COLUMNS if column not in weather_data.columns]
+        if missing:
+            raise ValueError(f"The weather source {store!r} has no {', '.join(missing)} data.")
+        return self._resample_irradiance(weather_data[list(IRRADIANCE_COLUMNS)], start, end)
+
+    def _resample_irradiance(self, irradiance, start, end, instant=False):
+        """
+        Returns the hourly irradiance on the time axis of the model. The hourly means
+        are placed at the middle of their preceding hour, instantaneous values at their
+        timestamp.
+        """
+        times = TimeAxis.from_range(start, end, self.freq, self.tz).index
+        samples = irradiance.index if instant else irradiance.index - pd.Timedelta("30min")
+        x = samples.as_unit("ns").asi8.astype(np.float64)
+        t = times.as_unit("ns").asi8.astype(np.float64)
+        return pd.DataFrame({
+            column: np.clip(np.interp(t, x, irradiance[column].to_numpy(dtype=np.float64)), 0., None)
+            for column in IRRADIANCE_COLUMNS
+        }, index=times)
 
     def get_irradiance_data(
         self,
@@ -195,13 +198,11 @@ class PV(BaseModel):
             dhi ... diffuse horizontal irradiance
         """
         if endpoint == "open-meteo":
-            self.results = self.get_irradiance_data_open_meteo(
-                start, end, model)
+            self.results = self.get_irradiance_data_open_meteo(start, end)
+        elif endpoint == "provider":
+            self.results = self.get_irradiance_data_provider(start, end)
         elif endpoint == "meteostat":
-            times = pd.date_range(start=start,
-                                  end=end,
-                                  freq=self.freq,
-                                  tz=self.tz)
+            times = TimeAxis.from_range(start, end, self.freq, self.tz).index
             # ineichen with climatology table by default
             cs = self.location.get_clearsky(times, model=model)[:]
             # change index to pd.DatetimeIndex
@@ -245,15 +246,7 @@ class PV(BaseModel):
                 dni         ... direct normal irradiance
                 dhi         ... diffuse horizontal irradiance
                 temp        ... The air temperature in °C
-                dwpt        ... The dew point in °C
-                rhum        ... The relative humidity in percent (%)
-                prcp        ... The one hour precipitation total in mm
-                snow        ... The snow depth in mm
-                wdir        ... The average wind direction in degrees (°)
                 wspd        ... The average wind speed in km/h
-                wpgt        ... The peak wind gust in km/h
-                pres        ... The average sea-level air pressure in hPa
-                tsun        ... The one hour sunshine total in minutes (m)
                 coco        ... The weather condition code
                 poa_global  ... Total in-plane irradiance
                 temp_pv     ... temperature of the pv module
@@ -305,7 +298,7 @@ class PV(BaseModel):
             else:
                 self.results['p_mp'] = pv_size * self.results['eta_rel'] \
                     * (self.results['poa_global'] / pv_efficiency)
-        elif endpoint == "open-meteo":
+        elif endpoint in ("open-meteo", "provider"):
             self.results['p_mp'] = pv_size * self.results['eta_rel'] \
                 * (self.results['poa_global'] / pv_efficiency)
         self.results = self.results
@@ -547,7 +540,9 @@ class PV(BaseModel):
         orient : int
             Orientation of the PV.
         endpoint : str
-            Endpoint of the simulation. - meteostat, open-meteo
+            Endpoint of the simulation. - meteostat (clear sky irradiance with
+            the meteostat weather condition codes), open-meteo (instantaneous Open-Meteo
+            forecast irradiance) or provider (irradiance of the weather source of the model)
 
 
         Returns
@@ -557,7 +552,7 @@ class PV(BaseModel):
         """
         start, end = self.handle_time_format(freq, start, end, year)
         self.get_irradiance_data(start, end, model, endpoint)
-        self.get_weather_data(start, end)
+        self.get_weather_data(start, end, columns=list(WEATHER_COLUMNS))
         self.model(pv_size=pv_size * 1000,
                    consider_cloud_cover=consider_cloud_cover,
                    tilt=tilt,
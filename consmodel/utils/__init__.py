@@ -1,2 +1,9 @@
-from consmodel.utils.tariffsys_utils import individual_tariff_times
-from consmodel.utils.utils import extract_first_date_of_month
\ No newline at end of file
+from consmodel.utils.tariffsys_utils import individual_tariff_times, individual_tariff_blocks
+from consmodel.utils.utils import extract_first_date_of_month
+from consmodel.utils.accounting import tariff_energy, tariff_accounting
+from consmodel.utils.weather_providers import (WeatherProvider, MeteostatProvider, OpenMeteoProvider,
+                                               LocalFileProvider, StubProvider)
+from consmodel.utils.synthetic_weather import SyntheticWeatherProvider, typical_year
+from consmodel.utils.weather_store import WeatherStore, get_weather_store, set_weather_store
+from consmodel.utils.weather_prefetch import prefetch_weather, prefetch_weather_async
+from consmodel.utils.weather_planner import WeatherPlanner
@@ -0,0 +1,182 @@
+"""
+Module Docstring
+
+This module contains the MT/VT (low and high tariff) energy and cost accounting
+of consumption profiles before and after a battery.
+"""
+
+import numpy as np
+import pandas as pd
+from numba import njit, prange
+
+from consmodel.utils.time_axis import TimeAxis
+
+# prices in EUR/kWh of the MT and VT energy and of the exported energy
+MT_PRICE = 0.1
+VT_PRICE = 0.13
+EXPORT_PRICE = 0.047
+
+# VT lasts from 6:00 to 22:00
+VT_FIRST_HOUR = 6
+VT_LAST_HOUR = 21
+
+
+@njit(parallel=True, cache=True)
+def jit_tariff_energy(p_matrix, vt_mask, dt):
+    """
+    Sum the MT, VT and exported energy of every profile in one pass.
+
+    Parameters:
+      p_matrix : 2D array of power values (kW), one profile per row.
+                 Positive values mean consumption.
+      vt_mask  : 1D boolean array, True for the VT timesteps.
+      dt       : Time step in hours.
+
+    Returns:
+      energy   : 2D array with the columns MT, VT and exported energy (kWh)
+                 of every profile. The exported energy is positive.
+    """
+    n_rows, n = p_matrix.shape
+    energy = np.zeros((n_rows, 3))
+    for r in prange(n_rows):
+        e_mt = 0.0
+        e_vt = 0.0
+        e_export = 0.0
+        for i in range(n):
+            p = p_matrix[r, i]
+            if p > 0:
+                if vt_mask[i]:
+                    e_vt += p
+                else:
+                    e_mt += p
+            else:
+                e_export -= p
+        energy[r, 0] = e_mt * dt
+        energy[r, 1] = e_vt * dt
+        energy[r, 2] = e_export * dt
+    return energy
+
+
+def vt_mask(index) -> np.ndarray:
+    """
+    Returns True for the timesteps in VT.
+
+    Args:
+    ----------
+        index: pd.DatetimeIndex or np.array
+            Timestamps marking the end of every interval, or the hour of every interval
+
+    Returns:
+    ----------
+        mask: np.array
+            Boolean VT mask
+    """
+    if isinstance(index, (pd.DatetimeIndex, TimeAxis)):
+        hours = TimeAxis.from_index(index).hour
+    else:
+        hours = np.asarray(index)
+    return (hours >= VT_FIRST_HOUR) & (hours <= VT_LAST_HOUR)
+
+
+def time_step_hours(index) -> float:
+    """
+    Returns the time step of the timestamps in hours, the median spacing.
+
+    Args:
+    ----------
+        index: pd.DatetimeIndex or TimeAxis
+            Timestamps marking the end of every interval
+
+    Returns:
+    ----------
+        dt: float
+            Time step in hours
+    """
+    if not isinstance(index, (pd.DatetimeIndex, TimeAxis)):
+        raise ValueError("dt must be given when the index is not a DatetimeIndex.")
+    epoch_ns = TimeAxis.from_index(index).epoch_ns
+    if len(epoch_ns) < 2:
+        raise ValueError("dt must be given for less than two timestamps.")
+    return float(np.median(np.diff(epoch_ns))) / 3.6e12
+
+
+def tariff_energy(p_kw, index, dt: float = None) -> pd.DataFrame:
+    """
+    Computes the MT, VT and exported energy of one or many profiles.
+
+    Args:
+    ----------
+        p_kw: np.array
+            Power in kW, a profile or a 2D array with one profile per row
+        index: pd.DatetimeIndex or np.array
+            Timestamps or hours of the timesteps
+        dt: float
+            Time step in hours, inferred from the timestamps by default
+
+    Returns:
+    ----------
+        energy: pd.DataFrame
+            Columns e_mt, e_vt and e_export in kWh, one row per profile
+    """
+    p_matrix = np.ascontiguousarray(np.atleast_2d(np.asarray(p_kw, dtype=np.float64)))
+    if dt is None:
+        dt = time_step_hours(index)
+    mask = vt_mask(index)
+    if mask.shape[0] != p_matrix.shape[1]:
+        raise ValueError("The profiles must have a value for every timestep.")
+    energy = jit_tariff_energy(p_matrix, np.ascontiguousarray(mask), float(dt))
+    return pd.DataFrame(energy, columns=["e_mt", "e_vt", "e_export"])
+
+
+def tariff_accounting(p_before,
+                      p_after,
+                      index,
+                      dt: float = None,
+                      mt_price=MT_PRICE,
+                      vt_price=VT_PRICE,
+                      export_price=EXPORT_PRICE) -> pd.DataFrame:
+    """
+    Computes the MT/VT energy, the exported energy and the cost before and after a battery.
+
+    The cost is the MT and VT energy at their prices, less the exported energy at
+    the export price.
+
+    Args:
+    ----------
+        p_before: np.array
+            Power in kW without the battery, a profile or a 2D array with one profile per row
+        p_after: np.array
+            Power in kW with the battery, of the same shape
+        index: pd.DatetimeIndex or np.array
+            Timestamps or hours of the timesteps
+        dt: float
+            Time step in hours, inferred from the timestamps by default
+        mt_price, vt_price, export_price: float or np.array
+            Prices in EUR/kWh, either one for all profiles or one per profile
+
+    Returns:
+    ----------
+        accounting: pd.DataFrame
+            One row per profile with the columns e_mt_before, e_vt_before, e_export_before,
+            cost_before, e_mt_after, e_vt_after, e_export_after, cost_after and savings
+    """
+    p_before = np.atleast_2d(np.asarray(p_before, dtype=np.float64))
+    p_after = np.atleast_2d(np.asarray(p_after, dtype=np.float64))
+    if p_before.shape != p_after.shape:
+        raise ValueError("p_before and p_after must be of the same shape.")
+    # one reduction over the profiles before and after, sharing the VT mask
+    energy = tariff_energy(np.concatenate([p_before, p_after]), index, dt).to_numpy()
+    n_rows = p_before.shape[0]
+    results = {}
+    for suffix, rows in (("before", energy[:n_rows]), ("after", energy[n_rows:])):
+        results[f"e_mt_{suffix}"] = rows[:, 0]
+        results[f"e_vt_{suffix}"] = rows[:, 1]
+        results[f"e_export_{suffix}"] = rows[:, 2]
+        results[f"cost_{suffix}"] = rows[:, 0] * mt_price + rows[:, 1] * vt_price - rows[:, 2] * export_price
+    accounting = pd.DataFrame({
+        name: results[name] for name in (
+            "e_mt_before", "e_vt_before", "e_export_before", "cost_before",
+            "e_mt_after", "e_vt_after", "e_export_after", "cost_after")
+    })
+    accounting["savings"] = accounting["cost_before"] - accounting["cost_after"]
+    return accounting
@@ -108,10 +108,11 @@ class StorageType(GenericType):
         storage_type: str = "tesla_powerwall",
     ):
         self._name = self.types[storage_type]["name"]
-        self._max_charge_p_kw = self.types[storage_type]["max_charge_p_kw"]
-        self._max_discharge_p_kw = self.types[storage_type][
-            "max_discharge_p_kw"]
-        self._max_e_kwh = self.types[storage_type]["max_e_kwh"]
+        self._max_charge_p_kw = float(
+            self.types[storage_type]["max_charge_p_kw"])
+        self._max_discharge_p_kw = float(
+            self.types[storage_type]["max_discharge_p_kw"])
+        self._max_e_kwh = float(self.types[storage_type]["max_e_kwh"])
 
     @property
     def max_charge_p_kw(self):
@@ -0,0 +1,225 @@
+"""
+Module Docstring
+
+This module contains the synthetic typical meteorological year generator and its
+weather provider. The weather of any site is generated from a compact zonal
+climatology, so simulations need no network and no weather files.
+
+The climatology is a coarse table of land sites by latitude: monthly mean sea
+level temperatures, the diurnal temperature range, the spread of the day to day
+temperature anomalies, the wind speed and the cloud fraction. It is meant for
+screening studies of many sites, not for the weather of a particular year.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from scipy.special import ndtr
+
+from consmodel.utils.weather_providers import WEATHER_COLUMNS, WeatherProvider
+
+HOURS_PER_YEAR = 8760
+
+# temperature drop with altitude in °C per m
+LAPSE_RATE = 0.0065
+
+# correlation times of the hourly anomalies in hours
+TEMP_TAU = 36.
+CLOUD_TAU = 18.
+WIND_TAU = 12.
+
+# columns: latitude in the northern hemisphere (the southern one is mirrored with a half year shift),
+# mean sea level temperature in °C of January to December, diurnal temperature range in °C in January and
+# July, standard deviation of the temperature anomaly in °C, mean wind speed in km/h in January and July
+# and cloud fraction in January and July
+CLIMATOLOGY = np.array([
+    [0., 26.5, 26.8, 27.0, 27.0, 26.8, 26.3, 26.0, 26.0, 26.3, 26.5, 26.5, 26.4, 8., 8., 1.0, 9., 9., .60, .60],
+    [10., 25.0, 26.5, 28.5, 30.0, 30.0, 28.5, 27.0, 26.5, 27.0, 27.5, 26.5, 25.0, 12., 8., 1.2, 11., 13., .35, .65],
+    [20., 19.0, 20.5, 23.5, 27.0, 29.5, 30.5, 30.0, 29.5, 28.5, 26.0, 22.5, 19.5, 13., 11., 1.8, 12., 12., .25, .35],
+    [30., 11.0, 13.0, 16.5, 21.0, 25.5, 29.0, 31.0, 30.5, 27.5, 22.5, 16.5, 12.0, 11., 13., 2.5, 12., 10., .35, .25],
+    [40., 3.0, 4.5, 8.5, 13.0, 18.0, 22.5, 25.5, 25.0, 20.5, 14.5, 8.5, 4.0, 8., 12., 3.2, 13., 10., .55, .35],
+    [50., -2.5, -1.5, 2.5, 8.0, 13.0, 16.5, 18.5, 18.0, 14.0, 9.0, 3.5, -1.0, 6., 10., 3.8, 16., 12., .70, .55],
+    [60., -11.0, -10.0, -5.0, 1.5, 8.0, 13.5, 16.0, 14.0, 8.5, 2.5, -4.0, -9.0, 5., 9., 4.5, 17., 13., .75, .65],
+    [70., -24.0, -25.0, -22.0, -14.0, -4.0, 5.0, 9.0, 7.0, 1.0, -8.0, -17.0, -22.0, 3., 5., 5.0, 20., 15., .75, .75],
+])
+
+
+def _climatology(lat):
+    """
+    Returns the climatology rows of the latitudes, interpolated between the table rows.
+    """
+    latitudes = CLIMATOLOGY[:, 0]
+    position = np.interp(np.abs(lat), latitudes, np.arange(len(latitudes)))
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, len(latitudes) - 1)
+    weight = (position - lower)[:, None]
+    return CLIMATOLOGY[lower, 1:] * (1. - weight) + CLIMATOLOGY[upper, 1:] * weight
+
+
+def _site_seeds(lat, lon, alt, seed):
+    """
+    Returns the seed sequence of every site, derived from the seed and the rounded
+    coordinates, so a site gets the same weather alone or in any batch.
+    """
+    return [
+        np.random.SeedSequence([seed,
+                                int(round((site_lat + 90.) * 100)),
+                                int(round((site_lon + 180.) * 100)),
+                                int(round(max(site_alt, -1000.) + 1000.))])
+        for site_lat, site_lon, site_alt in zip(lat, lon, alt)
+    ]
+
+
+def _ar1(noise, tau):
+    """
+    Returns the AR(1) processes with unit variance and correlation time tau driven by
+    the white noise, along the last axis.
+    """
+    phi = np.exp(-1. / tau)
+    series = lfilter([np.sqrt(1. - phi**2)], [1., -phi], noise, axis=-1)
+    # start in the stationary distribution
+    series += noise[..., :1] * (1. - np.sqrt(1. - phi**2)) * phi**np.arange(noise.shape[-1])
+    return series
+
+
+def typical_year(lat, lon, alt, seed: int = 0) -> np.ndarray:
+    """
+    Generates the synthetic hourly typical year of the sites.
+
+    The mean temperature follows the monthly climatology, lowered by the lapse rate,
+    with a diurnal cycle peaking at 15:00 solar time and damped by the clouds. The
+    day to day temperature, cloud and wind anomalies are AR(1) processes. The cloud
+    fraction sets the weather condition codes: clear, fair, cloudy, overcast and light
+    rain or snow.
+
+    Args:
+    ----------
+        lat, lon, alt: array-like
+            Coordinates of the sites
+        seed: int
+            Seed of the anomalies
+
+    Returns:
+    ----------
+        weather: np.ndarray
+            Array (sites, 8760, 3) of temp (°C), wspd (km/h) and coco of the hours of a
+            non-leap year, hour 0 ending at 01:00 UTC on January 1
+    """
+    lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+    lon = np.broadcast_to(np.asarray(lon, dtype=np.float64), lat.shape)
+    alt = np.broadcast_to(np.asarray(alt, dtype=np.float64), lat.shape)
+    n_sites = len(lat)
+    climate = _climatology(lat)
+
+    hours = np.arange(1, HOURS_PER_YEAR + 1, dtype=np.float64)
+    south = (lat < 0.).astype(np.int64)
+    # days since January 1 00:00 UTC in the northern and the southern hemisphere, half a year later
+    days = np.mod(hours[None, :] / 24. + np.array([[0.], [365. / 2.]]), 365.)
+    # monthly means interpolated cyclically between the middles of the months
+    month = np.mod(days * 12. / 365. - 0.5, 12.)
+    lower = np.floor(month).astype(np.int64)
+    weight = month - lower
+    temp_mean = np.empty((n_sites, HOURS_PER_YEAR))
+    for hemisphere in (0, 1):
+        rows = np.flatnonzero(south == hemisphere)
+        monthly = climate[rows, :12]
+        temp_mean[rows] = monthly[:, lower[hemisphere]] * (1. - weight[hemisphere]) \
+            + monthly[:, (lower[hemisphere] + 1) % 12] * weight[hemisphere]
+    temp_mean -= LAPSE_RATE * alt[:, None]
+    # January to July weight of the seasonal columns
+    summer = (0.5 - 0.5 * np.cos(2. * np.pi * (days - 15.) / 365.))[south]
+    dtr = climate[:, 12, None] + (climate[:, 13, None] - climate[:, 12, None]) * summer
+    temp_std = climate[:, 14, None]
+    wind_mean = climate[:, 15, None] + (climate[:, 16, None] - climate[:, 15, None]) * summer
+    cloud_fraction = climate[:, 17, None] + (climate[:, 18, None] - climate[:, 17, None]) * summer
+
+    noise = np.empty((n_sites, 3, HOURS_PER_YEAR))
+    for i, site_seed in enumerate(_site_seeds(lat, lon, alt, seed)):
+        noise[i] = np.random.default_rng(site_seed).standard_normal((3, HOURS_PER_YEAR))
+    temp_anomaly = _ar1(noise[:, 0], TEMP_TAU)
+    # probability of the cloud anomaly, uniform on [0, 1]
+    cloud = ndtr(_ar1(noise[:, 1], CLOUD_TAU))
+    wind_anomaly = _ar1(noise[:, 2], WIND_TAU)
+
+    # the hours of cloud fraction 1 - cloud_fraction are clear or fair, the rest cloudy to rainy
+    clear = 1. - cloud_fraction
+    cloudiness = np.clip((cloud - clear) / np.maximum(cloud_fraction, 1e-9), 0., 1.)
+    # diurnal cycle peaking at 15:00 solar time, cos(hour + shift) of the UTC hour and the longitude shift
+    hour_angle = 2. * np.pi * (hours - 15.) / 24.
+    shift = 2. * np.pi * lon / 360.
+    diurnal = np.outer(np.cos(shift), np.cos(hour_angle)) - np.outer(np.sin(shift), np.sin(hour_angle))
+    temp = temp_mean + temp_std * temp_anomaly + dtr / 2. * (1. - 0.6 * cloudiness) * diurnal
+    # lognormal wind with the climatological mean
+    wspd = wind_mean * np.exp(0.5 * wind_anomaly - 0.125)
+
+    coco = np.select(
+        [cloud < 0.6 * clear, cloud < clear, cloudiness < 0.5, cloudiness < 0.8],
+        [1., 2., 3., 4.],
+        np.where(temp > 0.5, 7., 14.))
+    return np.stack([temp, wspd, coco], axis=-1)
+
+
+class SyntheticWeatherProvider(WeatherProvider):
+    """
+    Provider of the synthetic typical year of every site, for network-free runs.
+
+    Every year of a request gets the same typical year, February 29 repeats February 28.
+    The typical years are generated once per site, rounded like the sites of the
+    weather store, and kept in memory; prepare generates many sites in one call. The
+    provider can be the weather_store of the models or the shared default store:
+
+        set_weather_store(SyntheticWeatherProvider(seed=1))
+
+    Attributes
+    ----------
+    seed : int
+        Seed of the anomalies.
+    precision : int
+        Decimals of the latitude and longitude of the sites.
+
+    Methods
+    -------
+    prepare(lat, lon, alt)
+        Generates the typical years of the sites.
+    """
+
+    columns = WEATHER_COLUMNS
+
+    def __init__(self, seed: int = 0, precision: int = 2):
+        self.seed = seed
+        self.precision = precision
+        self._years = {}
+
+    def __repr__(self):
+        return f"SyntheticWeatherProvider(seed={self.seed})"
+
+    def _site(self, lat, lon, alt):
+        return (round(float(lat), self.precision) + 0.,
+                round(float(lon), self.precision) + 0.,
+                round(float(alt), -1) + 0.)
+
+    def prepare(self, lat, lon, alt):
+        """
+        Generates the typical years of the sites that are not generated yet.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.broadcast_to(np.asarray(lon, dtype=np.float64), lat.shape)
+        alt = np.broadcast_to(np.asarray(alt, dtype=np.float64), lat.shape)
+        sites = list(dict.fromkeys(self._site(*site) for site in zip(lat, lon, alt)))
+        sites = [site for site in sites if site not in self._years]
+        if sites:
+            years = typical_year(*np.array(sites).T, seed=self.seed)
+            years.flags.writeable = False
+            for site, year in zip(sites, years):
+                self._years[site] = year
+
+    def fetch(self, lat, lon, alt, start, end):
+        site = self._site(lat, lon, alt)
+        self.prepare(*site)
+        index = pd.date_range(start, end, freq="1h", name="time")
+        # hour of the typical year ending at every timestamp, by the start of the hour
+        hour_start = index - pd.Timedelta("1h")
+        day = hour_start.dayofyear.to_numpy() - 1
+        day -= (hour_start.is_leap_year & (day >= 59)).astype(np.int64)
+        hour = day * 24 + hour_start.hour.to_numpy()
+        return pd.DataFrame(self._years[site][hour], index=index, columns=list(WEATHER_COLUMNS))
@@ -1,7 +1,86 @@
+import functools
+
 import pandas as pd
 import numpy as np
 import holidays
-import datetime
+
+# Tariff blocks table http://www.pisrs.si/Pis.web/npb/2024-01-0154-2022-01-3624-npb5-p2.pdf
+# indexed by [high_season][workoff][hour], where the high season lasts from November to February
+TARIFF_BLOCKS = np.array([
+    [
+        # low season, working day
+        [4, 4, 4, 4, 4, 4, 3, 2, 2, 2, 2, 2, 2, 2, 3, 3, 2, 2, 2, 2, 3, 3, 4, 4],
+        # low season, work-off day
+        [5, 5, 5, 5, 5, 5, 4, 3, 3, 3, 3, 3, 3, 3, 4, 4, 3, 3, 3, 3, 4, 4, 5, 5],
+    ],
+    [
+        # high season, working day
+        [3, 3, 3, 3, 3, 3, 2, 1, 1, 1, 1, 1, 1, 1, 2, 2, 1, 1, 1, 1, 2, 2, 3, 3],
+        # high season, work-off day
+        [4, 4, 4, 4, 4, 4, 3, 2, 2, 2, 2, 2, 2, 2, 3, 3, 2, 2, 2, 2, 3, 3, 4, 4],
+    ],
+], dtype=np.int8)
+
+# the timestamps mark the end of every interval, its calendar features are taken
+# this many minutes before it, whatever the frequency
+INTERVAL_END_SHIFT_MINUTES = 1
+
+
+@functools.lru_cache(maxsize=None)
+def si_holiday_dates(first_year: int, last_year: int) -> np.array:
+    """
+    Returns the Slovenian public holidays between the given years as a datetime64[D] array.
+    """
+    si_holidays = holidays.SI(years=range(first_year, last_year + 1))
+    return np.array(sorted(si_holidays.keys()), dtype="datetime64[D]")
+
+
+def tariff_blocks(hours: np.array, months: np.array, workoff: np.array) -> np.array:
+    """
+    Looks up the tariff block for every timestep
+
+    Args:
+    ----------
+        hours: np.array
+            Hour of the day (0-23) of every timestep
+        months: np.array
+            Month (1-12) of every timestep
+        workoff: np.array
+            True for weekends and holidays
+
+    Returns:
+    ----------
+        blocks: np.array
+            Tariff block (1-5) of every timestep as int8
+    """
+    high_season = (np.asarray(months) < 3) | (np.asarray(months) > 10)
+    return TARIFF_BLOCKS[high_season.astype(np.intp),
+                         np.asarray(workoff).astype(np.intp),
+                         np.asarray(hours).astype(np.intp)]
+
+
+def individual_tariff_blocks(dates) -> np.array:
+    """
+    Generates tariff block codes for the given dates
+
+    Takes an array of dates (timestamps at the end of every interval) and returns
+    the tariff block from 1 to 5 of every date, the block of the interval one minute
+    before the date, as TimeAxis.tariff_block of the dates. Tz-aware dates are
+    evaluated in their local time.
+
+    Args:
+    ----------
+        dates: np.array or pd.DatetimeIndex
+            Array of dates
+
+    Returns:
+    ----------
+        blocks: np.array
+            Tariff block (1-5) of every date as int8
+    """
+    # the calendar logic lives in TimeAxis, which imports this module
+    from consmodel.utils.time_axis import TimeAxis
+    return np.array(TimeAxis.from_index(pd.DatetimeIndex(dates)).tariff_block)
 
 
 def individual_tariff_times(dates: np.array) -> np.array:
@@ -21,51 +100,7 @@ def individual_tariff_times(dates: np.array) -> np.array:
 		tariff_mask: np.array
 			Tariff mask
 	"""
-    # Prepare array of holidays
-    si_holidays = holidays.SI(years=(dates[0].year, dates[-1].year))
-
-    # Tariff blocks table http://www.pisrs.si/Pis.web/npb/2024-01-0154-2022-01-3624-npb5-p2.pdf
-    high_season_working = [
-        3, 3, 3, 3, 3, 3, 2, 1, 1, 1, 1, 1, 1, 1, 2, 2, 1, 1, 1, 1, 2, 2, 3, 3
-    ]
-    low_season_working = [
-        4, 4, 4, 4, 4, 4, 3, 2, 2, 2, 2, 2, 2, 2, 3, 3, 2, 2, 2, 2, 3, 3, 4, 4
-    ]
-    high_season_workoff = [
-        4, 4, 4, 4, 4, 4, 3, 2, 2, 2, 2, 2, 2, 2, 3, 3, 2, 2, 2, 2, 3, 3, 4, 4
-    ]
-    low_season_workoff = [
-        5, 5, 5, 5, 5, 5, 4, 3, 3, 3, 3, 3, 3, 3, 4, 4, 3, 3, 3, 3, 4, 4, 5, 5
-    ]
-
-    # combine blocks into two seasons
-    high_season = [high_season_working, high_season_workoff]
-    low_season = [low_season_working, low_season_workoff]
-
-    # combine both seasons
-    blocks = [low_season, high_season]
-
-    # np.array([block_1, block_2, block_3, block_4, block_5])
-    tariff_mask = np.zeros((5, len(dates)), dtype=int)
-
-    i = 0
-    for date in dates:
-        date -= datetime.timedelta(minutes=15)
-        if date in si_holidays or date.weekday() > 4:
-            workoff = 1
-        else:
-            workoff = 0
-
-        if 2 < date.month < 11:
-            high_season = 0
-        else:
-            high_season = 1
-
-        hour = date.hour
-        # takes the correct block and subtracts 1 because array indexing starts at 0
-        j = blocks[high_season][workoff][hour] - 1
-        tariff_mask[j][i] = 1
-
-        i += 1
-
-    return tariff_mask
\ No newline at end of file
+    blocks = individual_tariff_blocks(dates)
+    tariff_mask = np.zeros((5, len(blocks)), dtype=int)
+    tariff_mask[blocks - 1, np.arange(len(blocks))] = 1
+    return tariff_mask
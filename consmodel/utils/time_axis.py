@@ -0,0 +1,253 @@
+"""
+Module Docstring
+
+This module contains the TimeAxis class, a shared time axis with
+precomputed calendar features.
+"""
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+from consmodel.utils.tariffsys_utils import INTERVAL_END_SHIFT_MINUTES, si_holiday_dates, tariff_blocks
+
+
+class TimeAxis:
+    """
+    Immutable time axis shared by all models simulated over the same period.
+
+    The timestamps mark the end of every interval, so the calendar features
+    (hour, month, weekday, ...) describe the interval that ends at the timestamp,
+    i.e. they are taken one minute before it. Tz-aware axes are evaluated in their
+    local time. The features are computed on first access and cached.
+
+    Attributes
+    ----------
+    index : pd.DatetimeIndex
+        The (localised) timestamps.
+    epoch_ns : np.ndarray
+        The timestamps as int64 nanoseconds since the epoch (UTC).
+    hour, month, year, weekday : np.ndarray
+        Calendar features of every interval.
+    holiday, workoff : np.ndarray
+        Flags for Slovenian public holidays and for holidays or weekends.
+    month_code : np.ndarray
+        year * 12 + month - 1 of every interval.
+    tariff_block : np.ndarray
+        Tariff block (1-5) of every interval.
+
+    Methods
+    -------
+    from_range(start, end, freq, tz)
+        Memoised time axis from start to end.
+    from_index(index)
+        Time axis of an existing index, memoised when the index is regular.
+    interpolate(data, columns)
+        Columns of the data linearly interpolated to the timestamps.
+    """
+
+    __slots__ = ("_index", "_cache")
+
+    def __init__(self, index: pd.DatetimeIndex):
+        self._index = pd.DatetimeIndex(index)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        if len(self) == 0:
+            return "TimeAxis(empty)"
+        return f"TimeAxis(start={self._index[0]}, end={self._index[-1]}, n={len(self)})"
+
+    @classmethod
+    def from_range(cls, start, end, freq, tz=None):
+        """
+        Returns the time axis from start to end (both included) with the given freq.
+        Equal arguments return the same TimeAxis object.
+        """
+        start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+        if tz is not None and start.tz is None:
+            start = start.tz_localize(tz)
+            end = end.tz_localize(tz)
+        tz = None if start.tz is None else str(start.tz)
+        return _time_axis(start, end, pd.Timedelta(freq), tz)
+
+    @classmethod
+    def from_index(cls, index):
+        """
+        Returns the time axis of the given index. Regularly spaced indexes are
+        memoised like from_range, irregular ones get their own TimeAxis.
+        """
+        if isinstance(index, TimeAxis):
+            return index
+        index = pd.DatetimeIndex(index)
+        if len(index) > 1:
+            epoch_ns = index.values.astype("datetime64[ns]").view(np.int64)
+            steps = np.diff(epoch_ns)
+            if steps[0] > 0 and (steps == steps[0]).all():
+                tz = None if index.tz is None else str(index.tz)
+                return _time_axis(index[0], index[-1], pd.Timedelta(int(steps[0]), unit="ns"), tz)
+        return cls(index)
+
+    # __________________________________________________________________________
+    # Properties
+    # __________________________________________________________________________
+    @property
+    def index(self):
+        return self._index
+
+    @property
+    def epoch_ns(self):
+        return self._cached("epoch_ns", lambda: self._index.values.astype("datetime64[ns]").view(np.int64))
+
+    @property
+    def hour(self):
+        return self._cached("hour", lambda: self._local_minutes()[1] // 60)
+
+    @property
+    def month(self):
+        return self._cached("month", lambda: self._calendar_days()[1][self._day_positions()])
+
+    @property
+    def year(self):
+        return self._cached("year", lambda: self._calendar_days()[2][self._day_positions()])
+
+    @property
+    def weekday(self):
+        return self._cached("weekday", lambda: self._calendar_days()[3][self._day_positions()])
+
+    @property
+    def holiday(self):
+        return self._cached("holiday", lambda: self._calendar_days()[4][self._day_positions()])
+
+    @property
+    def workoff(self):
+        return self._cached("workoff", lambda: self.holiday | (self.weekday > 4))
+
+    @property
+    def month_code(self):
+        return self._cached("month_code", lambda: self.year.astype(np.int64) * 12 + self.month - 1)
+
+    @property
+    def tariff_block(self):
+        return self._cached("tariff_block", lambda: tariff_blocks(self.hour, self.month, self.workoff))
+
+    # __________________________________________________________________________
+    # Methods
+    # __________________________________________________________________________
+    def _cached(self, name, compute):
+        """
+        Returns the cached feature with the given name, computing it on first access.
+        """
+        if name not in self._cache:
+            values = np.asarray(compute())
+            values.flags.writeable = False
+            self._cache[name] = values
+        return self._cache[name]
+
+    def interpolate(self, data: pd.DataFrame, columns=None) -> pd.DataFrame:
+        """
+        Returns the columns of the data linearly interpolated in time to the timestamps
+        of the axis, e.g. hourly weather on a 15 min axis.
+
+        The positions of the timestamps in the data are computed once for all columns
+        and cached for regular data, so many sites with data on the same hours share
+        them. Missing values are interpolated over, outside the data the first and the
+        last values are held.
+
+        Args:
+        ----------
+            data: pd.DataFrame
+                Data with a DatetimeIndex, naive or in any time zone if the axis is tz-aware
+            columns: list
+                Columns to interpolate, all by default
+
+        Returns:
+        ----------
+            interpolated: pd.DataFrame
+                Float columns indexed by the axis
+        """
+        columns = list(data.columns) if columns is None else list(columns)
+        source_ns = pd.DatetimeIndex(data.index).values.astype("datetime64[ns]").view(np.int64)
+        interpolated = {}
+        if len(source_ns) == 0:
+            for column in columns:
+                interpolated[column] = np.full(len(self), np.nan)
+            return pd.DataFrame(interpolated, index=self._index, copy=False)
+        lower, weight = self._interpolation_weights(source_ns)
+        upper = np.minimum(lower + 1, len(source_ns) - 1)
+        for column in columns:
+            values = data[column].to_numpy(dtype=np.float64)
+            finite = np.isfinite(values)
+            if finite.all():
+                interpolated[column] = values[lower] * (1. - weight) + values[upper] * weight
+            elif finite.any():
+                interpolated[column] = np.interp(self.epoch_ns, source_ns[finite], values[finite])
+            else:
+                interpolated[column] = np.full(len(self), np.nan)
+        return pd.DataFrame(interpolated, index=self._index, copy=False)
+
+    def _interpolation_weights(self, source_ns):
+        """
+        Returns the position of the preceding source timestamp and the weight of the
+        following one for every timestamp of the axis.
+        """
+        steps = np.diff(source_ns)
+        regular = len(steps) > 0 and (steps == steps[0]).all()
+        key = ("_interpolation_weights", int(source_ns[0]), int(steps[0]), len(source_ns)) if regular else None
+        if key in self._cache:
+            return self._cache[key]
+        target_ns = self.epoch_ns
+        lower = np.clip(np.searchsorted(source_ns, target_ns, side="right") - 1, 0, len(source_ns) - 1)
+        upper = np.minimum(lower + 1, len(source_ns) - 1)
+        span = (source_ns[upper] - source_ns[lower]).astype(np.float64)
+        weight = np.divide((target_ns - source_ns[lower]).astype(np.float64), span,
+                           out=np.zeros(len(target_ns)), where=span > 0)
+        weight = np.clip(weight, 0., 1.)
+        if key is not None:
+            self._cache[key] = (lower, weight)
+        return lower, weight
+
+    def _local_minutes(self):
+        """
+        Returns the day number and the minute of the day of every interval in local time.
+        """
+        if "_local_minutes" not in self._cache:
+            index = self._index
+            if index.tz is not None:
+                index = index.tz_localize(None)
+            minutes = index.values.astype("datetime64[m]").astype(np.int64) - INTERVAL_END_SHIFT_MINUTES
+            day_numbers = minutes // 1440
+            self._cache["_local_minutes"] = (day_numbers, minutes - day_numbers * 1440)
+        return self._cache["_local_minutes"]
+
+    def _day_positions(self):
+        """
+        Returns the position of every interval in the covered range of days.
+        """
+        day_numbers = self._local_minutes()[0]
+        return day_numbers - day_numbers.min()
+
+    def _calendar_days(self):
+        """
+        Returns the calendar features once per day in the covered range of days.
+        """
+        if "_calendar_days" not in self._cache:
+            day_numbers = self._local_minutes()[0]
+            days = np.arange(day_numbers.min(), day_numbers.max() + 1).astype("datetime64[D]")
+            months = days.astype("datetime64[M]").astype(np.int64) % 12 + 1
+            years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+            # 1970-01-01 was a Thursday
+            weekdays = (days.astype(np.int64) + 3) % 7
+            holidays = np.isin(days, si_holiday_dates(int(years[0]), int(years[-1])))
+            self._cache["_calendar_days"] = (days, months, years, weekdays, holidays)
+        return self._cache["_calendar_days"]
+
+
+@functools.lru_cache(maxsize=128)
+def _time_axis(start, end, step, tz):
+    # tz is part of the key as equal instants in different time zones compare equal
+    return TimeAxis(pd.date_range(start=start, end=end, freq=step))
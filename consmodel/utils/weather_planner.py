@@ -0,0 +1,301 @@
+"""
+Module Docstring
+
+This module contains the WeatherPlanner class, which groups the consumers of a
+fleet into weather cells so that the weather of every cell is fetched once and
+shared by all of its consumers.
+"""
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from consmodel.utils.weather_prefetch import prefetch_weather
+from consmodel.utils.weather_store import DEFAULT_PATH, WeatherStore, get_weather_store
+
+
+def _meteostat_stations():
+    """
+    Returns the meteostat stations with hourly data, indexed by their id, with the
+    columns latitude, longitude and elevation.
+    """
+    from meteostat import Stations
+    stations = Stations().fetch()
+    stations = stations[stations["hourly_start"].notna()]
+    return stations[["latitude", "longitude", "elevation"]]
+
+
+def _unit_vectors(lat, lon):
+    """
+    Returns the points on the unit sphere of the coordinates in degrees.
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class CellWeather:
+    """
+    Weather source of the models in one cell of a WeatherPlanner, used as their weather_store.
+    Whatever the coordinates of the model, it serves the shared weather of the cell.
+    """
+
+    __slots__ = ("planner", "cell")
+
+    def __init__(self, planner, cell):
+        self.planner = planner
+        self.cell = cell
+
+    def __repr__(self):
+        return f"CellWeather(cell={self.cell})"
+
+    def get(self, lat, lon, alt, start, end, tz=None):
+        return self.planner.weather(self.cell, start, end, tz)
+
+    def interpolate(self, time_axis, lat, lon, alt, start, end, tz=None):
+        return self.planner.interpolated(self.cell, time_axis, start, end, tz)
+
+
+class WeatherPlanner:
+    """
+    Fleet level planner of the weather data of many consumers.
+
+    The consumers are snapped to the cells of a lat/lon grid with altitude bands
+    ("grid") or to their nearest meteostat station with hourly data ("station").
+    The weather of a cell is fetched once, through the weather store, at the cell
+    coordinates and every consumer of the cell gets the same read-only frame. The
+    weather interpolated to the time axis of the models is shared too: the results
+    of the consumers reference its columns until they write to them, so the
+    weather I/O and memory grow with the number of cells, not of consumers. At most
+    max_frames frames are kept, the least recently used are dropped first.
+
+    The station index is built once from the meteostat station list and cached as
+    stations.npz in cache_dir, by default the directory of the weather store or the
+    default weather store directory if the store has none.
+
+    Attributes
+    ----------
+    store : WeatherStore
+        Store the cells are fetched through, the shared default store by default.
+    snap : str
+        "grid" or "station".
+    cell_deg : float
+        Size of the grid cells in degrees.
+    alt_step : float
+        Height of the altitude bands of the grid cells in m.
+    cells : pd.DataFrame
+        Coordinates and number of consumers of the planned cells, indexed by cell.
+    max_frames : int
+        Largest number of shared weather frames kept in memory.
+    cache_dir : str
+        Directory of the cached station index.
+
+    Methods
+    -------
+    snap_coordinates(lat, lon, alt)
+        Cells of the coordinates.
+    assign(models)
+        Snaps the models to their cells and serves their weather from them.
+    prefetch(start, end, tz, max_concurrency)
+        Fetches the weather of all planned cells concurrently.
+    weather(cell, start, end, tz)
+        Shared weather data of a cell.
+    interpolated(cell, time_axis, start, end, tz)
+        Shared weather data of a cell on a time axis.
+    """
+
+    def __init__(self,
+                 store=None,
+                 snap: str = "grid",
+                 cell_deg: float = 0.1,
+                 alt_step: float = 100.,
+                 stations: pd.DataFrame = None,
+                 max_frames: int = 256,
+                 cache_dir: str = None):
+        if snap not in ("grid", "station"):
+            raise ValueError('snap must be "grid" or "station".')
+        if max_frames < 1:
+            raise ValueError("max_frames has to be at least 1.")
+        self.store = get_weather_store() if store is None else store
+        self.snap = snap
+        self.cell_deg = cell_deg
+        self.alt_step = alt_step
+        self.max_frames = max_frames
+        if cache_dir is None:
+            cache_dir = getattr(self.store, "path", None) or os.environ.get("CONSMODEL_WEATHER_STORE", DEFAULT_PATH)
+        self.cache_dir = cache_dir
+        self._stations = stations
+        self._station_index = None
+        self._cells = {}
+        self._members = {}
+        self._frames = OrderedDict()
+
+    def __repr__(self):
+        return f"WeatherPlanner(snap={self.snap!r}, cells={len(self._cells)})"
+
+    @property
+    def cells(self):
+        return pd.DataFrame(
+            {
+                "lat": [coordinates[0] for coordinates in self._cells.values()],
+                "lon": [coordinates[1] for coordinates in self._cells.values()],
+                "alt": [coordinates[2] for coordinates in self._cells.values()],
+                "n_consumers": [self._members.get(cell, 0) for cell in self._cells],
+            },
+            index=pd.Index(list(self._cells), name="cell", tupleize_cols=False))
+
+    def snap_coordinates(self, lat, lon, alt) -> list:
+        """
+        Returns the cells of the coordinates and registers their cell coordinates.
+
+        Args:
+        ----------
+            lat, lon, alt: array-like
+                Coordinates of the consumers
+
+        Returns:
+        ----------
+            cells: list
+                Cell of every consumer, a (lat, lon, alt) index tuple of the grid
+                or the station id
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        alt = np.broadcast_to(np.asarray(alt, dtype=np.float64), lat.shape)
+        if self.snap == "grid":
+            i_lat = np.round(lat / self.cell_deg).astype(np.int64)
+            i_lon = np.round(lon / self.cell_deg).astype(np.int64)
+            i_alt = np.round(alt / self.alt_step).astype(np.int64)
+            cells = list(zip(i_lat.tolist(), i_lon.tolist(), i_alt.tolist()))
+            for cell in set(cells):
+                if cell not in self._cells:
+                    self._cells[cell] = (round(cell[0] * self.cell_deg, 6),
+                                         round(cell[1] * self.cell_deg, 6),
+                                         float(cell[2] * self.alt_step))
+            return cells
+
+        ids, tree, coordinates = self._load_station_index()
+        _, nearest = tree.query(_unit_vectors(lat, lon))
+        cells = [str(ids[i]) for i in nearest]
+        for i in np.unique(nearest):
+            self._cells.setdefault(str(ids[i]), tuple(float(value) for value in coordinates[i]))
+        return cells
+
+    def assign(self, models) -> list:
+        """
+        Snaps the models to their cells and sets their weather_store to the shared cell weather.
+
+        Args:
+        ----------
+            models: list of BaseModel
+                Models with lat, lon and alt, e.g. ConsumerModel, PV or HP
+
+        Returns:
+        ----------
+            cells: list
+                Cell of every model
+        """
+        models = list(models)
+        cells = self.snap_coordinates([model.lat for model in models],
+                                      [model.lon for model in models],
+                                      [model.alt for model in models])
+        sources = {}
+        for model, cell in zip(models, cells):
+            if cell not in sources:
+                sources[cell] = CellWeather(self, cell)
+            model.weather_store = sources[cell]
+            self._members[cell] = self._members.get(cell, 0) + 1
+        return cells
+
+    def prefetch(self, start, end, tz=None, max_concurrency: int = 8) -> dict:
+        """
+        Fetches the weather of every planned cell from start to end. The missing hours
+        of a weather store are fetched for all cells concurrently, see prefetch_weather.
+
+        Returns:
+        ----------
+            weather: dict
+                Shared weather frame of every cell
+        """
+        if isinstance(self.store, WeatherStore) and not self.store.offline:
+            prefetch_weather(list(self._cells.values()), start, end, tz,
+                             store=self.store, max_concurrency=max_concurrency)
+        return {cell: self.weather(cell, start, end, tz) for cell in self._cells}
+
+    def weather(self, cell, start, end, tz=None) -> pd.DataFrame:
+        """
+        Returns the weather data of the cell from start to end, shared by all calls
+        with the same arguments. Its values are read-only.
+        """
+        key = (cell, pd.Timestamp(start), pd.Timestamp(end), tz)
+        frame = self._cached_frame(key)
+        if frame is None:
+            lat, lon, alt = self._cells[cell]
+            data = self.store.get(lat, lon, alt, start, end, tz)
+            values = data.to_numpy(dtype=np.float64, copy=True)
+            values.flags.writeable = False
+            frame = self._cache_frame(key, pd.DataFrame(values, index=data.index, columns=data.columns, copy=False))
+        return frame
+
+    def interpolated(self, cell, time_axis, start, end, tz=None) -> pd.DataFrame:
+        """
+        Returns the weather data of the cell from start to end interpolated to the
+        time axis, shared by all calls with the same arguments. Equal time axes are
+        the same TimeAxis object, so the consumers of a cell with the same axis get
+        the same frame; assigning its columns to their results does not copy them.
+        """
+        key = (cell, time_axis, pd.Timestamp(start), pd.Timestamp(end), tz)
+        frame = self._cached_frame(key)
+        if frame is None:
+            frame = self._cache_frame(key, time_axis.interpolate(self.weather(cell, start, end, tz)))
+        return frame
+
+    def _cached_frame(self, key):
+        """
+        Returns the cached frame of the key, marked as the most recently used, or None.
+        """
+        frame = self._frames.get(key)
+        if frame is not None:
+            self._frames.move_to_end(key)
+        return frame
+
+    def _cache_frame(self, key, frame):
+        """
+        Caches the frame, dropping the least recently used frames above max_frames.
+        """
+        self._frames[key] = frame
+        while len(self._frames) > self.max_frames:
+            self._frames.popitem(last=False)
+        return frame
+
+    def clear(self):
+        """
+        Drops the shared weather frames, the cells stay planned.
+        """
+        self._frames.clear()
+
+    def _load_station_index(self):
+        """
+        Returns the station ids, their KD-tree on the unit sphere and their coordinates,
+        read from the cached station list or built from it.
+        """
+        if self._station_index is None:
+            file = os.path.join(self.cache_dir, "stations.npz")
+            if self._stations is None and os.path.exists(file):
+                with np.load(file, allow_pickle=False) as npz:
+                    ids = npz["ids"]
+                    coordinates = npz["coordinates"]
+            else:
+                stations = _meteostat_stations() if self._stations is None else self._stations
+                ids = np.array(stations.index, dtype=str)
+                coordinates = np.array(stations[["latitude", "longitude", "elevation"]], dtype=np.float64)
+                coordinates[np.isnan(coordinates[:, 2]), 2] = 0.
+                if self._stations is None:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    np.savez(file, ids=ids, coordinates=coordinates)
+            self._station_index = (ids, cKDTree(_unit_vectors(coordinates[:, 0], coordinates[:, 1])),
+                                   coordinates)
+        return self._station_index
@@ -0,0 +1,152 @@
+"""
+Module Docstring
+
+This module contains prefetch_weather, which fills the weather store with the
+weather of many sites concurrently before a fleet is simulated, so the waits
+for the weather services overlap instead of adding up.
+"""
+
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from consmodel.utils.weather_store import get_weather_store
+
+
+def _site_coordinates(site):
+    """
+    Returns the (lat, lon, alt) of a site given as a tuple or as a model.
+    """
+    if hasattr(site, "lat"):
+        return site.lat, site.lon, site.alt
+    lat, lon, alt = site
+    return lat, lon, alt
+
+
+def _retryable(error):
+    """
+    Returns True unless the error is an HTTP client error, which a retry does not fix.
+    Too many requests (429) is retried.
+    """
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is None or status >= 500 or status == 429
+
+
+async def prefetch_weather_async(sites,
+                                 start,
+                                 end,
+                                 tz: str = None,
+                                 store=None,
+                                 max_concurrency: int = 8,
+                                 retries: int = 3,
+                                 backoff_factor: float = 0.5,
+                                 raise_errors: bool = True) -> pd.DataFrame:
+    """
+    Fetches the hours from start to end that are missing in the weather store for
+    all sites, at most max_concurrency at a time, and adds them to the store.
+
+    The blocking fetch function of the store runs in a pool of max_concurrency
+    threads. A failed fetch is retried after backoff_factor * 2 ** (attempt - 1)
+    seconds (with up to 10 % jitter), except for HTTP client errors. A waiting
+    retry does not hold a slot. The fetched data is added to the store on the
+    event loop, one site at a time.
+
+    Args:
+    ----------
+        sites: iterable
+            (lat, lon, alt) tuples or models with lat, lon and alt. Sites with the same
+            store key are fetched once
+        start, end: datetime
+            Range of the data, both included. Naive timestamps are in tz
+        tz: str
+            Time zone of the naive timestamps, UTC by default
+        store: WeatherStore
+            Store to fill, the shared default store by default
+        max_concurrency: int
+            Largest number of fetches at a time
+        retries: int
+            Retries of a failed fetch
+        backoff_factor: float
+            Wait before the first retry in seconds, doubled for every further one
+        raise_errors: bool
+            Raise a ValueError after all sites are done if any site failed
+
+    Returns:
+    ----------
+        report: pd.DataFrame
+            Per site key the rounded lat, lon and alt, the number of missing ranges,
+            the fetched ranges, the fetch attempts and the error of the failed sites
+    """
+    store = get_weather_store() if store is None else store
+    if store.offline:
+        raise ValueError("The weather store is offline.")
+    jobs = {}
+    for site in sites:
+        coordinates, key = store.site_key(*_site_coordinates(site))
+        jobs.setdefault(key, coordinates)
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    attempts = {key: 0 for key in jobs}
+
+    async def fetch(key, lat, lon, alt, range_start, range_end):
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(backoff_factor * 2**(attempt - 1) * (1. + 0.1 * random.random()))
+            async with semaphore:
+                attempts[key] += 1
+                try:
+                    return await loop.run_in_executor(executor, store.fetch, lat, lon, alt,
+                                                      range_start.tz_localize(None), range_end.tz_localize(None))
+                except Exception as error:
+                    if attempt == retries or not _retryable(error):
+                        raise
+
+    async def prefetch_site(key, lat, lon, alt):
+        missing = store.missing(lat, lon, alt, start, end, tz)
+        results = await asyncio.gather(*(fetch(key, lat, lon, alt, range_start, range_end)
+                                         for range_start, range_end in missing),
+                                       return_exceptions=True)
+        fetched = [(missing_range, frame) for missing_range, frame in zip(missing, results)
+                   if not isinstance(frame, BaseException)]
+        errors = [error for error in results if isinstance(error, BaseException)]
+        if fetched:
+            store.add(lat, lon, alt, [missing_range for missing_range, _ in fetched],
+                      [frame for _, frame in fetched])
+        return {
+            "lat": lat,
+            "lon": lon,
+            "alt": alt,
+            "ranges": len(missing),
+            "fetched": len(fetched),
+            "attempts": attempts[key],
+            "error": errors[0] if errors else None,
+        }
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="weather") as executor:
+        rows = await asyncio.gather(*(prefetch_site(key, *coordinates) for key, coordinates in jobs.items()))
+
+    report = pd.DataFrame(rows, index=pd.Index(list(jobs), name="site"),
+                          columns=["lat", "lon", "alt", "ranges", "fetched", "attempts", "error"])
+    errors = [error for error in report["error"] if error is not None]
+    if raise_errors and errors:
+        raise ValueError(
+            f"The weather of {len(errors)} of {len(report)} sites could not be fetched: {errors[0]!r}") from errors[0]
+    report["error"] = [None if error is None else repr(error) for error in report["error"]]
+    return report
+
+
+def prefetch_weather(sites, start, end, tz: str = None, **kwargs) -> pd.DataFrame:
+    """
+    Runs prefetch_weather_async, in its own thread if an event loop is already running
+    (e.g. in a notebook), and returns its report.
+    """
+    coroutine = prefetch_weather_async(sites, start, end, tz, **kwargs)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
@@ -0,0 +1,375 @@
+"""
+Module Docstring
+
+This module contains the weather providers, the backends the hourly weather
+data of the models comes from: meteostat, Open-Meteo, local CSV/parquet files
+and an in-memory stub.
+
+Every provider returns hourly data with a tz-aware index and float columns of
+the same names and units:
+    temp ... The air temperature in °C
+    wspd ... The average wind speed in km/h
+    coco ... The weather condition code (meteostat codes)
+    ghi  ... Global horizontal irradiance in W/m²
+    dhi  ... Diffuse horizontal irradiance in W/m²
+    dni  ... Direct normal irradiance in W/m²
+Providers without irradiance leave out ghi, dhi and dni.
+"""
+
+import glob
+import math
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+# one hour in nanoseconds, the weather data is hourly
+HOUR_NS = 3_600_000_000_000
+
+WEATHER_COLUMNS = ("temp", "wspd", "coco")
+IRRADIANCE_COLUMNS = ("ghi", "dhi", "dni")
+
+# WMO weather codes of Open-Meteo and the closest meteostat condition codes
+WMO_TO_COCO = {
+    0: 1, 1: 2, 2: 3, 3: 4, 45: 5, 48: 6,
+    51: 7, 53: 7, 55: 8, 56: 10, 57: 11,
+    61: 7, 63: 8, 65: 9, 66: 10, 67: 11,
+    71: 14, 73: 15, 75: 16, 77: 15,
+    80: 17, 81: 18, 82: 18, 85: 21, 86: 22,
+    95: 25, 96: 24, 99: 26,
+}
+
+
+def _hour_ns(timestamp, tz, up=False):
+    """
+    Returns the timestamp as UTC nanoseconds, rounded down or up to the hour.
+    Naive timestamps are in tz, or in UTC if tz is None.
+    """
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tz is None:
+        timestamp = timestamp.tz_localize(tz or "UTC", ambiguous=False, nonexistent="shift_forward")
+    value = timestamp.tz_convert("UTC").tz_localize(None).as_unit("ns").value
+    if up:
+        return -(-value // HOUR_NS) * HOUR_NS
+    return value // HOUR_NS * HOUR_NS
+
+
+def _to_utc(data):
+    """
+    Returns the data with float columns and a tz-aware UTC index named "time".
+    """
+    data = pd.DataFrame(data)
+    index = pd.DatetimeIndex(data.index, name="time")
+    data.index = index.tz_localize("UTC") if index.tz is None else index.tz_convert("UTC")
+    return data.astype(np.float64)
+
+
+class WeatherProvider(ABC):
+    """
+    Backend of hourly weather data.
+
+    A provider can be used directly as the weather_store of a model, which then
+    fetches on every simulation, or as the fetch function of a WeatherStore,
+    which fetches every site and range only once.
+
+    Attributes
+    ----------
+    columns : tuple
+        Columns the provider returns.
+
+    Methods
+    -------
+    fetch(lat, lon, alt, start, end)
+        Hourly data from start to end, naive UTC timestamps, both included.
+    get(lat, lon, alt, start, end, tz)
+        Hourly data from start to end with an index in tz.
+    """
+
+    columns = WEATHER_COLUMNS
+
+    def __call__(self, lat, lon, alt, start, end):
+        return self.fetch(lat, lon, alt, start, end)
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+    @abstractmethod
+    def fetch(self, lat, lon, alt, start, end) -> pd.DataFrame:
+        """
+        Returns the hourly data from start to end (naive UTC timestamps, both included)
+        with a UTC index, naive or tz-aware.
+        """
+
+    def get(self, lat, lon, alt, start, end, tz=None) -> pd.DataFrame:
+        """
+        Returns the hourly weather data of the site from start to end.
+
+        Args:
+        ----------
+            lat, lon, alt: float
+                Coordinates of the site
+            start, end: datetime
+                Range of the data, both included. Naive timestamps are in tz
+            tz: str
+                Time zone of the naive timestamps and of the returned index, UTC by default
+
+        Returns:
+        ----------
+            weather_data: pd.DataFrame
+                Hourly weather data with a tz-aware index
+        """
+        start_ns = _hour_ns(start, tz)
+        end_ns = _hour_ns(end, tz, up=True)
+        if end_ns < start_ns:
+            raise ValueError("Start must be before end.")
+        data = _to_utc(self.fetch(lat, lon, alt, pd.Timestamp(start_ns), pd.Timestamp(end_ns)))
+        data = data[(data.index >= pd.Timestamp(start_ns, tz="UTC"))
+                    & (data.index <= pd.Timestamp(end_ns, tz="UTC"))]
+        if tz is not None:
+            data = data.tz_convert(tz)
+        return data
+
+
+class MeteostatProvider(WeatherProvider):
+    """
+    Hourly meteostat data, interpolated from the stations near the site.
+    Besides temp, wspd and coco it returns all other meteostat columns.
+    """
+
+    def fetch(self, lat, lon, alt, start, end):
+        from meteostat import Hourly, Point
+        return Hourly(Point(lat, lon, alt), start.to_pydatetime(), end.to_pydatetime()).fetch()
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """
+    Hourly data of the Open-Meteo API, including the irradiance.
+
+    The weather codes are mapped to the meteostat condition codes. The irradiance
+    is the mean of the preceding hour, or with instant the instantaneous value at the
+    timestamp, which is not the hourly mean of the provider contract.
+
+    Attributes
+    ----------
+    base_url : str
+        Endpoint of the API, the historical weather archive (ARCHIVE_URL) by default.
+        The forecast endpoint (FORECAST_URL) serves the recent past and the coming days.
+    timeout : float
+        Timeout of a request in seconds.
+    instant : bool
+        Request the instantaneous irradiance (the *_instant variables).
+    """
+
+    columns = WEATHER_COLUMNS + IRRADIANCE_COLUMNS
+    ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+    FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+    # Open-Meteo variables and the columns they are returned as
+    VARIABLES = {
+        "temperature_2m": "temp",
+        "wind_speed_10m": "wspd",
+        "weather_code": "coco",
+        "shortwave_radiation": "ghi",
+        "diffuse_radiation": "dhi",
+        "direct_normal_irradiance": "dni",
+    }
+    INSTANT_VARIABLES = {
+        "temperature_2m": "temp",
+        "wind_speed_10m": "wspd",
+        "weather_code": "coco",
+        "shortwave_radiation_instant": "ghi",
+        "diffuse_radiation_instant": "dhi",
+        "direct_normal_irradiance_instant": "dni",
+    }
+
+    def __init__(self, base_url: str = None, session=None, timeout: float = 30., instant: bool = False):
+        self.base_url = self.ARCHIVE_URL if base_url is None else base_url
+        self.timeout = timeout
+        self.instant = instant
+        self.variables = self.INSTANT_VARIABLES if instant else self.VARIABLES
+        self._session = session
+        # one session per thread when fetching concurrently
+        self._local = threading.local()
+
+    def __repr__(self):
+        return f"OpenMeteoProvider(base_url={self.base_url!r}, instant={self.instant})"
+
+    def params(self, lat, lon, alt, start, end) -> dict:
+        """
+        Returns the query parameters of a request from start to end (naive UTC).
+        """
+        return {
+            "latitude": lat,
+            "longitude": lon,
+            "elevation": alt,
+            "start_date": start.strftime("%Y-%m-%d"),
+            "end_date": end.strftime("%Y-%m-%d"),
+            "hourly": ",".join(self.variables),
+            "timezone": "GMT",
+            "timeformat": "unixtime",
+            "wind_speed_unit": "kmh",
+        }
+
+    def fetch(self, lat, lon, alt, start, end):
+        session = self._session
+        if session is None:
+            session = getattr(self._local, "session", None)
+            if session is None:
+                import requests
+                session = self._local.session = requests.Session()
+        response = session.get(self.base_url,
+                               params=self.params(lat, lon, alt, start, end),
+                               timeout=self.timeout)
+        response.raise_for_status()
+        return self.parse(response.json())
+
+    def parse(self, payload: dict) -> pd.DataFrame:
+        """
+        Returns the hourly data of an Open-Meteo JSON response with unix times.
+        """
+        hourly = payload.get("hourly", {})
+        index = pd.to_datetime(np.asarray(hourly.get("time", []), dtype=np.int64), unit="s")
+        data = pd.DataFrame(
+            {
+                column: np.array([np.nan if value is None else value for value in hourly.get(variable, [])],
+                                 dtype=np.float64) if variable in hourly else np.full(len(index), np.nan)
+                for variable, column in self.variables.items()
+            },
+            index=pd.DatetimeIndex(index, name="time"))
+        codes = data["coco"].to_numpy()
+        data["coco"] = [WMO_TO_COCO.get(int(code), np.nan) if not np.isnan(code) else np.nan for code in codes]
+        return data
+
+
+class LocalFileProvider(WeatherProvider):
+    """
+    Hourly data from a directory of CSV or parquet files, one per site.
+
+    The files are named <lat>_<lon>.csv or <lat>_<lon>.parquet and have a "time"
+    column (or index) of UTC timestamps and the contract columns. A site gets the
+    data of the nearest file within max_distance_km. Reading parquet needs pyarrow.
+
+    Attributes
+    ----------
+    directory : str
+        Directory of the files.
+    max_distance_km : float
+        Largest distance between a site and its file.
+
+    Methods
+    -------
+    write(lat, lon, data, file_format)
+        Writes the data of a site to the directory.
+    """
+
+    def __init__(self, directory: str, max_distance_km: float = 25.):
+        self.directory = directory
+        self.max_distance_km = max_distance_km
+        self._files = None
+        self._data = {}
+
+    def __repr__(self):
+        return f"LocalFileProvider(directory={self.directory!r})"
+
+    def fetch(self, lat, lon, alt, start, end):
+        file = self._nearest_file(lat, lon)
+        if file not in self._data:
+            if file.endswith(".parquet"):
+                data = pd.read_parquet(file)
+            else:
+                data = pd.read_csv(file)
+            if "time" in data.columns:
+                data = data.set_index("time")
+            data.index = pd.to_datetime(data.index, utc=True)
+            self._data[file] = _to_utc(data).sort_index()
+        data = self._data[file]
+        return data[(data.index >= pd.Timestamp(start, tz="UTC")) & (data.index <= pd.Timestamp(end, tz="UTC"))]
+
+    def write(self, lat, lon, data, file_format: str = "csv") -> str:
+        """
+        Writes the hourly data of the site as <lat>_<lon>.<file_format> and returns the file.
+        """
+        if file_format not in ("csv", "parquet"):
+            raise ValueError('file_format must be "csv" or "parquet".')
+        os.makedirs(self.directory, exist_ok=True)
+        file = os.path.join(self.directory, f"{float(lat):.4f}_{float(lon):.4f}.{file_format}")
+        data = _to_utc(data).rename_axis("time")
+        if file_format == "parquet":
+            data.to_parquet(file)
+        else:
+            data.to_csv(file)
+        self._files = None
+        self._data.pop(file, None)
+        return file
+
+    def _nearest_file(self, lat, lon):
+        """
+        Returns the file nearest to the site.
+        """
+        if self._files is None:
+            self._files = []
+            for file in sorted(glob.glob(os.path.join(self.directory, "*"))):
+                name, extension = os.path.splitext(os.path.basename(file))
+                if extension not in (".csv", ".parquet"):
+                    continue
+                try:
+                    file_lat, file_lon = (float(value) for value in name.split("_"))
+                except ValueError:
+                    continue
+                self._files.append((file_lat, file_lon, file))
+        best = None
+        for file_lat, file_lon, file in self._files:
+            distance = _distance_km(lat, lon, file_lat, file_lon)
+            if distance <= self.max_distance_km and (best is None or distance < best[0]):
+                best = (distance, file)
+        if best is None:
+            raise ValueError(
+                f"No weather file within {self.max_distance_km} km of ({lat}, {lon}) in {self.directory}.")
+        return best[1]
+
+
+class StubProvider(WeatherProvider):
+    """
+    In-memory provider for offline runs and tests.
+
+    It serves the rows of the given hourly data, or constant values for every hour.
+    The requested sites and ranges are recorded in requests.
+
+    Attributes
+    ----------
+    data : pd.DataFrame
+        Hourly data with a UTC index, naive or tz-aware.
+    values : dict
+        Constant value of every column, used without data.
+    requests : list
+        (lat, lon, alt, start, end) of every fetch.
+    """
+
+    # clear sky, mild and calm by default
+    DEFAULT_VALUES = {"temp": 15., "wspd": 5., "coco": 1.}
+
+    def __init__(self, data: pd.DataFrame = None, **values):
+        self.data = None if data is None else _to_utc(data)
+        self.values = dict(self.DEFAULT_VALUES, **values)
+        self.columns = tuple(self.values) if data is None else tuple(self.data.columns)
+        self.requests = []
+
+    def fetch(self, lat, lon, alt, start, end):
+        self.requests.append((lat, lon, alt, start, end))
+        if self.data is not None:
+            return self.data[(self.data.index >= pd.Timestamp(start, tz="UTC"))
+                             & (self.data.index <= pd.Timestamp(end, tz="UTC"))]
+        index = pd.date_range(start, end, freq="1h", name="time")
+        return pd.DataFrame({column: np.full(len(index), value, dtype=np.float64)
+                             for column, value in self.values.items()},
+                            index=index)
+
+
+def _distance_km(lat1, lon1, lat2, lon2):
+    """
+    Returns the great-circle distance between two points in km.
+    """
+    lat1, lon1, lat2, lon2 = (math.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2)**2
+    return 2 * 6371. * math.asin(math.sqrt(min(1., a)))
@@ -0,0 +1,311 @@
+"""
+Module Docstring
+
+This module contains the WeatherStore class, a persistent local store of the
+hourly weather data of the simulated sites.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from consmodel.utils.weather_providers import HOUR_NS, MeteostatProvider, _hour_ns, _to_utc
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "consmodel", "weather")
+
+
+class WeatherStore:
+    """
+    Disk-backed store of hourly weather data, keyed by the rounded site coordinates.
+
+    Every site is kept in its own npz file with the fetched rows and the covered
+    time ranges. A request only fetches the hours of its range that are not covered
+    yet, merges them into the file and serves the rest from the store, so a site is
+    fetched once however many models simulate it. Only the hours the fetched data
+    spans are covered, so empty, partial or recent responses are fetched again. The
+    sites read in this process are also kept in memory. In offline mode nothing is
+    fetched and requests for uncovered hours raise a ValueError.
+
+    Attributes
+    ----------
+    path : str
+        Directory of the store.
+    precision : int
+        Decimals of the latitude and longitude in the site key.
+    alt_precision : int
+        Decimals of the altitude in the site key, negative to round to tens, hundreds, ...
+    offline : bool
+        Serve only from the store.
+    fetch : callable
+        fetch(lat, lon, alt, start, end) returns the hourly weather from start to end
+        (naive UTC timestamps, both included) as a DataFrame with a naive UTC index,
+        e.g. a WeatherProvider. Defaults to MeteostatProvider.
+    recent_hours : float
+        Hours before now that are served but never marked as covered, as the weather
+        services publish them late.
+
+    Methods
+    -------
+    get(lat, lon, alt, start, end, tz)
+        Weather data of the site from start to end.
+    site_key(lat, lon, alt)
+        Key of the site.
+    covered(lat, lon, alt)
+        Time ranges of the site in the store.
+    missing(lat, lon, alt, start, end, tz)
+        Time ranges of the site from start to end that are not in the store.
+    add(lat, lon, alt, ranges, frames)
+        Merges fetched data into the site.
+    clear(lat, lon, alt)
+        Removes a site or the whole store.
+    """
+
+    def __init__(self,
+                 path: str = None,
+                 precision: int = 2,
+                 alt_precision: int = -1,
+                 offline: bool = False,
+                 fetch=None,
+                 recent_hours: float = 72.):
+        if path is None:
+            path = os.environ.get("CONSMODEL_WEATHER_STORE", DEFAULT_PATH)
+        self.path = path
+        self.precision = precision
+        self.alt_precision = alt_precision
+        self.offline = offline
+        self.fetch = MeteostatProvider() if fetch is None else fetch
+        self.recent_hours = recent_hours
+        self._sites = {}
+
+    def __repr__(self):
+        mode = ", offline" if self.offline else ""
+        return f"WeatherStore(path={self.path!r}{mode})"
+
+    def site_key(self, lat, lon, alt):
+        """
+        Returns the rounded coordinates of the site and its key.
+        """
+        lat = round(float(lat), self.precision)
+        lon = round(float(lon), self.precision)
+        alt = round(float(alt), self.alt_precision)
+        # -0.0 and 0.0 are the same site
+        lat, lon, alt = lat + 0., lon + 0., alt + 0.
+        key = f"{lat:.{max(self.precision, 0)}f}_{lon:.{max(self.precision, 0)}f}_{alt:g}"
+        return (lat, lon, alt), key
+
+    def covered(self, lat, lon, alt):
+        """
+        Returns the time ranges of the site in the store as a list of (start, end) UTC timestamps.
+        """
+        _, key = self.site_key(lat, lon, alt)
+        _, covered = self._load(key)
+        return [(pd.Timestamp(start, tz="UTC"), pd.Timestamp(end, tz="UTC")) for start, end in covered]
+
+    def get(self, lat, lon, alt, start, end, tz=None) -> pd.DataFrame:
+        """
+        Returns the hourly weather data of the site from start to end, fetching the missing hours.
+
+        Args:
+        ----------
+            lat, lon, alt: float
+                Coordinates of the site, rounded to the site key
+            start, end: datetime
+                Range of the data, both included. Naive timestamps are in tz
+            tz: str
+                Time zone of the naive timestamps and of the returned index, UTC by default
+
+        Returns:
+        ----------
+            weather_data: pd.DataFrame
+                Hourly weather data with a tz-aware index
+        """
+        (lat, lon, alt), key = self.site_key(lat, lon, alt)
+        start_ns, end_ns = _hour_range(start, end, tz)
+        missing = self.missing(lat, lon, alt, start, end, tz)
+        if missing:
+            if self.offline:
+                raise ValueError(
+                    f"The weather data of the site {key} from {missing[0][0]} "
+                    "is not in the store and the store is offline.")
+            self.add(lat, lon, alt, missing,
+                     [self.fetch(lat, lon, alt, range_start.tz_localize(None), range_end.tz_localize(None))
+                      for range_start, range_end in missing])
+        data, _ = self._load(key)
+
+        weather_data = data[(data.index >= pd.Timestamp(start_ns, tz="UTC"))
+                            & (data.index <= pd.Timestamp(end_ns, tz="UTC"))]
+        if tz is not None:
+            weather_data = weather_data.tz_convert(tz)
+        return weather_data
+
+    def missing(self, lat, lon, alt, start, end, tz=None) -> list:
+        """
+        Returns the hourly ranges of the site from start to end that are not in the
+        store, as a list of (start, end) UTC timestamps, both included.
+        """
+        _, key = self.site_key(lat, lon, alt)
+        start_ns, end_ns = _hour_range(start, end, tz)
+        _, covered = self._load(key)
+        return [(pd.Timestamp(range_start, tz="UTC"), pd.Timestamp(range_end, tz="UTC"))
+                for range_start, range_end in _missing_ranges(covered, start_ns, end_ns)]
+
+    def add(self, lat, lon, alt, ranges, frames):
+        """
+        Merges the fetched hourly data of the ranges into the site and marks as covered
+        the part of every range its frame spans, from its first to its last row with
+        data. Empty frames cover nothing and the last recent_hours before now are never
+        covered, as the weather services publish them late, so those hours are fetched
+        again by the next request.
+
+        Args:
+        ----------
+            lat, lon, alt: float
+                Coordinates of the site
+            ranges: list
+                (start, end) timestamps of the fetched ranges, naive timestamps are UTC
+            frames: list of pd.DataFrame
+                Fetched data of every range with a UTC index, naive or tz-aware
+        """
+        _, key = self.site_key(lat, lon, alt)
+        data, covered = self._load(key)
+        settled_ns = _hour_ns(pd.Timestamp.now(tz="UTC") - pd.Timedelta(hours=self.recent_hours), None)
+        fetched = [data]
+        for (range_start, range_end), frame in zip(ranges, frames):
+            frame = _to_utc(frame)
+            fetched.append(frame)
+            range_start_ns = _hour_ns(range_start, None)
+            range_end_ns = min(_hour_ns(range_end, None), settled_ns)
+            epoch_ns = frame.index[frame.notna().any(axis=1)].as_unit("ns").asi8
+            epoch_ns = epoch_ns[(epoch_ns >= range_start_ns) & (epoch_ns <= range_end_ns)]
+            if len(epoch_ns) > 0:
+                covered = covered + [(int(epoch_ns.min()), int(epoch_ns.max()))]
+        fetched = [frame for frame in fetched if len(frame.columns) > 0 and len(frame) > 0]
+        if fetched:
+            data = pd.concat(fetched)
+            data = data[~data.index.duplicated(keep="last")].sort_index()
+        self._save(key, data, _merge_ranges(covered))
+
+    def clear(self, lat=None, lon=None, alt=None):
+        """
+        Removes the site from the store, or all sites without coordinates.
+        """
+        if lat is None:
+            keys = [name[:-4] for name in os.listdir(self.path) if name.endswith(".npz")] \
+                if os.path.isdir(self.path) else []
+        else:
+            keys = [self.site_key(lat, lon, alt)[1]]
+        for key in keys:
+            self._sites.pop(key, None)
+            if os.path.exists(self._file(key)):
+                os.remove(self._file(key))
+
+    def _file(self, key):
+        return os.path.join(self.path, f"{key}.npz")
+
+    def _load(self, key):
+        """
+        Returns the data and the covered ranges of the site, from memory or from its file.
+        """
+        if key not in self._sites:
+            file = self._file(key)
+            if os.path.exists(file):
+                with np.load(file, allow_pickle=False) as npz:
+                    data = pd.DataFrame(npz["values"],
+                                        columns=list(npz["columns"]),
+                                        index=pd.DatetimeIndex(npz["epoch_ns"].view("datetime64[ns]"),
+                                                               name="time").tz_localize("UTC"))
+                    covered = [tuple(int(value) for value in row) for row in npz["covered"]]
+            else:
+                data = pd.DataFrame(index=pd.DatetimeIndex([], name="time", tz="UTC"))
+                covered = []
+            self._sites[key] = (data, covered)
+        return self._sites[key]
+
+    def _save(self, key, data, covered):
+        """
+        Writes the site to its file, replacing the old one only when the new one is complete.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        file = self._file(key)
+        # a temp file of its own for every save, also of threads of the same process
+        descriptor, temp = tempfile.mkstemp(dir=self.path, prefix=f"{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as temp_file:
+                np.savez(temp_file,
+                         epoch_ns=data.index.tz_convert("UTC").tz_localize(None).values.astype("datetime64[ns]").view(np.int64),
+                         values=data.to_numpy(dtype=np.float64),
+                         columns=np.array(data.columns, dtype=str),
+                         covered=np.array(covered, dtype=np.int64).reshape(-1, 2))
+            os.replace(temp, file)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        self._sites[key] = (data, covered)
+
+
+def _hour_range(start, end, tz):
+    """
+    Returns the UTC nanoseconds of the hours around start and end.
+    """
+    start_ns = _hour_ns(start, tz)
+    end_ns = _hour_ns(end, tz, up=True)
+    if end_ns < start_ns:
+        raise ValueError("Start must be before end.")
+    return start_ns, end_ns
+
+
+def _merge_ranges(ranges):
+    """
+    Merges overlapping and adjacent hourly ranges.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + HOUR_NS:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _missing_ranges(covered, start, end):
+    """
+    Returns the hourly ranges from start to end that are not covered.
+    """
+    missing = []
+    for covered_start, covered_end in _merge_ranges(covered):
+        if covered_end < start:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > start:
+            missing.append((start, covered_start - HOUR_NS))
+        start = covered_end + HOUR_NS
+        if start > end:
+            return missing
+    missing.append((start, end))
+    return missing
+
+
+_default_store = None
+
+
+def get_weather_store() -> WeatherStore:
+    """
+    Returns the weather store used by the models, created on first use. Setting the
+    environment variable CONSMODEL_WEATHER_OFFLINE to 1 creates it offline.
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = WeatherStore(offline=os.environ.get("CONSMODEL_WEATHER_OFFLINE", "0") == "1")
+    return _default_store
+
+
+def set_weather_store(store: WeatherStore):
+    """
+    Sets the weather store used by the models, None to go back to the default one.
+    """
+    global _default_store
+    _default_store = store
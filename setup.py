@@ -23,7 +23,7 @@ setuptools.setup(
     ],
     packages=setuptools.find_packages(),
     install_requires=[
-        'setuptools>=42', 'retry_requests>=2.0.0', 'openmeteo_requests>=1.1.0',
+        'setuptools>=42', 'retry_requests>=2.0.0', 'requests>=2.28.0',
         'requests_cache>=1.1.0', 'pvlib>=0.9.1', 'pandas>=1.5.2',
         'numpy>=1.22.4', 'tzfpy>=0.15.1', 'meteostat>=1.6.5', 'scipy>=1.10.0',
         'hplib==1.9', 'numba>=0.54.0'
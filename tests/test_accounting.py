@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+import pandas as pd
+from consmodel.bs_sim import BS, mt_vt_amount
+from consmodel.utils import tariff_accounting, tariff_energy
+
+
+class TestAccounting(unittest.TestCase):
+
+    def test_tariff_energy(self):
+        # the intervals end at 06:00 (MT), 06:15 (VT), 22:00 (VT) and 22:15 (MT)
+        index = pd.DatetimeIndex([
+            "2024-01-03 06:00:00", "2024-01-03 06:15:00",
+            "2024-01-03 22:00:00", "2024-01-03 22:15:00"
+        ])
+        energy = tariff_energy([4., 8., -2., 12.], index)
+        self.assertEqual(energy.values.tolist(), [[4., 2., 0.5]])
+
+    def test_many_profiles(self):
+        index = pd.date_range("2024-01-01 00:15:00",
+                              periods=96 * 3,
+                              freq="15min")
+        rng = np.random.default_rng(0)
+        p_before = rng.uniform(-3., 5., (4, len(index)))
+        p_after = rng.uniform(-3., 5., (4, len(index)))
+        accounting = tariff_accounting(p_before, p_after, index)
+        self.assertEqual(len(accounting), 4)
+        for row in range(4):
+            single = tariff_accounting(p_before[row], p_after[row], index)
+            np.testing.assert_allclose(accounting.iloc[row].values,
+                                       single.iloc[0].values)
+        imported = np.clip(p_before[0], 0., None).sum() * 0.25
+        self.assertAlmostEqual(
+            accounting["e_mt_before"][0] + accounting["e_vt_before"][0],
+            imported)
+        self.assertAlmostEqual(
+            accounting["savings"][0],
+            accounting["cost_before"][0] - accounting["cost_after"][0])
+        with self.assertRaises(ValueError):
+            tariff_accounting(p_before, p_after[:2], index)
+
+    def test_mt_vt_amount(self):
+        index = pd.date_range("2024-01-01 00:15:00",
+                              periods=96,
+                              freq="15min")
+        p_kw = pd.DataFrame({"p": np.full(96, 2.)}, index=index)
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        batt.simulate(p_kw=p_kw, control_type="MT_VT_shifting")
+        frame = batt.results.to_frame()
+        columns = list(frame.columns)
+        amounts = mt_vt_amount(frame)
+        self.assertEqual(list(frame.columns), columns)
+        self.assertGreater(amounts["savings"][0], 0.)
+        pd.testing.assert_frame_equal(amounts, mt_vt_amount(batt.results))
+
+
+    def test_hourly_index(self):
+        index = pd.date_range("2024-01-01 01:00:00", periods=24, freq="1h")
+        energy = tariff_energy(np.ones(24), index)
+        # VT from 6:00 to 22:00, one kWh per hour
+        self.assertEqual(energy.values.tolist(), [[8., 16., 0.]])
+        self.assertEqual(tariff_energy(np.ones(24), index.hour, dt=1.).values.tolist(), [[8., 16., 0.]])
+        with self.assertRaises(ValueError):
+            tariff_energy(np.ones(24), index.hour)
+
+        p_kw = pd.DataFrame({"p": np.full(24, 2.)}, index=index)
+        batt = BS(lat=46.155768, lon=14.304951, alt=400, st_type="10kWh_5kW", freq="60min")
+        batt.simulate(p_kw=p_kw, control_type="MT_VT_shifting")
+        amounts = mt_vt_amount(batt.results, batt.dt)
+        self.assertAlmostEqual(amounts["e_mt_before"][0] + amounts["e_vt_before"][0], 48.)
+        pd.testing.assert_frame_equal(amounts, mt_vt_amount(batt.results))
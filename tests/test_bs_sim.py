@@ -1,6 +1,15 @@
+import itertools
 import unittest
+import numpy as np
 import pandas as pd
-from consmodel.bs_sim import BS
+from scipy import optimize
+from consmodel.bs_sim import (BATCH_KERNEL_SIGNATURES, BS, CONTROL_STRATEGIES,
+                              KERNEL_SIGNATURES,
+                              jit_bisect_min_p_limit,
+                              jit_optimal_cost_dispatch,
+                              jit_strategy_MT_VT_shift,
+                              jit_strategy_production_saving,
+                              register_strategy, warmup)
 
 
 class TestBS(unittest.TestCase):
@@ -94,3 +103,574 @@ class TestBS(unittest.TestCase):
         ]
         self.assertEqual(timeseries.values.tolist(), p_after_result)
         self.assertEqual(batt.results["var_bat"].tolist(), var_bat_result)
+
+    def test_simulate_many_matches_simulate(self):
+        batt = BS(
+            lat=46.155768,
+            lon=14.304951,
+            alt=400,
+            index=1,
+            st_type="10kWh_5kW",
+            freq="15min",
+        )
+        index = pd.date_range("2020-01-01 00:15:00", periods=96, freq="15min")
+        profiles = pd.DataFrame(
+            {
+                "a": [(i % 17) - 5. for i in range(96)],
+                "b": [(i % 11) * 0.8 - 3. for i in range(96)],
+            },
+            index=index)
+        for control_type in [
+                "production_saving", "combined_production_vt",
+                "installed_power", "MT_VT_shifting", "5Tariff_manoeuvering"
+        ]:
+            batch = batt.simulate_many(profiles, control_type=control_type)
+            for row, column in enumerate(profiles.columns):
+                timeseries = batt.simulate(
+                    control_type=control_type,
+                    p_kw=pd.DataFrame({"p": profiles[column]}))
+                self.assertEqual(batch["p_after"][row].tolist(),
+                                 timeseries.values.tolist())
+                self.assertEqual(batch["var_bat"][row].tolist(),
+                                 batt.results["var_bat"].tolist())
+
+    def test_min_p_lim_is_tight(self):
+        batt = BS(
+            lat=46.155768,
+            lon=14.304951,
+            alt=400,
+            index=1,
+            st_type="10kWh_5kW",
+            freq="15min",
+        )
+        p_kw = pd.DataFrame(
+            {"p": [((i * 7) % 23) * 0.5 - 2. for i in range(200)]},
+            index=pd.date_range("2020-01-01 00:15:00",
+                                periods=200,
+                                freq="15min"))
+        batt.simulate(control_type="installed_power", p_kw=p_kw)
+        p_limit = batt.curr_limit
+        batt.hard_reset()
+        self.assertEqual(batt.is_p_limit_possible(p_limit), 1)
+        self.assertEqual(batt.is_p_limit_possible(p_limit - 1e-6), -1)
+
+    def test_find_p_limits_matches_python_search(self):
+        batt = BS(
+            lat=46.155768,
+            lon=14.304951,
+            alt=400,
+            index=1,
+            st_type="10kWh_5kW",
+            freq="15min",
+        )
+        n = 96 * 7
+        batt.results = pd.DataFrame(
+            {
+                "p": [((i * 7) % 23) * 0.4 - 1. for i in range(n)],
+                "block": [1 + (i // 8) % 5 for i in range(n)],
+            },
+            index=pd.date_range("2020-01-01 00:15:00",
+                                periods=n,
+                                freq="15min"))
+        p_limits, p_limits_orig = batt.get_max_p_limits()
+        for block in range(1, 6):
+            p_limits_min = p_limits.copy()
+            p_limits_min[block - 1] = p_limits[block - 2]
+            if block > 1 and batt.are_p_limits_posible(p_limits_min) == 1:
+                p_limits[block - 1] = p_limits[block - 2]
+            else:
+                p_limits[block - 1] = round(
+                    batt.find_block_p_limit(p_limits, block, p_limits_orig) +
+                    0.1, 1)
+        self.assertEqual(batt.find_p_limits(), p_limits)
+
+    def test_monthly_block_power_reduction_limits(self):
+        batt = BS(
+            lat=46.155768,
+            lon=14.304951,
+            alt=400,
+            index=1,
+            st_type="10kWh_5kW",
+            freq="15min",
+        )
+        n = 96 * 62
+        p_kw = pd.DataFrame(
+            {"p": [((i * 7) % 23) * 0.4 - 1. for i in range(n)]},
+            index=pd.date_range("2021-01-01 00:15:00",
+                                periods=n,
+                                freq="15min"))
+        batt.simulate(control_type="monthly_block_power_reduction",
+                      p_kw=p_kw)
+        self.assertEqual(sorted(batt.monthly_p_limits), [(2021, 1),
+                                                         (2021, 2),
+                                                         (2021, 3)])
+        results = batt.results.to_frame()
+        february = results[(results.index > "2021-02-01") &
+                           (results.index <= "2021-03-01")]
+        self.assertEqual(batt.find_p_limits(month_df=february),
+                         batt.monthly_p_limits[(2021, 2)])
+        self.assertEqual(february["p_limit"].iloc[0],
+                         batt.monthly_p_limits[(2021, 2)][february["block"].iloc[0] - 1])
+
+    def test_frequency(self):
+        hourly = [0., -3., -2., 8., 7., 6., 7., 8., 3., 5., 4., -2., 0., 2.]
+        index = pd.date_range("2020-01-01 06:00:00", periods=len(hourly), freq="60min")
+        for control_type in ["production_saving", "MT_VT_shifting"]:
+            batt_60 = BS(lat=46.155768,
+                         lon=14.304951,
+                         alt=400,
+                         st_type="10kWh_5kW",
+                         freq="60min")
+            batt_60.simulate(control_type=control_type,
+                             p_kw=pd.DataFrame({"p": hourly}, index=index))
+            batt_15 = BS(lat=46.155768,
+                         lon=14.304951,
+                         alt=400,
+                         st_type="10kWh_5kW",
+                         freq="15min")
+            batt_15.simulate(control_type=control_type,
+                             p_kw=pd.DataFrame(
+                                 {"p": [p for p in hourly for _ in range(4)]},
+                                 index=pd.date_range("2020-01-01 05:15:00",
+                                                     periods=4 * len(hourly),
+                                                     freq="15min")))
+            self.assertEqual(
+                [round(e, 9) for e in batt_60.results["var_bat"]],
+                [round(e, 9) for e in batt_15.results["var_bat"][3::4]])
+
+    def test_warmup(self):
+        timings = warmup("MT_VT_shifting")
+        self.assertEqual(list(timings), ["jit_strategy_MT_VT_shift"])
+        n_signatures = len(jit_strategy_MT_VT_shift.signatures)
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="20kWh_5kW",
+                  freq="15min")
+        batt.simulate(control_type="MT_VT_shifting",
+                      p_kw=pd.DataFrame(
+                          {"p": [1.] * 96},
+                          index=pd.date_range("2020-01-01 00:15:00",
+                                              periods=96,
+                                              freq="15min")))
+        self.assertEqual(len(jit_strategy_MT_VT_shift.signatures),
+                         n_signatures)
+        with self.assertRaises(ValueError):
+            warmup("unknown")
+
+    def test_warmup_batched(self):
+        warmup(list(BATCH_KERNEL_SIGNATURES), batched=True)
+        kernels = {kernel for signatures in BATCH_KERNEL_SIGNATURES.values()
+                   for kernel, _ in signatures}
+        n_signatures = {kernel: len(kernel.signatures) for kernel in kernels}
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        # the values of a DataFrame are read-only under copy on write
+        profiles = pd.DataFrame({"a": [1.] * 96, "b": [-2.] * 96},
+                                index=pd.date_range("2020-01-01 00:15:00",
+                                                    periods=96,
+                                                    freq="15min"))
+        for control_type in BATCH_KERNEL_SIGNATURES:
+            batt.simulate_many(profiles, control_type=control_type)
+        self.assertEqual({kernel: len(kernel.signatures) for kernel in kernels},
+                         n_signatures)
+
+    def test_step_chunk_matches_simulate(self):
+        index = pd.date_range("2023-01-25 00:15:00",
+                              periods=96 * 14,
+                              freq="15min",
+                              name="date_time")
+        rng = np.random.default_rng(3)
+        p = rng.uniform(-4., 8., len(index))
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        for control_type in ("production_saving", "combined_production_vt",
+                             "installed_power", "block_power_reduction",
+                             "monthly_block_power_reduction",
+                             "MT_VT_shifting", "5Tariff_manoeuvering"):
+            with self.subTest(control_type=control_type):
+                full = batt.simulate(p_kw=pd.DataFrame({"p": p}, index=index),
+                                     control_type=control_type)
+                batt.hard_reset()
+                chunks = [
+                    batt.step_chunk(p[start:stop], index[start:stop],
+                                    control_type)
+                    for start, stop in ((0, 1), (1, 500), (500, 1000),
+                                        (1000, len(index)))
+                ]
+                chunked = pd.concat([chunk.to_frame() for chunk in chunks])
+                self.assertEqual(full.values.tolist(),
+                                 chunked["p_after"].values.tolist())
+                self.assertEqual(batt.results["var_bat"].values.tolist(),
+                                 chunked["var_bat"].values.tolist())
+
+    def test_step_chunk_needs_monthly_limits(self):
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        index = pd.date_range("2023-01-01 00:15:00", periods=4, freq="15min")
+        with self.assertRaises(ValueError):
+            batt.step_chunk([1., 2., 3., 4.], index,
+                            "monthly_block_power_reduction")
+
+    def test_step_chunk_rejects_whole_series_strategies(self):
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        index = pd.date_range("2023-01-01 00:15:00", periods=4, freq="15min")
+        for control_type in ("price_threshold", "optimal_cost", "receding_horizon"):
+            with self.subTest(control_type=control_type):
+                with self.assertRaisesRegex(ValueError, "can not be simulated in chunks"):
+                    batt.step_chunk([1., 2., 3., 4.], index, control_type)
+        self.assertEqual(batt.current_e_kwh, 10.)
+
+    def test_optimal_cost_dispatch_is_optimal(self):
+        rng = np.random.default_rng(0)
+        n = 6
+        dt = 0.25
+        p = rng.uniform(-3., 5., n)
+        price = rng.uniform(0.1, 0.3, n)
+        export_price = np.full(n, 0.05)
+        power_price = np.full(n, 0.5)
+        p_cap = np.full(n, 2.)
+        _, _, _, cost = jit_optimal_cost_dispatch(p, price, export_price,
+                                                  power_price, p_cap, dt, 4.,
+                                                  4., 4., 4., 5)
+        # every sequence of moves by one level, starting from a full battery
+        best = np.inf
+        for moves in itertools.product((-1, 0, 1), repeat=n):
+            level = 4 + np.cumsum(moves)
+            if level.min() < 0 or level.max() > 4:
+                continue
+            p_after = p + np.array(moves) / dt
+            step_cost = np.where(p_after > 0, price, export_price) * p_after
+            step_cost += power_price * np.maximum(p_after - p_cap, 0.)
+            best = min(best, step_cost.sum() * dt)
+        self.assertAlmostEqual(cost, best)
+
+    def test_optimal_cost_dispatch_starts_at_init_e(self):
+        rng = np.random.default_rng(2)
+        n = 96
+        dt = 0.25
+        p = rng.uniform(-3., 5., n)
+        price = rng.uniform(0.1, 0.3, n)
+        zeros = np.zeros(n)
+        battery_plus, battery_minus, energy_state, _ = jit_optimal_cost_dispatch(
+            p, price, zeros, zeros, np.full(n, 2.), dt, 3.3, 10., 5., 5., 51)
+        # every kWh of the energy states is charged or discharged
+        np.testing.assert_allclose(
+            3.3 + np.cumsum((battery_minus - battery_plus) * dt), energy_state)
+        self.assertTrue((energy_state >= 0.).all() and (energy_state <= 10.).all())
+
+    def test_optimal_cost(self):
+        index = pd.date_range("2023-01-02 00:15:00",
+                              periods=96 * 7,
+                              freq="15min")
+        rng = np.random.default_rng(1)
+        p_kw = pd.DataFrame({"p": rng.uniform(0., 4., len(index))},
+                            index=index)
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        price = np.where((index - pd.Timedelta("1min")).hour.isin(range(6, 22)),
+                         0.2, 0.1)
+        timeseries = batt.simulate(p_kw=p_kw.copy(),
+                                   control_type="optimal_cost",
+                                   control_params={"price": price})
+        var_bat = batt.results["var_bat"]
+        self.assertTrue((var_bat >= 0.).all() and (var_bat <= 10.).all())
+        self.assertTrue((batt.results["battery_plus"] <= 5.).all())
+        cost = (price * timeseries.clip(lower=0.)).sum()
+        mt_vt = batt.simulate(p_kw=p_kw.copy(), control_type="MT_VT_shifting")
+        self.assertLess(cost, (price * mt_vt.clip(lower=0.)).sum())
+        self.assertLess(cost, (price * p_kw["p"]).sum())
+        with self.assertRaises(ValueError):
+            batt.simulate(p_kw=p_kw.copy(), control_type="optimal_cost")
+        with self.assertRaises(ValueError):
+            batt.simulate(p_kw=p_kw.copy(), control_type="optimal_cost",
+                          control_params={"price": price, "n_soc_levels": 40000})
+
+    def test_sweep_matches_simulate(self):
+        index = pd.date_range("2023-01-20 00:15:00",
+                              periods=96 * 21,
+                              freq="15min",
+                              name="date_time")
+        rng = np.random.default_rng(5)
+        p_kw = pd.DataFrame({"p": rng.uniform(-3., 7., len(index))},
+                            index=index)
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        capacities = [5., 10.]
+        powers = [2., 5.]
+        for control_type in ("production_saving", "installed_power",
+                             "monthly_block_power_reduction",
+                             "MT_VT_shifting"):
+            with self.subTest(control_type=control_type):
+                kpis = batt.sweep(p_kw, capacities, powers, control_type)
+                self.assertEqual(len(kpis), 4)
+                for max_e in capacities:
+                    for power in powers:
+                        batt.change_battery(max_e, power)
+                        p_after = batt.simulate(p_kw=p_kw.copy(),
+                                                control_type=control_type)
+                        energy = batt.results["battery_plus"].sum() * 0.25
+                        np.testing.assert_allclose(
+                            kpis.loc[(max_e, power)].values,
+                            [p_kw["p"].max() - p_after.max(), energy,
+                             energy / max_e])
+
+    def test_results_leave_input_unchanged(self):
+        p_kw = pd.DataFrame({"p": [1., -2., 3., 4.]},
+                            index=pd.date_range("2020-01-01 00:15:00",
+                                                periods=4,
+                                                freq="15min"))
+        original = p_kw.copy()
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        results = batt.model(control_type="block_power_reduction", p_kw=p_kw)
+        pd.testing.assert_frame_equal(p_kw, original)
+        self.assertEqual(results.columns, [
+            "p", "battery_plus", "battery_minus", "block", "p_limit",
+            "p_after", "var_bat"
+        ])
+        frame = results.to_frame()
+        self.assertEqual(list(frame.columns), results.columns)
+        np.testing.assert_array_equal(
+            frame["p_after"].values,
+            frame["p"] - frame["battery_plus"] - frame["battery_minus"])
+        self.assertFalse(hasattr(results, "__dict__"))
+
+    def test_strategy_kpis(self):
+        index = pd.date_range("2023-03-01 00:15:00",
+                              periods=96 * 7,
+                              freq="15min")
+        rng = np.random.default_rng(2)
+        p_kw = pd.DataFrame({"p": rng.uniform(-4., 6., len(index))},
+                            index=index)
+        price = rng.uniform(0.05, 0.2, len(index))
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        for control_type in CONTROL_STRATEGIES:
+            with self.subTest(control_type=control_type):
+                batt.simulate(p_kw=p_kw,
+                              control_type=control_type,
+                              control_params={"price": price})
+                results = batt.results
+                kpis = results.kpis
+                self.assertEqual(kpis["peak"], results.p_after.max())
+                self.assertAlmostEqual(
+                    kpis["throughput"],
+                    (results.battery_plus - results.battery_minus).sum() * 0.25)
+                self.assertAlmostEqual(
+                    kpis["cycles"], results.battery_plus.sum() * 0.25 / 10.)
+
+    def test_register_strategy(self):
+        register_strategy("test_strategy", jit_strategy_production_saving)
+        try:
+            p_kw = pd.DataFrame({"p": [1., -2., 3., 4.]},
+                                index=pd.date_range("2020-01-01 00:15:00",
+                                                    periods=4,
+                                                    freq="15min"))
+            batt = BS(lat=46.155768,
+                      lon=14.304951,
+                      alt=400,
+                      st_type="10kWh_5kW",
+                      freq="15min")
+            self.assertEqual(
+                batt.simulate(p_kw=p_kw, control_type="test_strategy").tolist(),
+                batt.simulate(p_kw=p_kw,
+                              control_type="production_saving").tolist())
+        finally:
+            del CONTROL_STRATEGIES["test_strategy"]
+            del KERNEL_SIGNATURES["test_strategy"]
+
+    def test_find_block_p_limit_matches_scipy(self):
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        n = 96 * 7
+        batt.results = pd.DataFrame(
+            {
+                "p": [((i * 7) % 23) * 0.4 - 1. for i in range(n)],
+                "block": [1 + (i // 8) % 5 for i in range(n)],
+            },
+            index=pd.date_range("2020-01-01 00:15:00",
+                                periods=n,
+                                freq="15min"))
+        p_limits, p_limits_orig = batt.get_max_p_limits()
+        for block, max_soc in ((1, 0.95), (3, 1.)):
+            function = lambda x: batt.are_p_limits_posible(
+                [x if i == block - 1 else p_limits[i] for i in range(5)],
+                max_soc=max_soc)
+            root = optimize.bisect(function,
+                                   p_limits_orig[block - 1] - 5. - 1,
+                                   p_limits[block - 1],
+                                   xtol=0.05)
+            self.assertEqual(
+                batt.find_block_p_limit(p_limits, block, p_limits_orig), root)
+
+    def test_bisect_min_p_limit(self):
+        p_array = np.array([((i * 7) % 23) * 0.5 - 2. for i in range(200)])
+        p_limit, iterations, final_e = jit_bisect_min_p_limit(
+            p_array, 10., 10., 5., 5., 0.25)
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        batt.simulate(control_type="installed_power",
+                      p_kw=pd.DataFrame({"p": p_array},
+                                        index=pd.date_range(
+                                            "2020-01-01 00:15:00",
+                                            periods=200,
+                                            freq="15min")))
+        self.assertEqual(p_limit, batt.curr_limit)
+        self.assertGreater(iterations, 0)
+        self.assertLess(iterations, 100)
+        self.assertAlmostEqual(final_e, batt.results.var_bat[-1])
+
+    def test_receding_horizon(self):
+        index = pd.date_range("2023-03-01 00:15:00",
+                              periods=96 * 5,
+                              freq="15min")
+        rng = np.random.default_rng(4)
+        p_kw = pd.DataFrame({"p": rng.uniform(-2., 6., len(index))},
+                            index=index)
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        batt.simulate(p_kw=p_kw, control_type="installed_power")
+        installed = batt.results.kpis["peak"]
+        # a perfect forecast planned once over the whole period
+        batt.simulate(p_kw=p_kw,
+                      control_type="receding_horizon",
+                      control_params={"forecast": p_kw["p"].values,
+                                      "horizon": len(index),
+                                      "replan": len(index),
+                                      "tol": 1e-6})
+        self.assertAlmostEqual(batt.results.kpis["peak"], installed, places=4)
+        # the persistence forecast of the day before
+        batt.simulate(p_kw=p_kw, control_type="receding_horizon")
+        var_bat = batt.results.var_bat
+        self.assertTrue((var_bat >= -1e-9).all())
+        self.assertTrue((var_bat <= 10. + 1e-9).all())
+        self.assertLessEqual(batt.results.kpis["peak"], p_kw["p"].max())
+        with self.assertRaises(ValueError):
+            batt.simulate(p_kw=p_kw,
+                          control_type="receding_horizon",
+                          control_params={"forecast": np.zeros(10)})
+
+    def test_ensemble(self):
+        index = pd.date_range("2023-01-20 00:15:00",
+                              periods=96 * 14,
+                              freq="15min")
+        rng = np.random.default_rng(6)
+        pv = -4. * np.clip(np.sin(((np.arange(len(index)) % 96) / 4. - 6.) / 13. * np.pi), 0., None)
+        p_kw = pd.DataFrame({"p": rng.uniform(0., 6., len(index)) + pv},
+                            index=index)
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        for control_type in ("production_saving", "installed_power",
+                             "monthly_block_power_reduction"):
+            with self.subTest(control_type=control_type):
+                # without perturbations every scenario is the profile itself
+                kpis = batt.ensemble(p_kw, control_type, n_scenarios=3)["kpis"]
+                batt.simulate(p_kw=p_kw, control_type=control_type)
+                results = batt.results
+                np.testing.assert_allclose(
+                    kpis.values,
+                    np.tile([p_kw["p"].max(), results.kpis["peak"],
+                             p_kw["p"].max() - results.kpis["peak"],
+                             results.kpis["throughput"], results.kpis["cycles"],
+                             results.var_bat[-1] / 10.], (3, 1)))
+
+        perturbations = {"noise_std": 0.5, "max_shift": 8, "pv_kw": pv, "pv_scale_std": 0.3}
+        ensemble = batt.ensemble(p_kw, "installed_power", n_scenarios=20, seed=1, **perturbations)
+        kpis = ensemble["kpis"]
+        self.assertEqual(len(kpis), 20)
+        self.assertGreater(kpis["peak_before"].std(), 0.)
+        self.assertEqual(ensemble["soc_histogram"].sum(), 20)
+        self.assertEqual(list(ensemble["quantiles"].index), [0.05, 0.25, 0.5, 0.75, 0.95])
+        # the scenarios are reproducible and do not depend on their number
+        again = batt.ensemble(p_kw, "installed_power", n_scenarios=10, seed=1, **perturbations)["kpis"]
+        pd.testing.assert_frame_equal(kpis.iloc[:10], again)
+        other = batt.ensemble(p_kw, "installed_power", n_scenarios=10, seed=2, **perturbations)["kpis"]
+        self.assertFalse(np.allclose(kpis["peak_before"].values[:10], other["peak_before"].values))
+
+    def test_price_threshold(self):
+        index = pd.date_range("2023-03-01 00:15:00",
+                              periods=96 * 7,
+                              freq="15min")
+        rng = np.random.default_rng(7)
+        p_kw = pd.DataFrame({"p": rng.uniform(-2., 6., len(index))},
+                            index=index)
+        price = rng.uniform(0.05, 0.25, len(index))
+        batt = BS(lat=46.155768,
+                  lon=14.304951,
+                  alt=400,
+                  st_type="10kWh_5kW",
+                  freq="15min")
+        batt.simulate(p_kw=p_kw,
+                      control_type="price_threshold",
+                      control_params={"price": price})
+        results = batt.results
+        low, high = np.percentile(price, [25, 75])
+        self.assertTrue((results.battery_minus[price > low] == 0).all())
+        self.assertTrue((results.battery_plus[price < high] == 0).all())
+        self.assertTrue((results.battery_minus[price <= low] < 0).any())
+        # without export the battery only discharges into the consumption
+        self.assertTrue((results.battery_plus <= np.maximum(p_kw["p"].values, 0.) + 1e-12).all())
+        with self.assertRaises(ValueError):
+            batt.simulate(p_kw=p_kw, control_type="price_threshold")
+
+        sweep = batt.price_threshold_sweep(np.vstack([p_kw["p"].values, 2. * p_kw["p"].values]),
+                                           price,
+                                           low_percentiles=[10, 25],
+                                           high_percentiles=[75, 90],
+                                           export_price=0.04)
+        self.assertEqual(len(sweep), 8)
+        for consumer, scale in ((0, 1.), (1, 2.)):
+            p_scaled = pd.DataFrame({"p": scale * p_kw["p"].values}, index=index)
+            for low_percentile, high_percentile in itertools.product([10, 25], [75, 90]):
+                with self.subTest(consumer=consumer, low=low_percentile, high=high_percentile):
+                    batt.simulate(p_kw=p_scaled,
+                                  control_type="price_threshold",
+                                  control_params={"price": price,
+                                                  "low_percentile": low_percentile,
+                                                  "high_percentile": high_percentile})
+                    p_after = batt.results.p_after
+                    cost = (np.where(p_after > 0, price, 0.04) * p_after).sum() * 0.25
+                    cost_before = (np.where(p_scaled["p"] > 0, price, 0.04) * p_scaled["p"]).sum() * 0.25
+                    kpis = batt.results.kpis
+                    np.testing.assert_allclose(
+                        sweep.loc[(consumer, low_percentile, high_percentile),
+                                  ["cost", "savings", "peak", "throughput", "cycles"]].values.astype(float),
+                        [cost, cost_before - cost, kpis["peak"], kpis["throughput"], kpis["cycles"]])
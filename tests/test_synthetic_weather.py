@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+import pandas as pd
+from consmodel.hp_sim import HP
+from consmodel.utils.synthetic_weather import SyntheticWeatherProvider, typical_year
+
+
+class TestSyntheticWeather(unittest.TestCase):
+
+    def test_typical_year(self):
+        weather = typical_year([46.05, 46.05, -33.9], [14.5, 14.5, 18.4], [300., 1800., 0.], seed=3)
+        self.assertEqual(weather.shape, (3, 8760, 3))
+        # the same site alone or in a batch, with the same seed
+        np.testing.assert_array_equal(typical_year(46.05, 14.5, 300., seed=3)[0], weather[0])
+        self.assertFalse(np.array_equal(typical_year(46.05, 14.5, 300., seed=4)[0], weather[0]))
+
+        january = slice(0, 31 * 24)
+        july = slice(181 * 24, 212 * 24)
+        temp = weather[..., 0]
+        self.assertLess(temp[0, january].mean(), temp[0, july].mean() - 10.)
+        self.assertGreater(temp[2, january].mean(), temp[2, july].mean() + 5.)
+        # the lapse rate cools the mountain site
+        self.assertAlmostEqual((temp[0] - temp[1]).mean(), 1500 * 0.0065, delta=1.)
+        self.assertTrue((weather[..., 1] > 0.).all())
+        self.assertTrue(set(np.unique(weather[..., 2])) <= {1., 2., 3., 4., 7., 14.})
+
+    def test_provider(self):
+        provider = SyntheticWeatherProvider(seed=1)
+        provider.prepare([46.05, 45.55], [14.5, 13.73], [300., 0.])
+        data = provider.get(46.05, 14.5, 300, "2024-02-28 00:00", "2024-03-01 23:00")
+        self.assertEqual(list(data.columns), ["temp", "wspd", "coco"])
+        # February 29 repeats February 28 and every year gets the typical year
+        feb28 = data.loc["2024-02-28 01:00":"2024-02-29 00:00"].to_numpy()
+        np.testing.assert_array_equal(data.loc["2024-02-29 01:00":"2024-03-01 00:00"].to_numpy(), feb28)
+        np.testing.assert_array_equal(
+            provider.get(46.05, 14.5, 300, "2023-02-28 01:00", "2023-03-01 00:00").to_numpy(), feb28)
+
+        hp = HP(lat=46.05, lon=14.5, alt=300, tz="Europe/Ljubljana", weather_store=provider)
+        p = hp.simulate(wanted_temp=35., start=pd.Timestamp("2022-01-01 00:15"), end=pd.Timestamp("2022-01-08 00:00"))
+        self.assertEqual(len(p), 7 * 96)
+        self.assertTrue((p > 0.).all())
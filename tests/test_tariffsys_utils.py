@@ -0,0 +1,39 @@
+import unittest
+import numpy as np
+import pandas as pd
+from consmodel.utils import individual_tariff_blocks, individual_tariff_times
+
+
+class TestTariffSysUtils(unittest.TestCase):
+
+    def test_blocks(self):
+        dates = pd.to_datetime([
+            "2024-01-03 08:00:00",  # high season, working day, 07:45
+            "2024-01-01 08:00:00",  # high season, holiday
+            "2024-07-06 00:00:00",  # low season, friday 23:45
+            "2024-07-06 12:00:00",  # low season, saturday
+            "2024-03-01 06:15:00",  # low season, working day, 06:00
+        ])
+        blocks = individual_tariff_blocks(dates)
+        self.assertEqual(blocks.dtype, np.int8)
+        self.assertEqual(blocks.tolist(), [1, 2, 4, 3, 3])
+
+    def test_times_mask(self):
+        dates = pd.date_range("2023-12-30 00:15:00",
+                              periods=96 * 4,
+                              freq="15min",
+                              tz="Europe/Ljubljana")
+        tariff_mask = individual_tariff_times(np.array(list(dates)))
+        self.assertEqual(tariff_mask.shape, (5, len(dates)))
+        self.assertTrue((tariff_mask.sum(axis=0) == 1).all())
+        self.assertEqual((np.argmax(tariff_mask, axis=0) + 1).tolist(),
+                         individual_tariff_blocks(dates).tolist())
+
+    def test_time_axis_parity(self):
+        from consmodel.utils.time_axis import TimeAxis
+        for freq in ("5min", "10min", "15min", "60min"):
+            dates = pd.date_range("2024-02-28 00:00:00", "2024-03-04 00:00:00", freq=freq, tz="Europe/Ljubljana")
+            self.assertEqual(individual_tariff_blocks(dates).tolist(),
+                             TimeAxis.from_index(dates).tariff_block.tolist())
+        # the interval ending at 06:10 lies in the 6th hour
+        self.assertEqual(individual_tariff_blocks(pd.DatetimeIndex(["2024-03-01 06:10:00"])).tolist(), [3])
@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+import pandas as pd
+from consmodel.utils.time_axis import TimeAxis
+
+
+class TestTimeAxis(unittest.TestCase):
+
+    def test_memoised(self):
+        start = pd.to_datetime("2022-01-01 00:15:00")
+        end = pd.to_datetime("2023-01-01 00:00:00")
+        time_axis = TimeAxis.from_range(start, end, "15min", "Europe/Ljubljana")
+        self.assertIs(time_axis,
+                      TimeAxis.from_range(start, end, "15min",
+                                          "Europe/Ljubljana"))
+        self.assertIs(time_axis, TimeAxis.from_index(time_axis.index))
+        self.assertEqual(len(time_axis), 35040)
+
+    def test_calendar_features(self):
+        index = pd.date_range("2024-01-01 00:15:00",
+                              periods=96 * 3,
+                              freq="15min",
+                              tz="Europe/Ljubljana")
+        time_axis = TimeAxis.from_index(index)
+        shifted = index - pd.Timedelta(minutes=1)
+        self.assertEqual(time_axis.hour.tolist(), shifted.hour.tolist())
+        self.assertEqual(time_axis.month.tolist(), shifted.month.tolist())
+        self.assertEqual(time_axis.weekday.tolist(),
+                         shifted.weekday.tolist())
+        # 1st and 2nd of January are holidays
+        self.assertEqual(time_axis.holiday.tolist(),
+                         [True] * 192 + [False] * 96)
+        self.assertEqual(
+            time_axis.epoch_ns.tolist(),
+            index.tz_convert("UTC").tz_localize(None).values.astype(
+                "datetime64[ns]").astype(np.int64).tolist())
+        with self.assertRaises(ValueError):
+            time_axis.hour[0] = 1
+
+    def test_tariff_block(self):
+        index = pd.DatetimeIndex(["2024-01-03 08:00:00", "2024-07-06 12:00:00"])
+        self.assertEqual(TimeAxis.from_index(index).tariff_block.tolist(),
+                         [1, 3])
+
+    def test_interpolate(self):
+        hourly = pd.DataFrame({"temp": [0., 4., np.nan, 12.], "coco": [1., 1., 3., 3.]},
+                              index=pd.date_range("2022-01-01 00:00", periods=4, freq="1h", tz="UTC"))
+        time_axis = TimeAxis.from_range("2022-01-01 00:45", "2022-01-01 04:00", "15min", "UTC")
+        interpolated = time_axis.interpolate(hourly, ["temp"])
+        self.assertEqual(list(interpolated.columns), ["temp"])
+        self.assertIs(interpolated.index, time_axis.index)
+        # the missing hour is interpolated over and the last value is held
+        self.assertEqual(interpolated["temp"].tolist(), [3., 4., 5., 6., 7., 8., 9., 10., 11., 12., 12., 12., 12., 12.])
+        # the same source hours reuse the positions, also in another time zone
+        local = hourly.tz_convert("Europe/Ljubljana")
+        self.assertEqual(time_axis.interpolate(local)["coco"].tolist(),
+                         [1., 1., 1.5, 2., 2.5] + [3.] * 9)
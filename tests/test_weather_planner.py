@@ -0,0 +1,83 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from consmodel.bs_sim import BS
+from consmodel.utils.weather_planner import WeatherPlanner
+from consmodel.utils.weather_providers import StubProvider
+from consmodel.utils.weather_store import WeatherStore
+
+
+class TestWeatherPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.calls = []
+
+        def fetch(lat, lon, alt, start, end):
+            self.calls.append((lat, lon, alt))
+            index = pd.date_range(start, end, freq="1h", name="time")
+            return pd.DataFrame({"temp": np.full(len(index), lat)}, index=index)
+
+        self.store = WeatherStore(self.directory.name, fetch=fetch)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_grid_cells(self):
+        rng = np.random.default_rng(0)
+        models = [
+            BS(lat=lat, lon=lon, alt=300, st_type="10kWh_5kW", tz="UTC")
+            for lat, lon in zip(np.r_[46.0 + rng.uniform(-0.04, 0.04, 30),
+                                      45.6 + rng.uniform(-0.04, 0.04, 20)],
+                                14.5 + rng.uniform(-0.04, 0.04, 50))
+        ]
+        planner = WeatherPlanner(self.store, cell_deg=0.1)
+        cells = planner.assign(models)
+        self.assertEqual(sorted(planner.cells["n_consumers"]), [20, 30])
+        start = pd.Timestamp("2022-06-01 00:15")
+        end = pd.Timestamp("2022-06-02 00:00")
+        for model in models:
+            model.get_weather_data(start, end)
+        self.assertEqual(sorted(self.calls), [(45.6, 14.5, 300.), (46.0, 14.5, 300.)])
+        self.assertEqual(models[0].results["temp"].iloc[0], 46.)
+        # the consumers of a cell share one read-only frame
+        first = planner.weather(cells[0], start, end, "UTC")
+        self.assertIs(first, models[0].weather_store.get(0., 0., 0., start, end, "UTC"))
+        self.assertFalse(first.to_numpy().flags.writeable)
+        # and the interpolated weather, which their results reference until they write to it
+        temp = models[0].results["temp"].to_numpy()
+        self.assertTrue(np.shares_memory(temp, models[1].results["temp"].to_numpy()))
+        models[1].results.loc[models[1].results.index[0], "temp"] = 0.
+        self.assertEqual(temp[0], 46.)
+
+    def test_station_cells(self):
+        stations = pd.DataFrame({"latitude": [46.07, 45.48, 46.23],
+                                 "longitude": [14.52, 15.00, 14.45],
+                                 "elevation": [299., np.nan, 364.]},
+                                index=["14015", "14026", "14010"])
+        planner = WeatherPlanner(self.store, snap="station", stations=stations)
+        cells = planner.snap_coordinates([46.05, 46.20, 45.50, 46.06],
+                                         [14.50, 14.47, 14.98, 14.51], 300.)
+        self.assertEqual(cells, ["14015", "14010", "14026", "14015"])
+        self.assertEqual(planner.cells.loc["14026", "alt"], 0.)
+        planner.prefetch("2022-01-01", "2022-01-02")
+        self.assertEqual(len(self.calls), 3)
+
+    def test_frames_are_bounded(self):
+        planner = WeatherPlanner(self.store, max_frames=2)
+        cells = planner.snap_coordinates([46., 45.5, 45.], [14.5, 14.5, 14.5], 300.)
+        frames = [planner.weather(cell, "2022-01-01", "2022-01-02", "UTC") for cell in cells]
+        self.assertEqual(len(planner._frames), 2)
+        # the least recently used frame was dropped
+        self.assertIsNot(planner.weather(cells[0], "2022-01-01", "2022-01-02", "UTC"), frames[0])
+        self.assertIs(planner.weather(cells[2], "2022-01-01", "2022-01-02", "UTC"), frames[2])
+
+    def test_station_cache_dir(self):
+        np.savez(f"{self.directory.name}/stations.npz", ids=np.array(["14015", "14026"]),
+                 coordinates=np.array([[46.07, 14.52, 299.], [45.48, 15.00, 0.]]))
+        # a provider has no directory, the station index is read from the cache directory
+        planner = WeatherPlanner(StubProvider(temp=5.), snap="station", cache_dir=self.directory.name)
+        self.assertEqual(planner.snap_coordinates([45.5, 46.], [15., 14.5], 300.), ["14026", "14015"])
+        self.assertEqual(WeatherPlanner(self.store).cache_dir, self.directory.name)
+        self.assertIsNotNone(WeatherPlanner(StubProvider(temp=5.)).cache_dir)
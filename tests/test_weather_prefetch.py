@@ -0,0 +1,116 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+from consmodel.utils.weather_prefetch import prefetch_weather
+from consmodel.utils.weather_providers import OpenMeteoProvider
+from consmodel.utils.weather_store import WeatherStore
+
+
+class OpenMeteoStandIn(ThreadingHTTPServer):
+    """
+    Local stand-in of the Open-Meteo archive. The temperature is the latitude, the
+    first request of a latitude in fail_once gets a 503 and latitudes in missing a 404.
+    Every request takes delay seconds.
+    """
+
+    def __init__(self, delay=0.1, fail_once=(), missing=()):
+        super().__init__(("127.0.0.1", 0), OpenMeteoHandler)
+        self.delay = delay
+        self.fail_once = set(fail_once)
+        self.missing = set(missing)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/archive"
+
+
+class OpenMeteoHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        lat = float(query["latitude"])
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            fail = lat in server.fail_once
+            server.fail_once.discard(lat)
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+        if fail or lat in server.missing:
+            self.send_response(503 if fail else 404)
+            self.end_headers()
+            return
+        times = pd.date_range(query["start_date"], pd.Timestamp(query["end_date"]) + pd.Timedelta("23h"), freq="1h")
+        hourly = {"time": (times.as_unit("s").asi8).tolist()}
+        for variable in OpenMeteoProvider.VARIABLES:
+            hourly[variable] = [lat] * len(times)
+        body = json.dumps({"hourly": hourly}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestWeatherPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def serve(self, **kwargs):
+        server = OpenMeteoStandIn(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, WeatherStore(self.directory.name, fetch=OpenMeteoProvider(base_url=server.url))
+
+    def test_concurrent_fill(self):
+        server, store = self.serve(delay=0.2, fail_once=[46.1])
+        sites = [(45. + i / 10, 14.5, 300.) for i in range(12)] + [(45., 14.5, 301.)]
+        report = prefetch_weather(sites, "2022-01-01 00:15", "2022-01-03 00:00", "Europe/Ljubljana",
+                                  store=store, max_concurrency=4, backoff_factor=0.01)
+        # 13 requests of 0.2 s, 4 at a time, instead of one after another
+        self.assertEqual(server.requests, 13)
+        self.assertEqual(server.max_in_flight, 4)
+        self.assertEqual(len(report), 12)
+        self.assertEqual(report.loc["46.10_14.50_300", "attempts"], 2)
+        self.assertTrue(report["error"].isna().all())
+
+        # the simulation is served from the store
+        data = store.get(46.1, 14.5, 300, "2022-01-01 00:15", "2022-01-03 00:00", "Europe/Ljubljana")
+        self.assertEqual(len(data), 49)
+        self.assertEqual(data["temp"].iloc[0], 46.1)
+        report = prefetch_weather(sites, "2022-01-01 00:15", "2022-01-03 00:00", "Europe/Ljubljana", store=store)
+        self.assertEqual(report["ranges"].sum(), 0)
+        self.assertEqual(server.requests, 13)
+
+    def test_errors(self):
+        server, store = self.serve(delay=0., missing=[46.])
+        sites = [(45., 14.5, 300.), (46., 14.5, 300.)]
+        report = prefetch_weather(sites, "2022-01-01", "2022-01-02", store=store, backoff_factor=0.01,
+                                  raise_errors=False)
+        # client errors are not retried
+        self.assertEqual(report["attempts"].tolist(), [1, 1])
+        self.assertTrue(pd.isna(report["error"].iloc[0]))
+        self.assertIn("404", report["error"].iloc[1])
+        self.assertEqual(store.missing(45., 14.5, 300., "2022-01-01", "2022-01-02"), [])
+        with self.assertRaises(ValueError):
+            prefetch_weather(sites, "2022-01-01", "2022-01-02", store=store)
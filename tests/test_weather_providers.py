@@ -0,0 +1,125 @@
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from consmodel.pv_sim import PV
+from consmodel.utils.weather_providers import LocalFileProvider, OpenMeteoProvider, StubProvider
+from consmodel.utils.weather_store import WeatherStore
+
+
+class FakeResponse:
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """
+    Returns the same Open-Meteo payload for every request, recording the query parameters.
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.params = []
+
+    def get(self, url, params=None, timeout=None):
+        self.params.append(params)
+        return FakeResponse(self.payload)
+
+
+def hourly_weather(start, end):
+    index = pd.date_range(start, end, freq="1h", name="time")
+    hours = (index - index[0]) / pd.Timedelta("1h")
+    return pd.DataFrame({"temp": hours.values, "wspd": np.full(len(index), 3.), "coco": np.ones(len(index))},
+                        index=index)
+
+
+class TestWeatherProviders(unittest.TestCase):
+
+    def test_stub(self):
+        stub = StubProvider(temp=-5.)
+        data = stub.get(46., 14., 300, "2022-07-01 00:00", "2022-07-01 02:30", "Europe/Ljubljana")
+        self.assertEqual(len(data), 4)
+        self.assertEqual(data.index[0], pd.Timestamp("2022-07-01 00:00", tz="Europe/Ljubljana"))
+        self.assertEqual(data["temp"].tolist(), [-5.] * 4)
+        self.assertEqual(stub.requests[0][3:], (pd.Timestamp("2022-06-30 22:00"), pd.Timestamp("2022-07-01 01:00")))
+
+        stub = StubProvider(hourly_weather("2022-01-01", "2022-01-03"))
+        with tempfile.TemporaryDirectory() as directory:
+            data = WeatherStore(directory, fetch=stub).get(46., 14., 300, "2022-01-02", "2022-01-02 05:00")
+        self.assertEqual(data["temp"].tolist(), list(np.arange(24., 30.)))
+
+    def test_local_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            provider = LocalFileProvider(directory, max_distance_km=10.)
+            weather = hourly_weather("2022-01-01", "2022-01-02")
+            provider.write(46.05, 14.51, weather)
+            provider.write(45.55, 13.73, weather + 100.)
+            data = provider.get(46.0, 14.5, 300, "2022-01-01 10:00", "2022-01-01 12:00")
+            self.assertEqual(data["temp"].tolist(), [10., 11., 12.])
+            self.assertEqual(str(data.index.tz), "UTC")
+            self.assertEqual(provider.get(45.57, 13.70, 0, "2022-01-01", "2022-01-01")["temp"].iloc[0], 100.)
+            with self.assertRaises(ValueError):
+                provider.get(45., 14., 300, "2022-01-01", "2022-01-02")
+
+    def test_open_meteo(self):
+        times = pd.date_range("2022-06-01", periods=3, freq="1h").as_unit("s").asi8
+        payload = {"hourly": {
+            "time": times.tolist(),
+            "temperature_2m": [12.5, None, 14.0],
+            "wind_speed_10m": [7.2, 3.6, 0.],
+            "weather_code": [0, 3, 95],
+            "shortwave_radiation": [0., 50., 200.],
+            "diffuse_radiation": [0., 30., 80.],
+            "direct_normal_irradiance": [0., 60., 300.],
+        }}
+        session = FakeSession(payload)
+        provider = OpenMeteoProvider(session=session)
+        data = provider.get(46., 14.5, 300, "2022-06-01 00:00", "2022-06-01 02:00")
+        self.assertEqual(session.params[0]["start_date"], "2022-06-01")
+        self.assertEqual(session.params[0]["timezone"], "GMT")
+        self.assertEqual(list(data.columns), ["temp", "wspd", "coco", "ghi", "dhi", "dni"])
+        self.assertEqual(data.index[0], pd.Timestamp("2022-06-01 00:00", tz="UTC"))
+        self.assertTrue(np.isnan(data["temp"].iloc[1]))
+        # WMO clear sky, overcast and thunderstorm as meteostat codes
+        self.assertEqual(data["coco"].tolist(), [1., 4., 25.])
+
+    def test_pv_provider_endpoint(self):
+        index = pd.date_range("2022-06-01 00:00", "2022-06-02 01:00", freq="1h", tz="UTC")
+        ghi = np.clip(800. * np.sin(np.pi * (index.hour - 5) / 16), 0., None)
+        weather = pd.DataFrame({"temp": 20., "wspd": 5., "coco": 1., "ghi": ghi, "dhi": 0.2 * ghi, "dni": ghi},
+                               index=index)
+        pv = PV(lat=46.05, lon=14.51, alt=300, tz="UTC", weather_store=StubProvider(weather))
+        p = pv.simulate(pv_size=10., start=pd.Timestamp("2022-06-01 00:15"), end=pd.Timestamp("2022-06-02 00:00"),
+                        endpoint="provider")
+        self.assertEqual(len(p), 96)
+        self.assertEqual(p.iloc[0], 0.)
+        self.assertGreater(p.max(), 1.)
+        self.assertLess(p.max(), 10.)
+        with self.assertRaises(ValueError):
+            PV(lat=46.05, lon=14.51, alt=300, tz="UTC", weather_store=StubProvider()).simulate(
+                pv_size=10., start=pd.Timestamp("2022-06-01 00:15"), end=pd.Timestamp("2022-06-02 00:00"),
+                endpoint="provider")
+
+    def test_open_meteo_instant(self):
+        times = pd.date_range("2022-06-01 10:00", periods=2, freq="1h").as_unit("s").asi8
+        payload = {"hourly": {"time": times.tolist(), "shortwave_radiation_instant": [400., 600.],
+                              "diffuse_radiation_instant": [100., 100.],
+                              "direct_normal_irradiance_instant": [300., 500.]}}
+        session = FakeSession(payload)
+        provider = OpenMeteoProvider(OpenMeteoProvider.FORECAST_URL, session=session, instant=True)
+        data = provider.get(46., 14.5, 300, "2022-06-01 10:00", "2022-06-01 11:00")
+        self.assertIn("shortwave_radiation_instant", session.params[0]["hourly"].split(","))
+        self.assertEqual(data["ghi"].tolist(), [400., 600.])
+        # instantaneous values are interpolated at their timestamps, hourly means at the middle of the hour
+        pv = PV(lat=46.05, lon=14.51, alt=300, tz="UTC")
+        start, end = pd.Timestamp("2022-06-01 10:15"), pd.Timestamp("2022-06-01 11:00")
+        self.assertEqual(pv._resample_irradiance(data, start, end, instant=True)["ghi"].tolist(),
+                         [450., 500., 550., 600.])
+        self.assertEqual(pv._resample_irradiance(data, start, end)["ghi"].tolist(), [550., 600., 600., 600.])
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from consmodel.bs_sim import BS
+from consmodel.utils.weather_store import WeatherStore
+
+
+class FakeFetch:
+    """
+    Hourly temperature equal to the hours since 2020, recording the requested ranges.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, lat, lon, alt, start, end):
+        self.calls.append((lat, lon, alt, start, end))
+        index = pd.date_range(start, end, freq="1h", name="time")
+        hours = (index - pd.Timestamp("2020-01-01")) / pd.Timedelta("1h")
+        return pd.DataFrame({"temp": hours.values, "wspd": np.ones(len(index))}, index=index)
+
+
+class TestWeatherStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fetch = FakeFetch()
+        self.store = WeatherStore(self.directory.name, fetch=self.fetch)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_fetch_once(self):
+        data = self.store.get(46.155768, 14.304951, 400, "2020-01-01 00:00", "2020-01-02 00:00")
+        self.assertEqual(len(data), 25)
+        self.assertEqual(data["temp"].iloc[-1], 24.)
+        self.assertEqual(str(data.index.tz), "UTC")
+        # nearby coordinates share the site, a new store reads it from disk
+        self.store.get(46.1561, 14.3049, 402, "2020-01-01 05:00", "2020-01-01 20:00")
+        store = WeatherStore(self.directory.name, fetch=self.fetch)
+        pd.testing.assert_frame_equal(
+            store.get(46.155768, 14.304951, 400, "2020-01-01 00:00", "2020-01-02 00:00"),
+            data, check_freq=False)
+        self.assertEqual(len(self.fetch.calls), 1)
+        self.assertEqual(self.fetch.calls[0][:3], (46.16, 14.3, 400.))
+
+    def test_fetch_missing_ranges(self):
+        self.store.get(46., 14., 300, "2020-01-05", "2020-01-10")
+        self.store.get(46., 14., 300, "2020-01-01", "2020-01-02")
+        data = self.store.get(46., 14., 300, "2020-01-01", "2020-01-12")
+        self.assertEqual([call[3:] for call in self.fetch.calls[2:]],
+                         [(pd.Timestamp("2020-01-02 01:00"), pd.Timestamp("2020-01-04 23:00")),
+                          (pd.Timestamp("2020-01-10 01:00"), pd.Timestamp("2020-01-12 00:00"))])
+        self.assertEqual(data["temp"].tolist(), list(np.arange(11 * 24 + 1.)))
+        self.assertEqual(self.store.covered(46., 14., 300),
+                         [(pd.Timestamp("2020-01-01", tz="UTC"), pd.Timestamp("2020-01-12", tz="UTC"))])
+
+    def test_offline(self):
+        self.store.get(46., 14., 300, "2020-01-01", "2020-01-03")
+        offline = WeatherStore(self.directory.name, offline=True, fetch=self.fetch)
+        self.assertEqual(len(offline.get(46., 14., 300, "2020-01-01 12:00", "2020-01-02")), 13)
+        with self.assertRaises(ValueError):
+            offline.get(46., 14., 300, "2020-01-02", "2020-01-04")
+        with self.assertRaises(ValueError):
+            offline.get(45., 14., 300, "2020-01-01", "2020-01-02")
+        self.assertEqual(len(self.fetch.calls), 1)
+
+    def test_time_zone(self):
+        data = self.store.get(46., 14., 300, "2020-07-01 00:00", "2020-07-01 02:30", "Europe/Ljubljana")
+        self.assertEqual(self.fetch.calls[0][3:],
+                         (pd.Timestamp("2020-06-30 22:00"), pd.Timestamp("2020-07-01 01:00")))
+        self.assertEqual(data.index[0], pd.Timestamp("2020-07-01 00:00", tz="Europe/Ljubljana"))
+
+    def test_model_weather_data(self):
+        batt = BS(lat=46.155768, lon=14.304951, alt=400, st_type="10kWh_5kW", tz="UTC")
+        batt.weather_store = self.store
+        results = batt.get_weather_data(pd.Timestamp("2020-01-01 00:15"), pd.Timestamp("2020-01-01 06:00"))
+        self.assertEqual(len(self.fetch.calls), 1)
+        self.assertEqual(results.index[0], pd.Timestamp("2020-01-01 00:00", tz="UTC"))
+        self.assertEqual(results.index[-1], pd.Timestamp("2020-01-01 06:00", tz="UTC"))
+        self.assertAlmostEqual(results["temp"].iloc[1], 0.25)
+
+    def test_partial_fetch(self):
+        store = WeatherStore(self.directory.name, fetch=lambda *args: pd.DataFrame())
+        self.assertEqual(len(store.get(46., 14., 300, "2020-01-01", "2020-01-02")), 0)
+        self.assertEqual(store.covered(46., 14., 300), [])
+
+        # only the hours the data spans are covered, the rest is fetched again
+        store.fetch = lambda *args: self.fetch(*args).iloc[:10]
+        self.assertEqual(len(store.get(46., 14., 300, "2020-01-01", "2020-01-02")), 10)
+        self.assertEqual(store.covered(46., 14., 300),
+                         [(pd.Timestamp("2020-01-01", tz="UTC"), pd.Timestamp("2020-01-01 09:00", tz="UTC"))])
+        store.fetch = self.fetch
+        self.assertEqual(len(store.get(46., 14., 300, "2020-01-01", "2020-01-02")), 25)
+        self.assertEqual(self.fetch.calls[-1][3:], (pd.Timestamp("2020-01-01 10:00"), pd.Timestamp("2020-01-02")))
+
+    def test_recent_hours(self):
+        now = pd.Timestamp.now(tz="UTC").floor("h")
+        self.store.get(46., 14., 300, now - pd.Timedelta("5D"), now)
+        (_, covered_end), = self.store.covered(46., 14., 300)
+        self.assertLessEqual(covered_end, now - pd.Timedelta("72h"))
+        self.store.get(46., 14., 300, now - pd.Timedelta("5D"), now)
+        self.assertEqual(len(self.fetch.calls), 2)
+        self.assertEqual(self.fetch.calls[1][3], covered_end.tz_localize(None) + pd.Timedelta("1h"))
+
+    def test_concurrent_saves(self):
+        self.store.get(46., 14., 300, "2020-01-01", "2020-01-10")
+        _, key = self.store.site_key(46., 14., 300)
+        data, covered = self.store._sites[key]
+        # threads of one process saving the same site each write their own temp file
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: self.store._save(key, data, covered), range(32)))
+        self.assertEqual(os.listdir(self.directory.name), [f"{key}.npz"])
+        data = WeatherStore(self.directory.name, offline=True).get(46., 14., 300, "2020-01-01", "2020-01-10")
+        self.assertEqual(len(data), 9 * 24 + 1)